@@ -0,0 +1,131 @@
+"""
+Reduced audio context ("audio_ctx", as in whisper.cpp) for short clips.
+
+Whisper pads every clip to 30 s and always encodes 3000 mel frames into 1500
+positions. For a short clip the encoder can instead run over just the first
+2 * audio_ctx mel frames, with positional embeddings truncated to audio_ctx
+positions; the decoder then cross-attends to the shorter output. Clip length
+plus a margin is rounded up to one of a few fixed buckets, so compiled kernels
+only ever see a handful of shapes.
+
+The model was trained on full 30 s windows, so transcripts can differ from the
+full-context ones. Measure the WER impact with
+posttraining/evaluate_checkpoint.py --audio_ctx_buckets.
+
+Used by inference_server.py (--audio-ctx-buckets) and posttraining/evaluate_checkpoint.py.
+
+Benchmark per bucket (CPU):
+  python audio_context.py --model-id openai/whisper-tiny --buckets 5,10,15
+"""
+
+import argparse
+import time
+from typing import Optional, Sequence, Tuple
+
+import torch
+import torch.nn.functional as F
+
+# Encoder output positions per second of audio (10 ms mel hop, stride-2 conv)
+POSITIONS_PER_S = 50
+
+
+def parse_buckets(spec: str) -> Tuple[float, ...]:
+    """'5,10,15' -> (5.0, 10.0, 15.0); empty string -> () (feature off)."""
+    return tuple(sorted(float(part) for part in spec.split(",") if part.strip()))
+
+
+def pick_audio_ctx(
+    num_samples: int,
+    buckets_s: Sequence[float],
+    margin_s: float = 1.0,
+    sampling_rate: int = 16000,
+    max_positions: int = 1500,
+) -> Optional[int]:
+    """
+    Encoder positions for the smallest bucket that covers the clip plus margin_s.
+
+    Returns None (full 30 s context) when buckets_s is empty or the clip is
+    longer than the largest bucket.
+    """
+    duration_s = num_samples / sampling_rate + margin_s
+    for bucket_s in sorted(buckets_s):
+        if duration_s <= bucket_s:
+            positions = int(round(bucket_s * POSITIONS_PER_S))
+            return positions if positions < max_positions else None
+    return None
+
+
+def encode(encoder, input_features, audio_ctx: int):
+    """
+    WhisperEncoder forward over the first 2 * audio_ctx mel frames.
+
+    Args:
+        encoder: WhisperEncoder (model.model.encoder)
+        input_features: (B, n_mels, frames) log-mel tensor, frames >= 2 * audio_ctx
+        audio_ctx: Encoder positions to keep
+
+    Returns:
+        (B, audio_ctx, d_model) last hidden state
+    """
+    weight = encoder.conv1.weight
+    x = input_features[..., : 2 * audio_ctx].to(weight.device, dtype=weight.dtype)
+    x = F.gelu(encoder.conv1(x))
+    x = F.gelu(encoder.conv2(x))
+    x = x.permute(0, 2, 1) + encoder.embed_positions.weight[:audio_ctx]
+    for layer in encoder.layers:
+        out = layer(x, None, None)
+        x = out[0] if isinstance(out, tuple) else out
+    return encoder.layer_norm(x)
+
+
+def _benchmark(model_id: str, buckets_s: Tuple[float, ...], margin_s: float, audio: str, iters: int):
+    import librosa
+    from transformers import WhisperForConditionalGeneration, WhisperProcessor
+    from transformers.modeling_outputs import BaseModelOutput
+
+    torch.set_num_threads(1)
+    processor = WhisperProcessor.from_pretrained(model_id)
+    model = WhisperForConditionalGeneration.from_pretrained(model_id, torch_dtype=torch.float32).eval()
+    model.config.forced_decoder_ids = None
+    speech, _ = librosa.load(audio, sr=16000, mono=True)
+    kwargs = {"language": "en", "task": "transcribe", "do_sample": False, "num_beams": 1}
+
+    def timed(fn):
+        fn()  # warmup
+        t0 = time.perf_counter()
+        for _ in range(iters):
+            result = fn()
+        return (time.perf_counter() - t0) / iters * 1000.0, result
+
+    print(f"Model: {model_id}  buckets={buckets_s}  margin={margin_s}s  iters={iters}  device=cpu  threads=1")
+    print(f"  {'bucket':>8} {'clip':>6} {'full ms':>9} {'ctx ms':>9} {'speedup':>8}  same text")
+    for bucket_s in buckets_s:
+        clip = speech[: int((bucket_s - margin_s) * 16000)]
+        audio_ctx = pick_audio_ctx(len(clip), buckets_s, margin_s)
+        if audio_ctx is None:
+            continue
+        features = processor.feature_extractor(clip, sampling_rate=16000, return_tensors="pt").input_features
+
+        with torch.inference_mode():
+            full_ms, full_ids = timed(lambda: model.generate(features, **kwargs))
+            ctx_ms, ctx_ids = timed(lambda: model.generate(
+                encoder_outputs=BaseModelOutput(last_hidden_state=encode(model.model.encoder, features, audio_ctx)),
+                **kwargs,
+            ))
+        full_text = processor.batch_decode(full_ids, skip_special_tokens=True)[0].strip()
+        ctx_text = processor.batch_decode(ctx_ids, skip_special_tokens=True)[0].strip()
+        print(
+            f"  {bucket_s:>7.1f}s {len(clip) / 16000:>5.1f}s {full_ms:>9.1f} {ctx_ms:>9.1f} "
+            f"{full_ms / ctx_ms:>7.2f}x  {full_text == ctx_text}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark reduced audio context against full 30 s encoding on CPU")
+    parser.add_argument("--model-id", type=str, default="openai/whisper-tiny", help="Whisper checkpoint")
+    parser.add_argument("--buckets", type=str, default="5,10,15", help="Comma-separated bucket lengths in seconds")
+    parser.add_argument("--margin-s", type=float, default=1.0, help="Audio added past the clip end before bucketing")
+    parser.add_argument("--audio", type=str, default="MLKDream_20s.wav", help="Speech file clips are cut from")
+    parser.add_argument("--iters", type=int, default=3, help="Timed iterations per bucket")
+    args = parser.parse_args()
+    _benchmark(args.model_id, parse_buckets(args.buckets), args.margin_s, args.audio, args.iters)
@@ -0,0 +1,91 @@
+"""
+CPU check of the worker's micro-batched generate() path with a tiny checkpoint.
+
+Runs inference_server._generate_group once per clip and then over the whole
+micro-batch, grouped by _batch_key the way a worker groups them, and checks
+that every clip gets the same transcript both ways.
+
+  python batching_check.py --model-id openai/whisper-tiny --batch-size 8
+
+Exits non-zero if any transcript differs.
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import torch
+
+
+def main(model_id: str, batch_size: int, audio: str, context: str, seed: int) -> int:
+    import librosa
+    from transformers import WhisperForConditionalGeneration, WhisperProcessor
+
+    from inference_server import _batch_key, _extract_features, _generate_group
+    from whisper_features import LogMelExtractor
+
+    torch.set_num_threads(1)
+    rng = np.random.default_rng(seed)
+    device, dtype = torch.device("cpu"), torch.float32
+    processor = WhisperProcessor.from_pretrained(model_id)
+    model = WhisperForConditionalGeneration.from_pretrained(model_id, torch_dtype=dtype).eval()
+    model.config.forced_decoder_ids = None
+    extractor = LogMelExtractor(processor.feature_extractor, device)
+
+    # Excerpts of real speech; every other request carries the context prompt
+    speech, _ = librosa.load(audio, sr=16000, mono=True)
+    requests = []
+    for i in range(batch_size):
+        length = int(rng.uniform(2.0, min(15.0, len(speech) / 16000)) * 16000)
+        start = int(rng.integers(0, max(1, len(speech) - length)))
+        requests.append({
+            "audio": speech[start:start + length],
+            "context": context if context and i % 2 else None,
+            "language": "en",
+        })
+
+    def transcribe(group):
+        features = _extract_features(extractor, [request["audio"] for request in group])
+        context_value, language = group[0]["context"], group[0]["language"]
+        out = _generate_group(model, processor, features, context_value, language, device, dtype)
+        return out["transcriptions"]
+
+    _generate_group(model, processor, _extract_features(extractor, [np.zeros(16000, np.float32)]), None, None, device, dtype)
+
+    t0 = time.perf_counter()
+    single = [transcribe([request])[0] for request in requests]
+    single_s = time.perf_counter() - t0
+
+    groups = {}
+    for i, request in enumerate(requests):
+        groups.setdefault(_batch_key(request), []).append(i)
+    batched = [None] * batch_size
+    t0 = time.perf_counter()
+    for indices in groups.values():
+        for i, text in zip(indices, transcribe([requests[i] for i in indices])):
+            batched[i] = text
+    batched_s = time.perf_counter() - t0
+
+    matches = sum(a.strip() == b.strip() for a, b in zip(single, batched))
+    print(f"Model: {model_id}  batch={batch_size}  groups={len(groups)}  device=cpu  threads=1")
+    print(f"  Same text as batch size 1 : {matches}/{batch_size}")
+    print(f"  One clip per generate()   : {single_s * 1000:8.1f} ms")
+    print(f"  Micro-batched generate()  : {batched_s * 1000:8.1f} ms")
+    print(f"  Speedup                   : {single_s / batched_s:8.2f}x")
+    for i, (a, b) in enumerate(zip(single, batched)):
+        if a.strip() != b.strip():
+            print(f"  [{i}] single : {a.strip()[:100]}")
+            print(f"  [{i}] batched: {b.strip()[:100]}")
+    return 0 if matches == batch_size else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check micro-batched generate() against one clip per call on CPU")
+    parser.add_argument("--model-id", type=str, default="openai/whisper-tiny", help="Whisper checkpoint")
+    parser.add_argument("--batch-size", type=int, default=8, help="Requests in the micro-batch")
+    parser.add_argument("--audio", type=str, default="MLKDream_20s.wav", help="Speech file excerpts are cut from")
+    parser.add_argument("--context", type=str, default="Martin Luther King", help="Prompt given to every other request (empty = none)")
+    parser.add_argument("--seed", type=int, default=0, help="RNG seed for excerpt positions")
+    args = parser.parse_args()
+    sys.exit(main(args.model_id, args.batch_size, args.audio, args.context, args.seed))
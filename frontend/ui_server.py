@@ -4,8 +4,8 @@ from pathlib import Path
 from typing import Optional
 
 import httpx
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
-from fastapi.responses import HTMLResponse, Response
+from fastapi import FastAPI, File, Form, Header, HTTPException, UploadFile
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 import uvicorn
 
 BASE_DIR = Path(__file__).resolve().parent
@@ -32,6 +32,8 @@ async def transcribe(
     audio: UploadFile = File(..., description="Audio file (.wav or .webm)"),
     context: Optional[str] = Form(None),
     language: Optional[str] = Form(None),
+    stream: bool = Form(False),
+    idempotency_key: Optional[str] = Header(None),
 ):
     try:
         audio_bytes = await audio.read()
@@ -49,6 +51,7 @@ async def transcribe(
         "audio_size_bytes": len(audio_bytes),
         "context": context,
         "language": language,
+        "stream": stream,
     })
 
     files = {
@@ -64,9 +67,15 @@ async def transcribe(
     if language:
         data["language"] = language
 
+    headers = {"Idempotency-Key": idempotency_key} if idempotency_key else {}
+
+    if stream:
+        data["stream"] = "true"
+        return await _proxy_stream(data, files)
+
     try:
         async with httpx.AsyncClient(timeout=BACKEND_TIMEOUT) as client:
-            resp = await client.post(f"{BACKEND_URL}/transcribe", data=data, files=files)
+            resp = await client.post(f"{BACKEND_URL}/transcribe", data=data, files=files, headers=headers)
     except httpx.RequestError as exc:
         raise HTTPException(status_code=502, detail=f"Backend unavailable: {exc}") from exc
 
@@ -77,6 +86,32 @@ async def transcribe(
     )
 
 
+async def _proxy_stream(data, files):
+    # Forward the backend's SSE body chunk by chunk, without buffering
+    client = httpx.AsyncClient(timeout=BACKEND_TIMEOUT)
+    try:
+        req = client.build_request("POST", f"{BACKEND_URL}/transcribe", data=data, files=files)
+        resp = await client.send(req, stream=True)
+    except httpx.RequestError as exc:
+        await client.aclose()
+        raise HTTPException(status_code=502, detail=f"Backend unavailable: {exc}") from exc
+
+    async def body():
+        try:
+            async for chunk in resp.aiter_raw():
+                yield chunk
+        finally:
+            await resp.aclose()
+            await client.aclose()
+
+    return StreamingResponse(
+        body(),
+        status_code=resp.status_code,
+        media_type=resp.headers.get("content-type", "text/event-stream"),
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":
     host = os.environ.get("UI_HOST", "0.0.0.0")
     port = int(os.environ.get("UI_PORT", "8081"))
@@ -5,12 +5,18 @@ Key fixes vs original:
   - Caps CPU thread pools per worker process (prevents oversubscription under concurrency)
   - Replaces Manager().dict() + 1ms polling with response_queue + asyncio.Future
   - Adds CUDA-event GPU-only timing for generate()
+  - Hands audio to workers through a shared-memory slot pool instead of temp files
+  - Routes requests to per-worker queues by in-flight load instead of one shared queue
+  - Optional CPU preprocessing pool so audio decode/log-mel overlaps GPU generate()
+  - Optional encoder pool so the encoder runs in large batches apart from decoding
 
 Endpoints:
   POST /transcribe    - Multipart upload (.wav or .webm) with optional context
   GET  /health        - Health check (legacy)
   GET  /ping          - SageMaker health check
+  GET  /metrics       - Prometheus metrics (stage latency histograms, counters, queue gauges)
   POST /invocations   - SageMaker inference endpoint (raw audio bytes or JSON base64)
+  WS   /ws/transcribe - Streaming transcription with partial results
 
 Usage:
   python inference_server.py --port 8000 --num-workers 8
@@ -30,18 +36,23 @@ os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
 os.environ.setdefault("NUMBA_NUM_THREADS", "1")
 
 import uuid
+import queue
+import random
 import tempfile
 import argparse
 import asyncio
 import base64
+import copy
+import json
 import logging
+import math
 import time
 import threading
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 
 import uvicorn
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, Form, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 import multiprocessing as mp
 
@@ -61,277 +72,2390 @@ MODEL_ID = os.environ.get("MODEL_ID", "openai/whisper-large-v3-turbo")
 MAX_QUEUE_SIZE = 10000
 REQUEST_TIMEOUT = 600  # seconds
 
+# Micro-batching: max requests per generate() call, and how long a worker waits
+# for a batch to fill after the first request arrives (1 / 0 = no batching)
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "1"))
+BATCH_WINDOW_MS = float(os.environ.get("BATCH_WINDOW_MS", "0"))
+
+# Shared-memory audio handoff: number of slots and bytes per slot (0 slots = temp files only).
+# Payloads larger than a slot fall back to a temp file.
+SHM_SLOTS = int(os.environ.get("SHM_SLOTS", "128"))
+SHM_SLOT_BYTES = int(os.environ.get("SHM_SLOT_BYTES", str(1 << 20)))
+
+# How requests are spread over the per-worker queues ("least_loaded" or "p2c")
+ROUTING_POLICY = os.environ.get("ROUTING_POLICY", "least_loaded")
+
+# CPU preprocessing pool (decode + log-mel ahead of the GPU workers).
+# "0" = decode inside GPU workers, "auto" = one process per CPU core.
+PREPROCESS_WORKERS = os.environ.get("PREPROCESS_WORKERS", "0")
+# Shared-memory slots for precomputed features; one slot holds a (128, 3000) float32 array
+FEATURE_SLOTS = int(os.environ.get("FEATURE_SLOTS", "64"))
+FEATURE_SLOT_BYTES = 128 * 3000 * 4
+
+# Long-form mode: window length and overlap between consecutive windows (seconds).
+# Whisper sees at most 30 s per window; longer windows would silently drop audio.
+LONGFORM_CHUNK_S = float(os.environ.get("LONGFORM_CHUNK_S", "30"))
+LONGFORM_OVERLAP_S = float(os.environ.get("LONGFORM_OVERLAP_S", "5"))
+
+# WebSocket streaming: default cadence of partial transcripts while audio arrives
+WS_PARTIAL_INTERVAL_MS = float(os.environ.get("WS_PARTIAL_INTERVAL_MS", "1000"))
+# WebSocket streaming: audio a session may hold that is not yet transcribed
+WS_MAX_BUFFER_MB = float(os.environ.get("WS_MAX_BUFFER_MB", "32"))
+
+# Per-worker cache of tokenized context prompts on device
+PROMPT_CACHE_ENTRIES = int(os.environ.get("PROMPT_CACHE_ENTRIES", "512"))
+PROMPT_CACHE_MB = float(os.environ.get("PROMPT_CACHE_MB", "16"))
+
+# Content-addressed result cache in the API process (0 entries and no dir = off).
+# RESULT_CACHE_DIR enables an on-disk tier capped at RESULT_CACHE_DISK_MB.
+RESULT_CACHE_ENTRIES = int(os.environ.get("RESULT_CACHE_ENTRIES", "1024"))
+RESULT_CACHE_TTL_S = float(os.environ.get("RESULT_CACHE_TTL_S", "3600"))
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", "")
+RESULT_CACHE_DISK_MB = float(os.environ.get("RESULT_CACHE_DISK_MB", "512"))
+
+# Worker supervisor: how often worker liveness is checked, and how many times a
+# request claimed by a worker that died is re-dispatched before failing with 503
+WORKER_SUPERVISOR_INTERVAL_S = 1.0
+WORKER_MAX_REDISPATCH = 1
+
+# Admission control: deadline applied when a request has no X-Request-Deadline-Ms
+# header (0 = none). Requests whose estimated wait exceeds their deadline get 429.
+DEFAULT_DEADLINE_MS = float(os.environ.get("DEFAULT_DEADLINE_MS", "0"))
+
+# Priority scheduling in the API process. Each worker holds at most
+# SCHEDULER_WORKER_DEPTH requests (0 = 2 x max batch size or engine slots); the rest wait in the
+# scheduler, ordered by class then deadline. Lower classes waiting longer than
+# PRIORITY_AGING_MS are served first.
+SCHEDULER_WORKER_DEPTH = int(os.environ.get("SCHEDULER_WORKER_DEPTH", "0"))
+PRIORITY_AGING_MS = float(os.environ.get("PRIORITY_AGING_MS", "5000"))
+
+# How often a waiting non-streaming request checks whether its client disconnected
+DISCONNECT_POLL_S = 0.5
+
+# Decoder loop in workers: "generate" (micro-batched model.generate) or
+# "continuous" (iteration-level batching, sequences join/leave every step)
+DECODE_ENGINE = os.environ.get("DECODE_ENGINE", "generate")
+ENGINE_SLOTS = int(os.environ.get("ENGINE_SLOTS", "16"))
+# Continuous engine only: budget for first-decoder-layer state of repeated context prompts (0 = off)
+PREFIX_CACHE_MB = float(os.environ.get("PREFIX_CACHE_MB", "64"))
+
+# Disaggregated encoder pool (0 = off: workers run encoder and decoder). Encoder
+# processes batch-encode input_features and hand encoder_hidden_states to the
+# decoder workers through HIDDEN_SLOTS shared-memory slots.
+ENCODER_WORKERS = int(os.environ.get("ENCODER_WORKERS", "0"))
+ENCODER_BATCH_SIZE = int(os.environ.get("ENCODER_BATCH_SIZE", "16"))
+ENCODER_BATCH_WINDOW_MS = float(os.environ.get("ENCODER_BATCH_WINDOW_MS", "5"))
+HIDDEN_SLOTS = int(os.environ.get("HIDDEN_SLOTS", "16"))
+
+# Reduced audio context for short clips (generate engine): clips up to a bucket
+# length (minus AUDIO_CTX_MARGIN_S) encode only that many seconds of frames.
+# Comma-separated seconds, e.g. "5,10,15"; empty = always full 30 s context.
+AUDIO_CTX_BUCKETS = os.environ.get("AUDIO_CTX_BUCKETS", "")
+AUDIO_CTX_MARGIN_S = float(os.environ.get("AUDIO_CTX_MARGIN_S", "1.0"))
+
+# Worker device: "auto" (GPUs if present, else CPU), "cuda" or "cpu". CPU workers
+# run CPU_THREADS_PER_WORKER intra-op threads (0 = usable cores / core groups), each
+# core group pinned to its own NUMA-local core set unless CPU_PIN_WORKERS=0.
+DEVICE = os.environ.get("DEVICE", "auto")
+# Process start method: "spawn" (each process imports everything itself) or
+# "forkserver" (forked from a server with worker_preload already imported)
+START_METHOD = os.environ.get("START_METHOD", "spawn")
+# Workers sharing one device (a GPU, or a CPU core group), each optionally capped
+# to GPU_MEMORY_FRACTION of the GPU's memory (0 = no cap).
+WORKERS_PER_DEVICE = int(os.environ.get("WORKERS_PER_DEVICE", "1"))
+GPU_MEMORY_FRACTION = float(os.environ.get("GPU_MEMORY_FRACTION", "0"))
+CPU_THREADS_PER_WORKER = int(os.environ.get("CPU_THREADS_PER_WORKER", "0"))
+CPU_PIN_WORKERS = os.environ.get("CPU_PIN_WORKERS", "1") != "0"
+
+# CPU workers: dynamic int8 quantization of all Linear layers ("" = off). The
+# quantized weights can be cached in a private (0700) QUANTIZE_CACHE_DIR
+# ("" = rebuild per worker).
+QUANTIZE = os.environ.get("QUANTIZE", "")
+QUANTIZE_CACHE_DIR = os.environ.get("QUANTIZE_CACHE_DIR", "")
+
+# CPU workers: map one float32 copy of the weights from this directory instead of
+# loading a private copy each ("" = off; /dev/shm keeps it in RAM).
+SHARED_WEIGHTS_DIR = os.environ.get("SHARED_WEIGHTS_DIR", "")
+
+# Speculative decoding: draft model with the main model's tokenizer ("" = off),
+# proposing NUM_ASSISTANT_TOKENS tokens per main-model step. Only single-clip
+# generate() calls use it (assisted generation does not batch).
+ASSISTANT_MODEL_ID = os.environ.get("ASSISTANT_MODEL_ID", "")
+NUM_ASSISTANT_TOKENS = int(os.environ.get("NUM_ASSISTANT_TOKENS", "5"))
+
 # Global reference time for timeline
 SERVER_START_TIME = time.perf_counter()
 
 # ============================================================================
-# Worker Process
+# Worker Process
+# ============================================================================
+
+def _load_audio(source, suffix: str):
+    """
+    Decode audio to a mono float32 array at 16 kHz.
+
+    Args:
+        source: Path to an audio file, or the encoded bytes themselves
+                (bytes / memoryview, e.g. a shared-memory slot)
+        suffix: File extension (.wav, .webm, or .s16 for raw 16 kHz int16 PCM)
+                describing the encoding
+    """
+    import io
+    import subprocess
+    import numpy as np
+    import librosa
+
+    from_path = isinstance(source, str)
+    if suffix.lower() == ".webm":
+        cmd = [
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel", "error",
+            "-i", source if from_path else "pipe:0",
+            "-f", "f32le",
+            "-ac", "1",
+            "-ar", "16000",
+            "pipe:1",
+        ]
+        proc = subprocess.run(cmd, input=None if from_path else source, capture_output=True, check=False)
+        if proc.returncode != 0:
+            raise RuntimeError(
+                f"ffmpeg decode failed (rc={proc.returncode}): {proc.stderr.decode('utf-8', errors='replace')}"
+            )
+        audio_array = np.frombuffer(proc.stdout, dtype=np.float32)
+        if audio_array.size == 0:
+            raise RuntimeError("ffmpeg decode produced empty audio")
+        return audio_array
+
+    if suffix.lower() == ".s16":
+        # Raw 16 kHz mono int16 PCM (long-form windows cut by the API process)
+        if from_path:
+            with open(source, "rb") as f:
+                source = f.read()
+        return np.frombuffer(source, dtype=np.int16).astype(np.float32) / 32768.0
+
+    audio_array, _sr = librosa.load(source if from_path else io.BytesIO(source), sr=16000, mono=True)
+    return audio_array
+
+
+def _attach_shm(name: str, shm_segments: Dict[str, Any]):
+    """Attach (once per process) to a shared-memory segment created by the API process."""
+    from multiprocessing import shared_memory
+
+    shm = shm_segments.get(name)
+    if shm is None:
+        shm = shared_memory.SharedMemory(name=name)
+        shm_segments[name] = shm
+    return shm
+
+
+def _load_request_audio(request: Dict[str, Any], shm_segments: Dict[str, Any]):
+    """
+    Decode a request's audio from its shared-memory slot, or from its temp file
+    when the payload did not fit in a slot (the file is removed afterwards).
+
+    Args:
+        request: Request dict from request_queue
+        shm_segments: Per-worker cache of attached SharedMemory segments by name
+    """
+    suffix = request.get("audio_suffix") or os.path.splitext(request["audio_path"])[1]
+    slot = request.get("audio_shm")
+    if slot is not None:
+        shm = _attach_shm(slot["name"], shm_segments)
+        with shm.buf[slot["offset"]:slot["offset"] + slot["nbytes"]] as view:
+            return _load_audio(view, suffix)
+
+    try:
+        return _load_audio(request["audio_path"], suffix)
+    finally:
+        _discard_request_audio(request)
+
+
+def _discard_request_audio(request: Dict[str, Any]):
+    """Remove a request's temp audio file, if it has one (shm slots are freed by the API)."""
+    audio_path = request.get("audio_path")
+    try:
+        if audio_path and os.path.exists(audio_path):
+            os.remove(audio_path)
+    except Exception:
+        pass
+
+
+def _collect_batch(request_queue: "mp.Queue", first: Dict[str, Any], max_batch_size: int, window_s: float):
+    """
+    Gather a micro-batch starting from an already-dequeued request.
+
+    Keeps pulling from request_queue until max_batch_size requests are held or
+    window_s has elapsed since the first one was picked up. A window of 0 still
+    drains whatever is already queued, without waiting.
+
+    Returns:
+        (batch, shutdown) where shutdown is True if the None sentinel was seen.
+    """
+    batch = [first]
+    deadline = first["picked_up_at"] + window_s
+    while len(batch) < max_batch_size:
+        remaining = deadline - time.perf_counter()
+        try:
+            if remaining > 0:
+                item = request_queue.get(timeout=remaining)
+            else:
+                item = request_queue.get_nowait()
+        except queue.Empty:
+            break
+        if item is None:
+            return batch, True
+        item["picked_up_at"] = time.perf_counter()
+        batch.append(item)
+    return batch, False
+
+
+def _batch_key(request: Dict[str, Any]):
+    """
+    Requests can share one generate() call only if they use the same prompt and
+    forced language, since Whisper takes a single prompt_ids/language per call.
+    """
+    context = request.get("context")
+    language = request.get("language")
+    context_key = _normalize_context(context)
+    language_key = language.strip().lower() if language is not None and language.strip() else None
+    return context_key, language_key
+
+
+def _prompt_context(request: Dict[str, Any]) -> Optional[str]:
+    """
+    The context to tokenize for a request, exactly as the client sent it.
+    _batch_key's normalized form is only used for grouping and cache lookups.
+    """
+    context = request.get("context")
+    return context if context is not None and context.strip() else None
+
+
+def _extract_features(extractor, audio_arrays: list):
+    """
+    Log-mel features for a list of clips as one float32 (B, n_mels, 3000) tensor
+    on the extractor's device (see whisper_features.LogMelExtractor).
+    """
+    return extractor(audio_arrays, sampling_rate=16000)
+
+
+def _read_features(slot: Dict[str, Any], shm_segments: Dict[str, Any]):
+    """Copy precomputed input_features out of a shared-memory features slot."""
+    import numpy as np
+
+    shm = _attach_shm(slot["name"], shm_segments)
+    view = np.ndarray(tuple(slot["shape"]), dtype=np.float32, buffer=shm.buf, offset=slot["offset"])
+    features = view.copy()
+    del view
+    return features
+
+
+def _read_hidden(slot: Dict[str, Any], shm_segments: Dict[str, Any]):
+    """Copy encoder_hidden_states written by an encoder worker out of a shared-memory slot."""
+    import numpy as np
+    import torch
+
+    shape = tuple(slot["shape"])
+    dtype = getattr(torch, slot["dtype"])
+    nbytes = math.prod(shape) * torch.empty((), dtype=dtype).element_size()
+    shm = _attach_shm(slot["name"], shm_segments)
+    view = np.ndarray((nbytes,), dtype=np.uint8, buffer=shm.buf, offset=slot["offset"])
+    hidden = torch.from_numpy(view.copy()).view(dtype).reshape(shape)
+    del view
+    return hidden
+
+
+def _encoder_timing(request: Dict[str, Any], entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Timing fields for a request encoded by the encoder pool (empty otherwise)."""
+    enc = request.get("encoder")
+    if enc is None or entry.get("hidden") is None:
+        return {}
+    pp = request.get("preprocess")
+    ready_at = pp["preprocess_end"] if pp is not None else request.get("queued_at", enc["picked_up_at"])
+    hidden_write_ms = (enc["hidden_written_at"] - enc["encode_end"]) * 1000.0
+    hidden_read_ms = (entry["t_load"] - entry["t0"]) * 1000.0
+    return {
+        "encoder_worker_id": enc["worker_id"],
+        "encoder_batch_size": enc["batch_size"],
+        "encoder_queue_wait_ms": round((enc["picked_up_at"] - ready_at) * 1000.0, 1),
+        "encode_ms": round((enc["encode_end"] - enc["encode_start"]) * 1000.0, 1),
+        "hidden_write_ms": round(hidden_write_ms, 1),
+        "hidden_read_ms": round(hidden_read_ms, 1),
+        # Cost of moving encoder_hidden_states between processes (excludes queueing)
+        "handoff_ms": round(hidden_write_ms + hidden_read_ms, 1),
+    }
+
+
+def _normalize_context(context: Optional[str]) -> Optional[str]:
+    """Collapse whitespace so trivially different copies of a prompt share a cache entry."""
+    if context is None:
+        return None
+    context = " ".join(context.split())
+    return context or None
+
+
+class PromptCache:
+    """
+    Per-worker LRU of decoder prompts, kept ready on the worker's device.
+
+    prompt_ids (tokenized context) are cached by normalized context string.
+    Entries are evicted least-recently-used once
+    either max_entries or max_bytes (device tensor bytes) would be exceeded.
+
+    Args:
+        processor: WhisperProcessor used to build prompts on a miss
+        device: Device prompt_ids tensors are kept on
+        max_entries: Max cached prompts (0 disables caching)
+        max_bytes: Max total bytes of cached prompt_ids tensors
+    """
+
+    def __init__(self, processor, device, max_entries: int = 512, max_bytes: int = 16 << 20):
+        from collections import OrderedDict
+
+        self.processor = processor
+        self.device = device
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key, build):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], True
+
+        self.misses += 1
+        value = build()
+        nbytes = value.numel() * value.element_size() if hasattr(value, "numel") else 0
+        if self.max_entries == 0 or nbytes > self.max_bytes:
+            return value, False
+
+        self._entries[key] = (value, nbytes)
+        self.bytes += nbytes
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, evicted_bytes) = self._entries.popitem(last=False)
+            self.bytes -= evicted_bytes
+        return value, False
+
+    def prompt_ids(self, context: str):
+        """Returns (prompt_ids tensor on device, hit); looked up by the normalized context."""
+        return self._get(
+            ("context", _normalize_context(context)),
+            lambda: self.processor.get_prompt_ids(context, return_tensors="pt").to(self.device),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+class _DeltaStreamer:
+    """
+    generate() streamer that sends decoded text deltas for the rows of a batch
+    whose request asked for streaming.
+
+    Implements the transformers streamer interface (put/end). The first put()
+    carries the decoder prompt and is skipped; every later put() carries one
+    new token per row. Each streaming row's tokens are re-decoded and only the
+    new suffix is sent, as (request_id, {"partial": True, "delta": ...}) on
+    response_queue. Text ending in an incomplete UTF-8 sequence is held back.
+    """
+
+    def __init__(self, processor, request_ids: list, response_queue: "mp.Queue"):
+        self.processor = processor
+        self.request_ids = request_ids  # per row; None = row does not stream
+        self.response_queue = response_queue
+        self.tokens = [[] for _ in request_ids]
+        self.emitted = ["" for _ in request_ids]
+        self.first_token_at: list = [None for _ in request_ids]
+        self._prompt_seen = False
+
+    def put(self, value):
+        if not self._prompt_seen:
+            self._prompt_seen = True
+            return
+        value = value.reshape(len(self.request_ids), -1).tolist()
+        for row, request_id in enumerate(self.request_ids):
+            if request_id is None:
+                continue
+            self.tokens[row].extend(value[row])
+            text = self.processor.decode(self.tokens[row], skip_special_tokens=True)
+            emitted = self.emitted[row]
+            if text.endswith("\ufffd") or len(text) <= len(emitted) or not text.startswith(emitted):
+                continue
+            now = time.perf_counter()
+            if self.first_token_at[row] is None:
+                self.first_token_at[row] = now
+            self.response_queue.put((request_id, {"partial": True, "delta": text[len(emitted):], "emitted_at": now}))
+            self.emitted[row] = text
+
+    def end(self):
+        pass
+
+
+def _generate_group(
+    model,
+    processor,
+    input_features,
+    context: Optional[str],
+    language: Optional[str],
+    device,
+    dtype,
+    streamer: Optional[_DeltaStreamer] = None,
+    prompt_cache: Optional[PromptCache] = None,
+    stop_rows: Optional["_CancelledRows"] = None,
+    encoder_hidden_states=None,
+    speculation=None,
+    audio_ctx: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Run one batched generate() over clips that share context/language.
+
+    Works on any torch device; CUDA-event timing is only recorded on GPUs
+    (generate_gpu_ms is None elsewhere).
+
+    Args:
+        input_features: float32 (B, n_mels, 3000) numpy array or tensor; None
+                        when encoder_hidden_states is given
+        streamer: Optional _DeltaStreamer for requests that stream text
+        prompt_cache: Optional PromptCache; prompts are rebuilt per call without it
+        stop_rows: Optional _CancelledRows, checked between decoder steps
+        encoder_hidden_states: Optional (B, frames, d_model) tensor from the
+                               encoder pool; generate() then skips the encoder
+        speculation: Optional speculative_decoding.SpeculationCounter; single-clip
+                     calls on input_features use its draft model (assisted generation)
+        audio_ctx: Optional encoder positions for short clips; the encoder runs
+                   over only 2 * audio_ctx mel frames (audio_context.encode)
+
+    Returns:
+        Dict with "transcriptions" (one per clip) and perf_counter timestamps
+        "preprocess_end" (features on device), "generate_start", "generate_end",
+        "done", plus "generate_gpu_ms", "prompt_cache_hit" and "speculative"
+        (acceptance counts, or None when the draft model was not used).
+    """
+    import contextlib
+    import torch
+
+    use_cuda = device.type == "cuda"
+
+    # ---------------------
+    # Host -> device
+    # ---------------------
+    if encoder_hidden_states is not None:
+        encoder_hidden_states = encoder_hidden_states.to(device, dtype=dtype, non_blocking=True)
+    else:
+        if not isinstance(input_features, torch.Tensor):
+            input_features = torch.from_numpy(input_features)
+        input_features = input_features.to(device, dtype=dtype, non_blocking=True)
+    t_preprocess = time.perf_counter()
+
+    # prompt_ids (optional context)
+    # get_prompt_ids properly prepends <|startofprev|> token
+    prompt_ids = None
+    prompt_hits = []
+    if context is not None:
+        if prompt_cache is not None:
+            prompt_ids, hit = prompt_cache.prompt_ids(context)
+            prompt_hits.append(hit)
+        else:
+            prompt_ids = processor.get_prompt_ids(context, return_tensors="pt").to(device)
+
+    generate_kwargs = {
+        "do_sample": False,
+        "num_beams": 1,
+        "temperature": 0.0,
+    }
+    if prompt_ids is not None:
+        generate_kwargs["prompt_ids"] = prompt_ids
+    if language is not None:
+        # Optional language forcing; generate() builds <|lang|><|transcribe|> itself
+        generate_kwargs["language"] = language
+        generate_kwargs["task"] = "transcribe"
+    if streamer is not None:
+        generate_kwargs["streamer"] = streamer
+    if stop_rows is not None:
+        from transformers import StoppingCriteriaList
+
+        generate_kwargs["stopping_criteria"] = StoppingCriteriaList([stop_rows])
+    if encoder_hidden_states is not None:
+        from transformers.modeling_outputs import BaseModelOutput
+
+        generate_kwargs["encoder_outputs"] = BaseModelOutput(last_hidden_state=encoder_hidden_states)
+    # Assisted generation handles one clip per call and needs the audio features
+    speculative = (
+        speculation is not None and encoder_hidden_states is None and audio_ctx is None and input_features.shape[0] == 1
+    )
+    if speculative:
+        generate_kwargs["assistant_model"] = speculation.assistant
+        passes_before = speculation.snapshot()
+
+    # ---------------------
+    # Generate (GPU + CPU orchestration)
+    # CUDA-event timing for GPU-only measurement
+    # ---------------------
+    if use_cuda:
+        torch.cuda.synchronize()
+    t_pre_generate = time.perf_counter()
+
+    gpu_generate_ms = None
+    if use_cuda:
+        start_evt = torch.cuda.Event(enable_timing=True)
+        end_evt = torch.cuda.Event(enable_timing=True)
+        start_evt.record()
+
+    autocast = torch.autocast(device_type="cuda", dtype=dtype) if use_cuda else contextlib.nullcontext()
+    with torch.inference_mode(), autocast:
+        if audio_ctx is not None:
+            from audio_context import encode
+            from transformers.modeling_outputs import BaseModelOutput
+
+            # Encoder counts toward generate time, as it does inside generate()
+            hidden = encode(model.model.encoder, input_features, audio_ctx)
+            generate_kwargs["encoder_outputs"] = BaseModelOutput(last_hidden_state=hidden)
+            input_features = None
+        predicted_ids = model.generate(input_features=input_features, **generate_kwargs)
+
+    if use_cuda:
+        end_evt.record()
+        torch.cuda.synchronize()
+        gpu_generate_ms = float(start_evt.elapsed_time(end_evt))
+    t_post_generate = time.perf_counter()
+
+    # ---------------------
+    # Decode (CPU)
+    # ---------------------
+    predicted_ids_cpu = predicted_ids.detach().cpu()
+    transcriptions = processor.batch_decode(predicted_ids_cpu, skip_special_tokens=True)
+    t_decode = time.perf_counter()
+
+    speculative_stats = None
+    if speculative:
+        from speculative_decoding import generated_tokens
+
+        tokenizer = processor.tokenizer
+        new_tokens = generated_tokens(predicted_ids_cpu[0].tolist(), set(tokenizer.all_special_ids), tokenizer.eos_token_id)
+        speculative_stats = speculation.record(passes_before, new_tokens, detected_language=language is None)
+
+    return {
+        "transcriptions": transcriptions,
+        "preprocess_end": t_preprocess,
+        "generate_start": t_pre_generate,
+        "generate_end": t_post_generate,
+        "done": t_decode,
+        "generate_gpu_ms": gpu_generate_ms,
+        # None when the request had neither context nor language
+        "prompt_cache_hit": all(prompt_hits) if prompt_hits else None,
+        "speculative": speculative_stats,
+    }
+
+
+def _serve_continuous(
+    engine,
+    request_queue: "mp.Queue",
+    response_queue: "mp.Queue",
+    load_requests,
+    extractor,
+    prompt_cache: PromptCache,
+    processor,
+    worker_id: int,
+    gpu_id: int,
+    send_cancelled,
+):
+    """
+    Worker loop for --decode-engine continuous.
+
+    An intake thread takes requests off the queue, loads their audio and
+    extracts features while the engine decodes, holding at most max_slots
+    prepared requests. The loop blocks on it only while the engine is idle;
+    otherwise it submits as many prepared requests as there are free slots and
+    advances the engine by one decoder step, so requests join and leave between
+    steps without waiting on audio decode.
+    Text deltas are not streamed in this mode (stream=true only gets the final result).
+    """
+    worker_logger = logging.getLogger(f"worker-{worker_id}")
+    ready: "queue.Queue" = queue.Queue(maxsize=engine.max_slots)  # prepared entries; None once shut down
+
+    def send_error(request: Dict[str, Any], error: str):
+        response_queue.put((request["request_id"], {
+            "transcription": None,
+            "error": error,
+            "done": True,
+            "timing": {"worker_id": worker_id, "gpu_id": gpu_id},
+        }))
+
+    def intake():
+        shutdown = False
+        while not shutdown:
+            first = request_queue.get()
+            if first is None:
+                break
+            incoming = [first]
+            while len(incoming) < engine.max_slots:
+                try:
+                    item = request_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    shutdown = True
+                    break
+                incoming.append(item)
+
+            picked_up_at = time.perf_counter()
+            for request in incoming:
+                request["picked_up_at"] = picked_up_at
+            response_queue.put((None, {"claimed": [r["request_id"] for r in incoming], "worker_id": worker_id}))
+
+            loaded = load_requests(incoming)
+            raw = [entry for entry in loaded if entry["features"] is None and entry["hidden"] is None]
+            if raw:
+                try:
+                    for entry, features in zip(raw, _extract_features(extractor, [entry["audio"] for entry in raw])):
+                        entry["features"] = features
+                except Exception as e:
+                    worker_logger.exception(f"Error extracting features for {len(raw)} requests: {e}")
+                    for entry in raw:
+                        send_error(entry["request"], str(e))
+                    loaded = [entry for entry in loaded if entry["features"] is not None or entry["hidden"] is not None]
+            for entry in loaded:
+                entry["t_features"] = time.perf_counter()
+                ready.put(entry)
+        ready.put(None)
+
+    threading.Thread(target=intake, name=f"worker-{worker_id}-intake", daemon=True).start()
+
+    shutdown = False
+    while not (shutdown and engine.idle):
+        incoming = []
+        if not shutdown:
+            if engine.idle:
+                incoming.append(ready.get())
+            while len(incoming) < engine.free_slots:
+                try:
+                    incoming.append(ready.get_nowait())
+                except queue.Empty:
+                    break
+
+        for entry in incoming:
+            if entry is None:
+                shutdown = True
+                continue
+            request = entry["request"]
+            try:
+                _, language = _batch_key(request)
+                context = _prompt_context(request)
+                prompt_ids = prompt_cache.prompt_ids(context)[0] if context is not None else None
+                engine.submit(
+                    entry["features"], payload=entry, prompt_ids=prompt_ids, language=language,
+                    encoder_hidden_states=entry["hidden"],
+                )
+            except Exception as e:
+                worker_logger.exception(f"Error submitting request {request['request_id']}: {e}")
+                send_error(request, str(e))
+
+        try:
+            finished = engine.step()
+        except Exception as e:
+            # Engine state is unknown after a failed step: fail everything it holds
+            worker_logger.exception(f"Continuous batching step failed: {e}")
+            for seq in engine.reset():
+                send_error(seq.payload["request"], str(e))
+            continue
+
+        stats = engine.stats()
+        for seq in finished:
+            entry = seq.payload
+            request = entry["request"]
+            if seq.cancelled:
+                send_cancelled(request, "generate")
+                continue
+
+            t_decode_start = time.perf_counter()
+            transcription = processor.decode(seq.output_ids, skip_special_tokens=True)
+            t_decode = time.perf_counter()
+
+            queued_at = request.get("queued_at", 0.0)
+            server_start = request.get("server_start", queued_at)
+            picked_up_time = request["picked_up_at"]
+            pp = request.get("preprocess")
+            enc = request.get("encoder") if entry["hidden"] is not None else None
+            ready_at = pp["preprocess_end"] if pp is not None else queued_at
+            load_start, load_end = (pp["load_start"], pp["load_end"]) if pp is not None else (entry["t0"], entry["t_load"])
+            if enc is not None:
+                ready_at = enc["hidden_written_at"]
+                if pp is None:
+                    load_start, load_end = enc["load_start"], enc["load_end"]
+            joined_at = seq.joined_at or seq.submitted_at
+            timing = {
+                "worker_id": worker_id,
+                "gpu_id": gpu_id,
+                "decode_engine": "continuous",
+                "batch_size": round(seq.batch_sum / seq.steps, 1) if seq.steps else 1,
+                "queue_wait_ms": round((picked_up_time - ready_at) * 1000.0, 1) if ready_at else 0.0,
+                "load_ms": round((load_end - load_start) * 1000.0, 1),
+                "preprocess_ms": round((entry["t_features"] - entry["t_load"]) * 1000.0, 1),
+                "slot_wait_ms": round((joined_at - seq.submitted_at) * 1000.0, 1),
+                "generate_wall_ms": round((seq.finished_at - seq.submitted_at) * 1000.0, 1),
+                "generate_gpu_ms": None,
+                "decode_ms": round((t_decode - t_decode_start) * 1000.0, 1),
+                "total_worker_ms": round((t_decode - entry["t0"]) * 1000.0, 1),
+                "first_token_ms": round((seq.first_token_at - seq.submitted_at) * 1000.0, 1) if seq.first_token_at else None,
+                "tokens": len(seq.output_ids),
+                "engine_tokens_per_s": stats["tokens_per_s"],
+                "engine_slot_utilization": stats["slot_utilization"],
+                "timeline": {
+                    "picked_up": round((picked_up_time - server_start) * 1000, 1),
+                    "generate_start": round((seq.submitted_at - server_start) * 1000, 1),
+                    "generate_end": round((seq.finished_at - server_start) * 1000, 1),
+                    "done": round((t_decode - server_start) * 1000, 1),
+                },
+            }
+            if seq.prefix_hit is not None:
+                timing["prefix_cache_hit"] = seq.prefix_hit
+                timing["prefix_saved_tokens"] = len(seq.prompt_ids) if seq.prefix_hit else 0
+                timing["prefix_cache_hit_rate"] = stats["prefix_cache"]["hit_rate"]
+            if pp is not None:
+                timing["preprocess_worker_id"] = pp["worker_id"]
+                timing["preprocess_queue_wait_ms"] = round((pp["picked_up_at"] - queued_at) * 1000.0, 1)
+            timing.update(_encoder_timing(request, entry))
+
+            response_queue.put((request["request_id"], {
+                "transcription": transcription,
+                "error": None,
+                "done": True,
+                "worker_done_at": time.perf_counter(),
+                "timing": timing,
+            }))
+
+
+def worker_main(
+    worker_id: int,
+    gpu_id: int,
+    request_queue: "mp.Queue",
+    response_queue: "mp.Queue",
+    model_id: str,
+    max_batch_size: int = 1,
+    batch_window_ms: float = 0.0,
+    prompt_cache_entries: int = 512,
+    prompt_cache_bytes: int = 16 << 20,
+    cancel_board: Optional["CancelBoard"] = None,
+    decode_engine: str = "generate",
+    engine_slots: int = 16,
+    assistant_model_id: str = "",
+    num_assistant_tokens: int = 5,
+    prefix_cache_bytes: int = 64 << 20,
+    audio_ctx_buckets: tuple = (),
+    audio_ctx_margin_s: float = 1.0,
+    cpu_threads: int = 1,
+    cpu_cores: Optional[list] = None,
+    quantize: str = "",
+    quantize_cache_dir: str = "",
+    shared_weights_dir: str = "",
+    gpu_memory_fraction: float = 0.0,
+    spawned_at: Optional[float] = None,
+):
+    """
+    Worker process that loads model on a specific GPU (or the CPU) and processes requests.
+
+    Requests are served in micro-batches: after the first request arrives the
+    worker keeps collecting until max_batch_size requests are held or
+    batch_window_ms has passed, then runs one generate() per group of requests
+    sharing the same context/language.
+
+    Args:
+        worker_id: Worker process ID
+        gpu_id: GPU device ID to use; None runs the worker on the CPU
+        request_queue: This worker's own request queue (fed by WorkerRouter)
+        response_queue: Queue for sending responses
+        model_id: Model ID or checkpoint path to load
+        max_batch_size: Max requests per micro-batch (1 disables batching)
+        batch_window_ms: Max time to wait for a micro-batch to fill
+        prompt_cache_entries: Max prompts held in the device-resident PromptCache
+        prompt_cache_bytes: Max bytes of prompt_ids tensors held in the PromptCache
+        cancel_board: Shared CancelBoard; cancelled requests are skipped before
+                      load, before generate, and between decoder steps
+        decode_engine: "generate" (micro-batched model.generate) or "continuous"
+                       (continuous_batching.ContinuousBatchingEngine)
+        engine_slots: Concurrent sequences for the continuous engine
+        assistant_model_id: Draft model for speculative decoding ("" = off); used
+                            for single-clip groups with the generate engine
+        num_assistant_tokens: Draft tokens proposed per main-model step
+        prefix_cache_bytes: Continuous engine PrefixCache budget for context prompts (0 = off)
+        audio_ctx_buckets: Bucket lengths in seconds for reduced audio context
+                           (generate engine; () = always full context)
+        audio_ctx_margin_s: Audio added past the clip end before picking a bucket
+        cpu_threads: Intra-op threads for a CPU worker
+        cpu_cores: CPU ids a CPU worker is pinned to (None = not pinned)
+        quantize: Quantization mode for a CPU worker (quantization.QUANT_MODES, "" = off)
+        quantize_cache_dir: Directory of quantized models shared by workers ("" = no cache)
+        shared_weights_dir: Directory of the memory-mapped weights file CPU workers share ("" = off)
+        gpu_memory_fraction: Cap on this worker's share of its GPU's memory (0 = no cap)
+        spawned_at: time.time() when the parent started this process, for the boot breakdown
+    """
+    process_start_s = time.time() - spawned_at if spawned_at is not None else None
+    boot_t0 = time.perf_counter()
+    worker_logger = logging.getLogger(f"worker-{worker_id}")
+    device_label = f"GPU{gpu_id}" if gpu_id is not None else "CPU"
+    worker_logger.info(f"Starting worker {worker_id} on {device_label}")
+
+    def is_cancelled(request: Dict[str, Any]) -> bool:
+        return cancel_board is not None and cancel_board.is_cancelled(request.get("cancel_token"))
+
+    def send_cancelled(request: Dict[str, Any], stage: str):
+        response_queue.put((request["request_id"], {
+            "transcription": None,
+            "error": "Request cancelled",
+            "cancelled": True,
+            "cancel_stage": stage,
+            "done": True,
+            "timing": {
+                "worker_id": worker_id,
+                "gpu_id": gpu_id,
+            }
+        }))
+
+    try:
+        import numpy as np
+        import torch
+        from transformers import WhisperForConditionalGeneration
+        from whisper_features import LogMelExtractor
+        from continuous_batching import ContinuousBatchingEngine
+        from speculative_decoding import SpeculationCounter, load_assistant
+        from audio_context import pick_audio_ctx
+        from quantization import load_quantized
+        from shared_weights import load_shared
+        from worker_preload import preloaded
+
+        import_s = time.perf_counter() - boot_t0
+
+        if gpu_id is None:
+            # CPU backend: this worker's own cores, all of them used for intra-op parallelism
+            if cpu_cores:
+                os.sched_setaffinity(0, cpu_cores)
+            torch.set_num_threads(max(1, int(cpu_threads)))
+            torch.set_num_interop_threads(1)
+            device = torch.device("cpu")
+            dtype = torch.float32
+        else:
+            # Hard cap torch CPU threads inside each worker (critical for concurrency)
+            torch.set_num_threads(1)
+            torch.set_num_interop_threads(1)
+
+            # Device setup
+            device = torch.device(f"cuda:{gpu_id}")
+            torch.cuda.set_device(gpu_id)
+            if gpu_memory_fraction > 0:
+                # Several workers share this GPU; keep one from starving the others
+                torch.cuda.set_per_process_memory_fraction(gpu_memory_fraction, gpu_id)
+
+            dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+
+        # Increase dynamo cache for variable sequence lengths (optional)
+        try:
+            import torch._dynamo
+            torch._dynamo.config.cache_size_limit = 128
+        except Exception:
+            pass
+
+        # Load model + processor (already parsed when forked from a preloaded forkserver)
+        worker_logger.info(f"Loading model from: {model_id}")
+        load_t0 = time.perf_counter()
+        processor, config = preloaded(model_id)
+        if quantize and device.type == "cpu":
+            model, cached = load_quantized(model_id, quantize, quantize_cache_dir)
+            worker_logger.info(f"Model quantized to {quantize}" + (" (from cache)" if cached else ""))
+        elif shared_weights_dir and device.type == "cpu":
+            model, built = load_shared(model_id, shared_weights_dir)
+            worker_logger.info(f"Model weights mapped from {shared_weights_dir}" + (" (written by this worker)" if built else ""))
+        else:
+            if quantize:
+                worker_logger.warning(f"--quantize {quantize} is CPU-only; loading {dtype}")
+            model = WhisperForConditionalGeneration.from_pretrained(model_id, config=config, torch_dtype=dtype)
+        model.config.forced_decoder_ids = None
+        model.to(device)
+        model.eval()
+
+        # Batched log-mel on the worker's device (skipped for pool-preprocessed requests)
+        extractor = LogMelExtractor(processor.feature_extractor, device)
+
+        # Draft model for assisted generation (same tokenizer as the main model)
+        speculation = None
+        if assistant_model_id and decode_engine == "continuous":
+            worker_logger.warning("--assistant-model-id is ignored with --decode-engine continuous")
+        elif assistant_model_id:
+            worker_logger.info(f"Loading draft model from: {assistant_model_id} ({num_assistant_tokens} tokens per step)")
+            assistant = load_assistant(assistant_model_id, model, num_assistant_tokens, device, dtype)
+            speculation = SpeculationCounter(model, assistant)
+
+        # Tokenized context / language prompts, reused across requests
+        prompt_cache = PromptCache(processor, device, prompt_cache_entries, prompt_cache_bytes)
+
+        load_s = time.perf_counter() - load_t0
+
+        # Compile model (optional; reduce-overhead mode relies on CUDA graphs)
+        compile_t0 = time.perf_counter()
+        compiled_model = model
+        if device.type == "cuda":
+            try:
+                compiled_model = torch.compile(
+                    model,
+                    mode="reduce-overhead",
+                    fullgraph=False,
+                    dynamic=True,
+                )
+                worker_logger.info("Model compiled successfully")
+            except Exception as e:
+                worker_logger.warning(f"torch.compile failed, using eager mode: {e}")
+
+        compile_s = time.perf_counter() - compile_t0
+
+        # Warmup (the first compiled call is where torch.compile does most of its work)
+        worker_logger.info("Warming up model...")
+        warmup_t0 = time.perf_counter()
+        dummy_audio = np.zeros(16000, dtype=np.float32)  # 1 second silence
+        _generate_group(compiled_model, processor, _extract_features(extractor, [dummy_audio]), None, None, device, dtype)
+        max_positions = model.config.max_source_positions
+        if audio_ctx_buckets and decode_engine == "continuous":
+            worker_logger.warning("--audio-ctx-buckets is ignored with --decode-engine continuous")
+            audio_ctx_buckets = ()
+        for bucket_s in audio_ctx_buckets:
+            audio_ctx = pick_audio_ctx(0, (bucket_s,), 0.0, max_positions=max_positions)
+            if audio_ctx is not None:
+                _generate_group(
+                    compiled_model, processor, _extract_features(extractor, [dummy_audio]), None, None, device, dtype,
+                    audio_ctx=audio_ctx,
+                )
+        warmup_s = time.perf_counter() - warmup_t0
+
+        worker_logger.info(
+            f"Worker {worker_id} boot {time.perf_counter() - boot_t0 + (process_start_s or 0.0):.1f}s: "
+            + (f"process start {process_start_s:.1f}s, " if process_start_s is not None else "")
+            + f"import {import_s:.1f}s, weight load {load_s:.1f}s, compile {compile_s:.1f}s, warmup {warmup_s:.1f}s"
+        )
+
+        if device.type == "cuda":
+            actual_device = torch.cuda.current_device()
+            device_name = torch.cuda.get_device_name(actual_device)
+            worker_logger.info(f"Worker {worker_id} ready on cuda:{gpu_id} (actual: {actual_device}, {device_name})")
+        else:
+            worker_logger.info(
+                f"Worker {worker_id} ready on cpu ({torch.get_num_threads()} threads, "
+                f"cores {sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else 'all'})"
+            )
+
+        max_batch_size = max(1, int(max_batch_size))
+        batch_window_s = max(0.0, float(batch_window_ms)) / 1000.0
+
+        # Audio/features shared-memory segments, attached lazily on first use
+        shm_segments: Dict[str, Any] = {}
+
+        # ---------------------
+        # Load audio (CPU), or read features already prepared by the
+        # preprocessing pool, or encoder_hidden_states from the encoder pool;
+        # a bad file only fails its own request
+        # ---------------------
+        def load_requests(batch: list) -> list:
+            loaded = []
+            for request in batch:
+                request_id = request["request_id"]
+                t0 = time.perf_counter()
+                deadline_at = request.get("deadline_at")
+                if deadline_at is not None and t0 > deadline_at:
+                    # Nobody is waiting for this answer any more
+                    _discard_request_audio(request)
+                    response_queue.put((request_id, {
+                        "transcription": None,
+                        "error": "Deadline exceeded before processing",
+                        "expired": True,
+                        "done": True,
+                        "timing": {
+                            "worker_id": worker_id,
+                            "gpu_id": gpu_id,
+                        }
+                    }))
+                    continue
+                if is_cancelled(request):
+                    _discard_request_audio(request)
+                    send_cancelled(request, "queued")
+                    continue
+                try:
+                    hidden_shm = request.get("hidden_shm")
+                    if hidden_shm is not None and hidden_shm.get("shape") is not None:
+                        entry = {"features": None, "audio": None, "hidden": _read_hidden(hidden_shm, shm_segments)}
+                        entry["num_samples"] = None
+                        # The API can hand the slot to the next request right away
+                        response_queue.put((request_id, {"hidden_consumed": True}))
+                    elif request.get("features_shm") is not None:
+                        entry = {"features": _read_features(request["features_shm"], shm_segments), "audio": None, "hidden": None}
+                        entry["num_samples"] = request["preprocess"].get("num_samples")
+                    else:
+                        entry = {"features": None, "audio": _load_request_audio(request, shm_segments), "hidden": None}
+                        entry["num_samples"] = len(entry["audio"])
+                except Exception as e:
+                    worker_logger.exception(f"Error processing request {request_id}: {e}")
+                    response_queue.put((request_id, {
+                        "transcription": None,
+                        "error": str(e),
+                        "done": True,
+                        "timing": {
+                            "worker_id": worker_id,
+                            "gpu_id": gpu_id,
+                        }
+                    }))
+                    continue
+                entry.update(request=request, t0=t0, t_load=time.perf_counter())
+                loaded.append(entry)
+            return loaded
+
+        if decode_engine == "continuous":
+            engine = ContinuousBatchingEngine(
+                model,
+                max_slots=engine_slots,
+                should_cancel=lambda entry: is_cancelled(entry["request"]),
+                prefix_cache_bytes=prefix_cache_bytes,
+            )
+            worker_logger.info(f"Worker {worker_id} decoding with continuous batching ({engine_slots} slots)")
+            _serve_continuous(
+                engine, request_queue, response_queue, load_requests, extractor, prompt_cache, processor,
+                worker_id, gpu_id, send_cancelled,
+            )
+            worker_logger.info(f"Worker {worker_id} shutting down")
+            return
+
+        # Main processing loop
+        shutdown = False
+        while not shutdown:
+            first = request_queue.get()
+            if first is None:  # Shutdown signal
+                break
+            first["picked_up_at"] = time.perf_counter()
+
+            batch, shutdown = _collect_batch(request_queue, first, max_batch_size, batch_window_s)
+            batch_closed_at = time.perf_counter()
+
+            # Tell the API which requests this worker now owns, so they can be
+            # re-dispatched if the process dies before answering
+            response_queue.put((None, {"claimed": [r["request_id"] for r in batch], "worker_id": worker_id}))
+
+            loaded = load_requests(batch)
+
+            # Pre-encoded requests decode separately from ones that still need the
+            # encoder, and short clips are grouped by their audio_ctx bucket
+            groups: Dict[Any, list] = {}
+            for entry in loaded:
+                audio_ctx = None
+                if audio_ctx_buckets and entry["num_samples"] is not None:
+                    audio_ctx = pick_audio_ctx(entry["num_samples"], audio_ctx_buckets, audio_ctx_margin_s, max_positions=max_positions)
+                key = (_batch_key(entry["request"]), entry["hidden"] is not None, audio_ctx)
+                groups.setdefault(key, []).append(entry)
+
+            for ((_, language), encoded, audio_ctx), group in groups.items():
+                for entry in [entry for entry in group if is_cancelled(entry["request"])]:
+                    send_cancelled(entry["request"], "before_generate")
+                    group.remove(entry)
+                if not group:
+                    continue
+
+                try:
+                    # ---------------------
+                    # Preprocess (CPU) whatever the pool has not already done
+                    # ---------------------
+                    group_start = time.perf_counter()
+                    input_features = None
+                    encoder_hidden_states = None
+                    if encoded:
+                        encoder_hidden_states = torch.stack([
+                            entry["hidden"].to(device, non_blocking=True) for entry in group
+                        ])
+                    else:
+                        raw = [entry for entry in group if entry["features"] is None]
+                        if raw:
+                            extracted = _extract_features(extractor, [entry["audio"] for entry in raw])
+                            for entry, features in zip(raw, extracted):
+                                entry["features"] = features
+                        input_features = torch.stack([
+                            torch.as_tensor(entry["features"]).to(device, non_blocking=True) for entry in group
+                        ])
+
+                    stream_ids = [
+                        entry["request"]["request_id"] if entry["request"].get("stream") else None
+                        for entry in group
+                    ]
+                    streamer = None
+                    if any(stream_ids):
+                        streamer = _DeltaStreamer(processor, stream_ids, response_queue)
+                    stop_rows = None
+                    if cancel_board is not None:
+                        stop_rows = _CancelledRows(cancel_board, [entry["request"].get("cancel_token") for entry in group], device)
+
+                    out = _generate_group(
+                        compiled_model,
+                        processor,
+                        input_features,
+                        _prompt_context(group[0]["request"]),
+                        language,
+                        device,
+                        dtype,
+                        streamer=streamer,
+                        prompt_cache=prompt_cache,
+                        stop_rows=stop_rows,
+                        encoder_hidden_states=encoder_hidden_states,
+                        speculation=speculation,
+                        audio_ctx=audio_ctx,
+                    )
+                except Exception as e:
+                    worker_logger.exception(f"Error processing batch of {len(group)} requests: {e}")
+                    for entry in group:
+                        response_queue.put((entry["request"]["request_id"], {
+                            "transcription": None,
+                            "error": str(e),
+                            "done": True,
+                            "timing": {
+                                "worker_id": worker_id,
+                                "gpu_id": gpu_id,
+                                "batch_size": len(group),
+                            }
+                        }))
+                    continue
+
+                t_preprocess = out["preprocess_end"]
+                t_pre_generate = out["generate_start"]
+                t_post_generate = out["generate_end"]
+                t_decode = out["done"]
+                gpu_generate_ms = out["generate_gpu_ms"]
+                wall_generate_ms = (t_post_generate - t_pre_generate) * 1000.0
+                decode_ms = (t_decode - t_post_generate) * 1000.0
+                # From this group's own start, so earlier groups' generate time is not counted
+                group_preprocess_ms = (t_preprocess - group_start) * 1000.0
+
+                for row, (entry, transcription) in enumerate(zip(group, out["transcriptions"])):
+                    request = entry["request"]
+                    request_id = request["request_id"]
+                    if stop_rows is not None and stop_rows.cancelled[row]:
+                        send_cancelled(request, "generate")
+                        continue
+                    queued_at = request.get("queued_at", 0.0)
+                    server_start = request.get("server_start", queued_at)
+                    picked_up_time = request["picked_up_at"]
+                    t0 = entry["t0"]
+                    t_load = entry["t_load"]
+
+                    # Durations; with the preprocessing/encoder pools, load/preprocess
+                    # happened there and queue_wait_ms only covers this worker's queue
+                    pp = request.get("preprocess")
+                    enc = request.get("encoder") if encoded else None
+                    preprocess_ms = group_preprocess_ms
+                    if pp is not None:
+                        ready_at = pp["preprocess_end"]
+                        load_start, load_end = pp["load_start"], pp["load_end"]
+                        preprocess_ms += (pp["preprocess_end"] - pp["load_end"]) * 1000.0
+                    elif enc is not None:
+                        load_start, load_end = enc["load_start"], enc["load_end"]
+                        preprocess_ms += (enc["encode_start"] - enc["load_end"]) * 1000.0
+                    else:
+                        ready_at = queued_at
+                        load_start, load_end = t0, t_load
+                    if enc is not None:
+                        ready_at = enc["hidden_written_at"]
+                    queue_wait_ms = (picked_up_time - ready_at) * 1000 if ready_at else 0.0
+                    batch_wait_ms = (batch_closed_at - picked_up_time) * 1000.0
+                    load_ms = (load_end - load_start) * 1000.0
+                    total_worker_ms = (t_decode - t0) * 1000.0
+
+                    # Absolute timeline (ms from server start)
+                    timeline = {
+                        "picked_up": round((picked_up_time - server_start) * 1000, 1),
+                        "batch_closed": round((batch_closed_at - server_start) * 1000, 1),
+                        "load_start": round((load_start - server_start) * 1000, 1),
+                        "load_end": round((load_end - server_start) * 1000, 1),
+                        "preprocess_end": round((t_preprocess - server_start) * 1000, 1),
+                        "generate_start": round((t_pre_generate - server_start) * 1000, 1),
+                        "generate_end": round((t_post_generate - server_start) * 1000, 1),
+                        "done": round((t_decode - server_start) * 1000, 1),
+                    }
+
+                    # Log
+                    worker_logger.info(
+                        f"Request {request_id} W{worker_id} {device_label} bs={len(group)} "
+                        f"q={queue_wait_ms:.0f}ms bw={batch_wait_ms:.0f}ms ld={load_ms:.0f}ms pp={preprocess_ms:.0f}ms "
+                        f"gen_wall={wall_generate_ms:.0f}ms gen_gpu={gpu_generate_ms or 0.0:.0f}ms "
+                        f"dec={decode_ms:.0f}ms total={total_worker_ms:.0f}ms | "
+                        f"TIMELINE gen=[{timeline['generate_start']:.0f}-{timeline['generate_end']:.0f}]"
+                    )
+
+                    timing = {
+                        "worker_id": worker_id,
+                        "gpu_id": gpu_id,
+                        "batch_size": len(group),
+                        "queue_wait_ms": round(queue_wait_ms, 1),
+                        "batch_wait_ms": round(batch_wait_ms, 1),
+                        "load_ms": round(load_ms, 1),
+                        "preprocess_ms": round(preprocess_ms, 1),
+                        "generate_wall_ms": round(wall_generate_ms, 1),
+                        "generate_gpu_ms": round(gpu_generate_ms, 1) if gpu_generate_ms is not None else None,
+                        "decode_ms": round(decode_ms, 1),
+                        "total_worker_ms": round(total_worker_ms, 1),
+                        "timeline": timeline,
+                    }
+                    if out["prompt_cache_hit"] is not None:
+                        timing["prompt_cache_hit"] = out["prompt_cache_hit"]
+                        timing["prompt_cache_hit_rate"] = prompt_cache.stats()["hit_rate"]
+                    if audio_ctx_buckets:
+                        timing["audio_ctx"] = audio_ctx if audio_ctx is not None else max_positions
+                    if out["speculative"] is not None:
+                        timing["speculative"] = True
+                        timing.update(out["speculative"])
+                        timing["speculation_acceptance_rate"] = speculation.stats()["acceptance_rate"]
+                    if streamer is not None and streamer.first_token_at[row] is not None:
+                        timing["first_token_ms"] = round((streamer.first_token_at[row] - t_pre_generate) * 1000.0, 1)
+                    if pp is not None:
+                        timing["preprocess_worker_id"] = pp["worker_id"]
+                        timing["preprocess_queue_wait_ms"] = round((pp["picked_up_at"] - queued_at) * 1000.0, 1)
+                    timing.update(_encoder_timing(request, entry))
+
+                    result = {
+                        "transcription": transcription,
+                        "error": None,
+                        "done": True,
+                        "worker_done_at": time.perf_counter(),
+                        "timing": timing,
+                    }
+
+                    response_queue.put((request_id, result))
+
+    except Exception as e:
+        worker_logger.exception(f"Worker {worker_id} failed to initialize: {e}")
+        raise
+
+    worker_logger.info(f"Worker {worker_id} shutting down")
+
+
+# ============================================================================
+# Preprocessing Pool
+# ============================================================================
+
+def preprocess_main(
+    preprocess_id: int,
+    preprocess_queue: "mp.Queue",
+    forward_queue: "mp.Queue",
+    response_queue: "mp.Queue",
+    model_id: str,
+    cancel_board: Optional["CancelBoard"] = None,
+):
+    """
+    CPU process that decodes audio and computes log-mel features ahead of the GPU workers.
+
+    Each request carries a shared-memory features slot (allocated by the API
+    process) and the index of the GPU worker the router picked. The features are
+    written into the slot and the request is handed back to the API process,
+    which forwards it to that worker's queue, so decode of the next request
+    overlaps generation of the current one.
+
+    Args:
+        preprocess_id: Preprocessing process ID
+        preprocess_queue: This process's own request queue (fed by the API process's PoolRouter)
+        forward_queue: Queue of prepared requests the API process moves on: to the encoder
+                       pool if they hold a hidden-state slot, else to request["worker_idx"]'s queue
+        response_queue: Queue for sending error responses
+        model_id: Model ID or checkpoint path (only the feature extractor is loaded)
+        cancel_board: Shared CancelBoard; cancelled requests are answered without decoding
+    """
+    pp_logger = logging.getLogger(f"preprocess-{preprocess_id}")
+
+    try:
+        import numpy as np
+        import torch
+        from whisper_features import LogMelExtractor
+
+        torch.set_num_threads(1)
+        extractor = LogMelExtractor.from_pretrained(model_id, "cpu")
+        shm_segments: Dict[str, Any] = {}
+        pp_logger.info(f"Preprocess worker {preprocess_id} ready")
+
+        while True:
+            request = preprocess_queue.get()
+            if request is None:  # Shutdown signal
+                break
+
+            request_id = request["request_id"]
+            picked_up_at = time.perf_counter()
+            # From here on this process may touch the request's slots
+            response_queue.put((None, {"claimed": [request_id], "preprocess_id": preprocess_id}))
+            if cancel_board is not None and cancel_board.is_cancelled(request.get("cancel_token")):
+                _discard_request_audio(request)
+                response_queue.put((request_id, {
+                    "transcription": None,
+                    "error": "Request cancelled",
+                    "cancelled": True,
+                    "cancel_stage": "queued",
+                    "done": True,
+                    "timing": {"preprocess_worker_id": preprocess_id},
+                }))
+                continue
+            try:
+                audio_array = _load_request_audio(request, shm_segments)
+                t_load = time.perf_counter()
+                features = _extract_features(extractor, [audio_array])[0].numpy()
+
+                slot = request["features_shm"]
+                if features.nbytes > slot["nbytes"]:
+                    raise RuntimeError(f"Features ({features.nbytes} bytes) do not fit in a {slot['nbytes']}-byte slot")
+                shm = _attach_shm(slot["name"], shm_segments)
+                view = np.ndarray(features.shape, dtype=np.float32, buffer=shm.buf, offset=slot["offset"])
+                view[...] = features
+                del view
+                slot["shape"] = list(features.shape)
+                t_features = time.perf_counter()
+            except Exception as e:
+                pp_logger.exception(f"Error preprocessing request {request_id}: {e}")
+                response_queue.put((request_id, {
+                    "transcription": None,
+                    "error": str(e),
+                    "done": True,
+                    "timing": {"preprocess_worker_id": preprocess_id},
+                }))
+                continue
+
+            request["preprocess"] = {
+                "worker_id": preprocess_id,
+                "picked_up_at": picked_up_at,
+                "load_start": picked_up_at,
+                "load_end": t_load,
+                "preprocess_end": t_features,
+                "num_samples": len(audio_array),
+            }
+            forward_queue.put(request)
+
+    except Exception as e:
+        pp_logger.exception(f"Preprocess worker {preprocess_id} failed to initialize: {e}")
+        raise
+
+    pp_logger.info(f"Preprocess worker {preprocess_id} shutting down")
+
+
+# ============================================================================
+# Encoder Pool
+# ============================================================================
+
+def encoder_main(
+    encoder_id: int,
+    gpu_id: int,
+    encoder_queue: "mp.Queue",
+    forward_queue: "mp.Queue",
+    response_queue: "mp.Queue",
+    model_id: str,
+    max_batch_size: int = 16,
+    batch_window_ms: float = 5.0,
+    cancel_board: Optional["CancelBoard"] = None,
+):
+    """
+    GPU process that runs only the Whisper encoder, ahead of the decoder workers.
+
+    The encoder is a fixed-shape pass over 3000 frames, so it batches far
+    better than the token-by-token decoder. Requests are collected into
+    batches of up to max_batch_size, encoded together, and each row's
+    encoder_hidden_states is written into the request's shared-memory hidden
+    slot (allocated by the API process) before the request is handed back to
+    the API process, which forwards it to the decoder worker the router picked.
+
+    Args:
+        encoder_id: Encoder process ID
+        gpu_id: GPU device ID to use
+        encoder_queue: This encoder's own request queue (fed by the API process's PoolRouter)
+        forward_queue: Queue of encoded requests the API process moves to request["worker_idx"]'s queue
+        response_queue: Queue for sending error responses
+        model_id: Model ID or checkpoint path (only the encoder is kept)
+        max_batch_size: Max clips per encoder pass
+        batch_window_ms: Max time to wait for an encoder batch to fill
+        cancel_board: Shared CancelBoard; cancelled requests are answered without encoding
+    """
+    enc_logger = logging.getLogger(f"encoder-{encoder_id}")
+
+    def send_error(request: Dict[str, Any], error: str, **fields):
+        response_queue.put((request["request_id"], {
+            "transcription": None,
+            "error": error,
+            "done": True,
+            **fields,
+            "timing": {"encoder_worker_id": encoder_id, "gpu_id": gpu_id},
+        }))
+
+    try:
+        import numpy as np
+        import torch
+        from transformers import WhisperForConditionalGeneration
+        from whisper_features import LogMelExtractor
+
+        torch.set_num_threads(1)
+        torch.set_num_interop_threads(1)
+
+        device = torch.device(f"cuda:{gpu_id}")
+        torch.cuda.set_device(gpu_id)
+        dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+        torch.backends.cuda.matmul.allow_tf32 = True
+        torch.backends.cudnn.allow_tf32 = True
+
+        enc_logger.info(f"Loading encoder from: {model_id}")
+        encoder = WhisperForConditionalGeneration.from_pretrained(model_id, torch_dtype=dtype).model.encoder
+        encoder.to(device)
+        encoder.eval()
+        extractor = LogMelExtractor.from_pretrained(model_id, device)
+
+        with torch.inference_mode():
+            encoder(_extract_features(extractor, [np.zeros(16000, dtype=np.float32)]).to(dtype))
+        enc_logger.info(f"Encoder {encoder_id} ready on cuda:{gpu_id}")
+
+        max_batch_size = max(1, int(max_batch_size))
+        batch_window_s = max(0.0, float(batch_window_ms)) / 1000.0
+        shm_segments: Dict[str, Any] = {}
+
+        shutdown = False
+        while not shutdown:
+            first = encoder_queue.get()
+            if first is None:  # Shutdown signal
+                break
+            picked_up_at = time.perf_counter()
+            batch, shutdown = _collect_batch(encoder_queue, first, max_batch_size, batch_window_s)
+            response_queue.put((None, {"claimed": [r["request_id"] for r in batch], "encoder_id": encoder_id}))
+
+            # Load audio, or read features already prepared by the preprocessing pool
+            loaded = []
+            for request in batch:
+                t0 = time.perf_counter()
+                deadline_at = request.get("deadline_at")
+                if deadline_at is not None and t0 > deadline_at:
+                    _discard_request_audio(request)
+                    send_error(request, "Deadline exceeded before processing", expired=True)
+                    continue
+                if cancel_board is not None and cancel_board.is_cancelled(request.get("cancel_token")):
+                    _discard_request_audio(request)
+                    send_error(request, "Request cancelled", cancelled=True, cancel_stage="queued")
+                    continue
+                try:
+                    if request.get("features_shm") is not None:
+                        entry = {"features": _read_features(request["features_shm"], shm_segments), "audio": None}
+                    else:
+                        entry = {"features": None, "audio": _load_request_audio(request, shm_segments)}
+                except Exception as e:
+                    enc_logger.exception(f"Error loading request {request['request_id']}: {e}")
+                    send_error(request, str(e))
+                    continue
+                entry.update(request=request, t0=t0, t_load=time.perf_counter())
+                loaded.append(entry)
+            if not loaded:
+                continue
+
+            try:
+                raw = [entry for entry in loaded if entry["features"] is None]
+                if raw:
+                    for entry, features in zip(raw, _extract_features(extractor, [entry["audio"] for entry in raw])):
+                        entry["features"] = features
+                input_features = torch.stack([
+                    torch.as_tensor(entry["features"]).to(device, non_blocking=True) for entry in loaded
+                ]).to(dtype)
+
+                torch.cuda.synchronize()
+                t_encode = time.perf_counter()
+                with torch.inference_mode():
+                    hidden = encoder(input_features).last_hidden_state
+                # Raw bytes: numpy has no bfloat16
+                host = hidden.contiguous().view(torch.uint8).cpu().numpy()
+                t_encoded = time.perf_counter()
+            except Exception as e:
+                enc_logger.exception(f"Error encoding batch of {len(loaded)} requests: {e}")
+                for entry in loaded:
+                    send_error(entry["request"], str(e))
+                continue
+
+            for entry, data in zip(loaded, host):
+                request = entry["request"]
+                try:
+                    slot = request["hidden_shm"]
+                    if data.nbytes > slot["nbytes"]:
+                        raise RuntimeError(f"Hidden states ({data.nbytes} bytes) do not fit in a {slot['nbytes']}-byte slot")
+                    shm = _attach_shm(slot["name"], shm_segments)
+                    view = np.ndarray(data.shape, dtype=np.uint8, buffer=shm.buf, offset=slot["offset"])
+                    view[...] = data
+                    del view
+                    slot["shape"] = list(hidden.shape[1:])
+                    slot["dtype"] = str(hidden.dtype).replace("torch.", "")
+                except Exception as e:
+                    enc_logger.exception(f"Error writing hidden states for request {request['request_id']}: {e}")
+                    send_error(request, str(e))
+                    continue
+
+                request["encoder"] = {
+                    "worker_id": encoder_id,
+                    "picked_up_at": picked_up_at,
+                    "batch_size": len(loaded),
+                    "load_start": entry["t0"],
+                    "load_end": entry["t_load"],
+                    "encode_start": t_encode,
+                    "encode_end": t_encoded,
+                    "hidden_written_at": time.perf_counter(),
+                }
+                forward_queue.put(request)
+
+    except Exception as e:
+        enc_logger.exception(f"Encoder {encoder_id} failed to initialize: {e}")
+        raise
+
+    enc_logger.info(f"Encoder {encoder_id} shutting down")
+
+
+# ============================================================================
+# Shared-Memory Slab Pool
+# ============================================================================
+
+class ShmSlabPool:
+    """
+    Bounded pool of fixed-size slots in one shared-memory segment, used to hand
+    uploaded audio bytes (and precomputed features) between processes without
+    touching disk.
+
+    Only the API process allocates and frees slots. Workers attach to the
+    segment by name and read/write their slot through a memoryview. A slot is
+    freed when the worker's response arrives, so it is never reused while a
+    worker may still be using it.
+    """
+
+    def __init__(self, num_slots: int, slot_bytes: int):
+        from multiprocessing import shared_memory
+
+        self.num_slots = num_slots
+        self.slot_bytes = slot_bytes
+        self.shm = shared_memory.SharedMemory(create=True, size=num_slots * slot_bytes)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._free: Optional[asyncio.Queue] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Attach the free-slot queue to the server's event loop."""
+        self._loop = loop
+        self._free = asyncio.Queue()
+        for slot in range(self.num_slots):
+            self._free.put_nowait(slot)
+
+    @property
+    def free_slots(self) -> int:
+        return self._free.qsize() if self._free is not None else 0
+
+    async def acquire(self, timeout: float) -> int:
+        """Wait for a free slot (raises asyncio.TimeoutError after timeout seconds)."""
+        return await asyncio.wait_for(self._free.get(), timeout=timeout)
+
+    def try_acquire(self) -> Optional[int]:
+        """A free slot, or None if all are in use. Event loop only."""
+        try:
+            return self._free.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+
+    def describe(self, slot: int, nbytes: Optional[int] = None) -> Dict[str, Any]:
+        """Descriptor other processes use to locate a slot."""
+        return {
+            "name": self.shm.name,
+            "slot": slot,
+            "offset": slot * self.slot_bytes,
+            "nbytes": self.slot_bytes if nbytes is None else nbytes,
+        }
+
+    def write(self, slot: int, data: bytes) -> Dict[str, Any]:
+        """Copy data into a slot and return the descriptor workers use to read it."""
+        offset = slot * self.slot_bytes
+        self.shm.buf[offset:offset + len(data)] = data
+        return self.describe(slot, len(data))
+
+    def release(self, slot: int):
+        """Return a slot to the pool. Safe to call from any thread."""
+        try:
+            self._loop.call_soon_threadsafe(self._free.put_nowait, slot)
+        except RuntimeError:
+            # event loop is closed
+            pass
+
+    def close(self):
+        try:
+            self.shm.close()
+            self.shm.unlink()
+        except Exception:
+            pass
+
+
+# ============================================================================
+# Cancellation
+# ============================================================================
+
+class CancelBoard:
+    """
+    Lock-free cancelled-request flags shared between the API and all worker processes.
+
+    Every request gets a token (index, ticket) where ticket is a fresh,
+    increasing number and index = ticket % num_slots. Cancelling writes the
+    ticket into flags[index]; a worker sees the request as cancelled when
+    flags[index] == ticket, so slot reuse after wrap-around never matches an
+    older or newer request. Only the API process writes.
+
+    Args:
+        ctx: multiprocessing context the shared array is created in
+        num_slots: Number of flag slots (should exceed requests in flight)
+    """
+
+    def __init__(self, ctx, num_slots: int):
+        self.num_slots = num_slots
+        self.flags = ctx.RawArray("q", num_slots)
+        self._next_ticket = 0
+
+    def token(self) -> tuple:
+        self._next_ticket += 1
+        return self._next_ticket % self.num_slots, self._next_ticket
+
+    def cancel(self, token: Optional[tuple]):
+        if token is not None:
+            index, ticket = token
+            self.flags[index] = ticket
+
+    def is_cancelled(self, token: Optional[tuple]) -> bool:
+        if token is None:
+            return False
+        index, ticket = token
+        return self.flags[index] == ticket
+
+
+class _CancelledRows:
+    """
+    generate() stopping criterion that finishes the rows of a batch whose
+    request has been cancelled, so a batch shrinks as clients go away and
+    generate() returns early once every row is cancelled.
+    """
+
+    def __init__(self, cancel_board: CancelBoard, tokens: list, device):
+        import torch
+
+        self.cancel_board = cancel_board
+        self.tokens = tokens  # per row
+        self.cancelled = [False for _ in tokens]
+        self._torch = torch
+        self._device = device
+        self._none = torch.zeros(len(tokens), dtype=torch.bool, device=device)
+
+    def __call__(self, input_ids, scores, **kwargs):
+        any_cancelled = False
+        for row, token in enumerate(self.tokens):
+            if not self.cancelled[row] and self.cancel_board.is_cancelled(token):
+                self.cancelled[row] = True
+            any_cancelled = any_cancelled or self.cancelled[row]
+        if not any_cancelled:
+            return self._none
+        return self._torch.tensor(self.cancelled, dtype=self._torch.bool, device=self._device)
+
+
+# ============================================================================
+# Request Router
+# ============================================================================
+
+class WorkerRouter:
+    """
+    Keeps one request queue per worker and picks the queue for each request.
+
+    In-flight counts go up on dispatch and down when the worker's response
+    arrives (the response pump calls complete()), so the router always knows
+    how busy each worker is.
+
+    Policies:
+        least_loaded: worker with the fewest in-flight requests (ties broken randomly)
+        p2c:          power-of-two-choices; sample two workers, take the less loaded
+    """
+
+    POLICIES = ("least_loaded", "p2c")
+    SERVICE_EWMA_ALPHA = 0.2
+
+    def __init__(self, queues: list, policy: str = "least_loaded"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown routing policy {policy!r} (expected one of {self.POLICIES})")
+        self.queues = queues
+        self.policy = policy
+        self.inflight = [0] * len(queues)
+        self.dispatched = [0] * len(queues)
+        self._assigned: Dict[str, int] = {}
+        self._claimed = [set() for _ in queues]  # per worker: request ids it has taken off its queue
+        self.service_s: Optional[float] = None  # EWMA of per-request worker time (batch time / batch size)
+        self._lock = threading.Lock()
+
+    def _choose(self, candidates: list) -> int:
+        if self.policy == "p2c" and len(candidates) > 2:
+            a, b = random.sample(candidates, 2)
+            return a if self.inflight[a] <= self.inflight[b] else b
+        least = min(self.inflight[i] for i in candidates)
+        return random.choice([i for i in candidates if self.inflight[i] == least])
+
+    def dispatch(self, request_data: Dict[str, Any], alive: list, timeout: float, via: Optional["PoolRouter"] = None) -> int:
+        """
+        Enqueue a request on the chosen worker's queue.
+
+        Args:
+            request_data: Request dict (must contain "request_id"); the chosen
+                          index is stored in request_data["worker_idx"]
+            alive: Per-worker liveness flags; dead workers are never chosen
+            timeout: Seconds to block on a full queue before raising queue.Full
+            via: Optional intermediate pool (a PoolRouter) that forwards the
+                 request to queues[worker_idx] once it is ready
+
+        Returns:
+            Index of the worker the request was routed to.
+        """
+        request_id = request_data["request_id"]
+        with self._lock:
+            candidates = [i for i, ok in enumerate(alive) if ok]
+            if not candidates:
+                raise RuntimeError("No live workers to route to")
+            idx = self._choose(candidates)
+            self.inflight[idx] += 1
+            self.dispatched[idx] += 1
+            self._assigned[request_id] = idx
+        request_data["worker_idx"] = idx
+        try:
+            (via if via is not None else self.queues[idx]).put(request_data, timeout=timeout)
+        except Exception:
+            self.complete(request_id)
+            with self._lock:
+                self.dispatched[idx] -= 1
+            raise
+        return idx
+
+    def complete(self, request_id: str) -> Optional[int]:
+        """Mark a request finished; returns the worker it had been routed to."""
+        with self._lock:
+            idx = self._assigned.pop(request_id, None)
+            if idx is not None:
+                self.inflight[idx] -= 1
+                self._claimed[idx].discard(request_id)
+        return idx
+
+    def observe_service(self, seconds: float):
+        """Fold one request's amortized worker time into the service-time EWMA."""
+        with self._lock:
+            if self.service_s is None:
+                self.service_s = seconds
+            else:
+                self.service_s += self.SERVICE_EWMA_ALPHA * (seconds - self.service_s)
+
+    def estimate_wait(self, alive: list, queued_ahead: int = 0) -> Optional[float]:
+        """
+        Expected seconds until a new request would be answered: requests ahead
+        of it on the least-loaded live worker, its share of the queued_ahead
+        requests still held by the scheduler, plus itself, at the rolling
+        service time. None until a service time has been observed.
+        """
+        with self._lock:
+            candidates = [i for i, ok in enumerate(alive) if ok]
+            if self.service_s is None or not candidates:
+                return None
+            ahead = min(self.inflight[i] for i in candidates) + queued_ahead / len(candidates)
+            return (ahead + 1) * self.service_s
+
+    def with_capacity(self, alive: list, depth: int) -> list:
+        """Per-worker flags: alive and holding fewer than depth requests."""
+        with self._lock:
+            return [ok and self.inflight[i] < depth for i, ok in enumerate(alive)]
+
+    def claim(self, worker_idx: int, request_ids: list):
+        """Record that a worker has taken these requests off its queue."""
+        with self._lock:
+            for request_id in request_ids:
+                if self._assigned.get(request_id) == worker_idx:
+                    self._claimed[worker_idx].add(request_id)
+
+    def forward(self, request_data: Dict[str, Any], timeout: float):
+        """Enqueue a request a pool process has prepared on its worker's current queue."""
+        with self._lock:
+            q = self.queues[request_data["worker_idx"]]
+        q.put(request_data, timeout=timeout)
+
+    def replace_queue(self, worker_idx: int, new_queue: "mp.Queue") -> "mp.Queue":
+        """Swap in a fresh queue for worker_idx and return the old one."""
+        with self._lock:
+            old, self.queues[worker_idx] = self.queues[worker_idx], new_queue
+        return old
+
+    def release_worker(self, worker_idx: int) -> list:
+        """
+        Forget the requests a dead worker had claimed and return their ids.
+        Requests still sitting in its queue stay assigned until the queue is
+        replaced and drained (see _replace_worker_queue).
+        """
+        with self._lock:
+            lost = list(self._claimed[worker_idx])
+            self._claimed[worker_idx].clear()
+            for request_id in lost:
+                if self._assigned.pop(request_id, None) is not None:
+                    self.inflight[worker_idx] -= 1
+        return lost
+
+    def stats(self) -> Dict[str, Any]:
+        per_worker = []
+        for i, q in enumerate(self.queues):
+            per_worker.append({
+                "worker_id": i,
+                "queue_depth": _queue_depth(q),
+                "in_flight": self.inflight[i],
+                "dispatched": self.dispatched[i],
+            })
+        return {
+            "policy": self.policy,
+            "service_ms": round(self.service_s * 1000.0, 1) if self.service_s is not None else None,
+            "workers": per_worker,
+        }
+
+
+class PoolRouter:
+    """
+    One request queue per process of a pool (preprocess or encoder), filled
+    round-robin over the live processes.
+
+    Only the API process writes these queues, so a process that dies can be
+    replaced together with its queue. Each request is recorded against the
+    process it was sent to until that process forwards it on or answers it, so
+    the supervisor knows which requests a dead process took with it.
+    """
+
+    def __init__(self, queues: list, name: str):
+        self.queues = queues
+        self.name = name
+        self.alive = [True] * len(queues)
+        self._assigned: Dict[str, int] = {}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def any_alive(self) -> bool:
+        return any(self.alive)
+
+    def put(self, request_data: Dict[str, Any], timeout: Optional[float] = None):
+        """
+        Enqueue a request on the next live encoder. Same signature as
+        mp.Queue.put, so it can be passed as WorkerRouter.dispatch's via.
+        """
+        request_id = request_data["request_id"]
+        with self._lock:
+            live = [i for i, ok in enumerate(self.alive) if ok]
+            if not live:
+                raise RuntimeError(f"No live {self.name} workers")
+            self._next = (self._next + 1) % len(live)
+            idx = live[self._next]
+            self._assigned[request_id] = idx
+            q = self.queues[idx]
+        try:
+            q.put(request_data, timeout=timeout)
+        except Exception:
+            self.complete(request_id)
+            raise
+
+    def complete(self, request_id: str) -> Optional[int]:
+        """Forget a request the pool is done with; returns the process it had been sent to."""
+        with self._lock:
+            return self._assigned.pop(request_id, None)
+
+    def fail_process(self, process_idx: int, new_queue: "mp.Queue") -> list:
+        """
+        Stop routing to a dead process, swap in a fresh queue for its
+        replacement, and return the ids of the requests it held or had queued.
+        """
+        with self._lock:
+            self.alive[process_idx] = False
+            old, self.queues[process_idx] = self.queues[process_idx], new_queue
+            lost = [request_id for request_id, idx in self._assigned.items() if idx == process_idx]
+            for request_id in lost:
+                del self._assigned[request_id]
+        old.cancel_join_thread()
+        old.close()
+        return lost
+
+    def mark_alive(self, process_idx: int):
+        with self._lock:
+            self.alive[process_idx] = True
+
+    def depth(self) -> Optional[int]:
+        depths = [_queue_depth(q) for q in self.queues]
+        return None if None in depths else sum(depths)
+
+
+# ============================================================================
+# Request Scheduler
+# ============================================================================
+
+class RequestScheduler:
+    """
+    Priority + earliest-deadline-first ordering of requests waiting in the API
+    process for worker capacity.
+
+    pop() returns the request with the earliest deadline in the highest
+    non-empty priority class. Requests without a deadline are treated as due
+    aging_s after they arrived. Starvation protection: a lower-class request
+    that has waited longer than aging_s is served before everything else
+    (oldest first). Not thread-safe; used from the event loop only.
+
+    Args:
+        aging_s: Wait after which a lower-priority request is promoted
+    """
+
+    CLASSES = ("interactive", "standard", "bulk")
+
+    def __init__(self, aging_s: float):
+        from collections import deque
+
+        self.aging_s = aging_s
+        self._heaps = [[] for _ in self.CLASSES]  # (due, seq, enqueued_at, item)
+        self._fifos = [deque() for _ in self.CLASSES]  # (enqueued_at, seq, item), arrival order
+        self._taken = set()  # seqs popped through one structure, still to drop from the other
+        self._seq = 0
+        self.depth = [0] * len(self.CLASSES)
+        self.promoted = [0] * len(self.CLASSES)
+
+    def __len__(self):
+        return sum(self.depth)
+
+    def push(self, item: Any, priority: str, deadline_at: Optional[float]):
+        import heapq
+
+        rank = self.CLASSES.index(priority)
+        now = time.perf_counter()
+        self._seq += 1
+        due = deadline_at if deadline_at is not None else now + self.aging_s
+        heapq.heappush(self._heaps[rank], (due, self._seq, now, item))
+        self._fifos[rank].append((now, self._seq, item))
+        self.depth[rank] += 1
+
+    def _fifo_head(self, rank: int):
+        fifo = self._fifos[rank]
+        while fifo and fifo[0][1] in self._taken:
+            self._taken.discard(fifo.popleft()[1])
+        return fifo[0] if fifo else None
+
+    def _heap_head(self, rank: int):
+        import heapq
+
+        heap = self._heaps[rank]
+        while heap and heap[0][1] in self._taken:
+            self._taken.discard(heapq.heappop(heap)[1])
+        return heap[0] if heap else None
+
+    def pop(self) -> Optional[tuple]:
+        """Returns (item, priority, enqueued_at) of the next request to dispatch, or None."""
+        import heapq
+
+        now = time.perf_counter()
+
+        # Starving lower-priority requests first, oldest first
+        starving = None
+        for rank in range(1, len(self.CLASSES)):
+            head = self._fifo_head(rank)
+            if head is not None and now - head[0] > self.aging_s and (starving is None or head[0] < starving[1][0]):
+                starving = (rank, head)
+        if starving is not None:
+            rank, (enqueued_at, seq, item) = starving
+            self._fifos[rank].popleft()
+            self._taken.add(seq)
+            self.depth[rank] -= 1
+            self.promoted[rank] += 1
+            return item, self.CLASSES[rank], enqueued_at
+
+        for rank in range(len(self.CLASSES)):
+            if self._heap_head(rank) is not None:
+                _, seq, enqueued_at, item = heapq.heappop(self._heaps[rank])
+                self._taken.add(seq)
+                self.depth[rank] -= 1
+                return item, self.CLASSES[rank], enqueued_at
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "aging_s": self.aging_s,
+            "pending": dict(zip(self.CLASSES, self.depth)),
+            "promoted": dict(zip(self.CLASSES, self.promoted)),
+        }
+
+
+# ============================================================================
+# Result Cache
 # ============================================================================
 
-def worker_main(
-    worker_id: int,
-    gpu_id: int,
-    request_queue: "mp.Queue",
-    response_queue: "mp.Queue",
-    model_id: str,
-):
+class ResultCache:
     """
-    Worker process that loads model on a specific GPU and processes requests.
-    
+    Content-addressed cache of finished transcription responses (API process).
+
+    Keys hash the audio bytes together with everything that changes the output
+    (format, context, language, long-form mode, model id); a client-supplied
+    Idempotency-Key replaces the content part of the key. The memory tier is an
+    LRU bounded by max_entries; the optional disk tier keeps one JSON file per
+    key in disk_dir, bounded by disk_max_bytes. Both tiers expire entries after
+    ttl_s. Disk methods do blocking I/O and are meant for asyncio.to_thread.
+
     Args:
-        worker_id: Worker process ID
-        gpu_id: GPU device ID to use
-        request_queue: Queue for receiving requests
-        response_queue: Queue for sending responses
-        model_id: Model ID or checkpoint path to load
+        model_id: Model the cached results came from (part of every key)
+        max_entries: Max responses held in memory (0 = memory tier off)
+        ttl_s: Seconds a response stays valid
+        disk_dir: Directory for the on-disk tier (None = off)
+        disk_max_bytes: Max total size of the on-disk tier
     """
-    worker_logger = logging.getLogger(f"worker-{worker_id}")
-    worker_logger.info(f"Starting worker {worker_id} on GPU {gpu_id}")
 
-    try:
-        import numpy as np
-        import subprocess
-        import torch
-        from transformers import WhisperProcessor, WhisperForConditionalGeneration
-        import librosa
+    def __init__(
+        self,
+        model_id: str,
+        max_entries: int,
+        ttl_s: float,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 512 << 20,
+    ):
+        from collections import OrderedDict
 
-        # Hard cap torch CPU threads inside each worker (critical for concurrency)
-        torch.set_num_threads(1)
-        torch.set_num_interop_threads(1)
+        self.model_id = model_id
+        self.max_entries = max(0, int(max_entries))
+        self.ttl_s = float(ttl_s)
+        self.disk_dir = disk_dir or None
+        self.disk_max_bytes = int(disk_max_bytes)
+        if self.disk_dir is not None:
+            os.makedirs(self.disk_dir, exist_ok=True)
 
-        # Device setup
-        device = torch.device(f"cuda:{gpu_id}")
-        torch.cuda.set_device(gpu_id)
+        self._entries = OrderedDict()  # key -> (stored_at wall time, response)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
 
-        dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
-        torch.backends.cuda.matmul.allow_tf32 = True
-        torch.backends.cudnn.allow_tf32 = True
+    def key(
+        self,
+        audio_bytes: bytes,
+        suffix: str,
+        context: Optional[str],
+        language: Optional[str],
+        long_form: bool = False,
+        idempotency_key: Optional[str] = None,
+        windows: Optional[Tuple[float, float]] = None,
+    ) -> str:
+        """windows: (chunk_s, overlap_s) of long-form requests, which change the stitched text."""
+        import hashlib
 
-        # Increase dynamo cache for variable sequence lengths (optional)
-        try:
-            import torch._dynamo
-            torch._dynamo.config.cache_size_limit = 128
-        except Exception:
-            pass
+        h = hashlib.sha256()
+        fields = [self.model_id, suffix, context, language, bool(long_form)]
+        if long_form:
+            fields.append(list(windows) if windows is not None else None)
+        h.update(json.dumps(fields).encode("utf-8"))
+        if idempotency_key:
+            h.update(b"idempotency-key\0" + idempotency_key.encode("utf-8"))
+        else:
+            h.update(b"audio\0" + audio_bytes)
+        return h.hexdigest()
 
-        # Load model + processor
-        worker_logger.info(f"Loading model from: {model_id}")
-        processor = WhisperProcessor.from_pretrained(model_id)
-        model = WhisperForConditionalGeneration.from_pretrained(model_id, torch_dtype=dtype)
-        model.config.forced_decoder_ids = None
-        model.to(device)
-        model.eval()
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Memory-tier lookup."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, response = entry
+        if time.time() - stored_at > self.ttl_s:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response
 
-        # Compile model (optional)
+    def put(self, key: str, response: Dict[str, Any], stored_at: Optional[float] = None):
+        """Memory-tier insert, evicting least-recently-used entries."""
+        if self.max_entries == 0:
+            return
+        self._entries[key] = (stored_at if stored_at is not None else time.time(), response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """Disk-tier lookup; a hit is promoted to memory."""
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
         try:
-            compiled_model = torch.compile(
-                model,
-                mode="reduce-overhead",
-                fullgraph=False,
-                dynamic=True,
-            )
-            worker_logger.info("Model compiled successfully")
-        except Exception as e:
-            compiled_model = model
-            worker_logger.warning(f"torch.compile failed, using eager mode: {e}")
+            stored_at = os.path.getmtime(path)
+            if time.time() - stored_at > self.ttl_s:
+                os.remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                response = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self.put(key, response, stored_at=stored_at)
+        return response
 
-        # Warmup
-        worker_logger.info("Warming up model...")
-        dummy_audio = np.zeros(16000, dtype=np.float32)  # 1 second silence
-        dummy_inputs = processor(dummy_audio, sampling_rate=16000, return_tensors="pt")
-        dummy_features = dummy_inputs.input_features.to(device, non_blocking=True)
-
-        with torch.inference_mode(), torch.autocast(device_type="cuda", dtype=dtype):
-            _ = compiled_model.generate(
-                dummy_features,
-                do_sample=False,
-                num_beams=1,
-                temperature=0.0,
-            )
-        torch.cuda.synchronize()
+    def persist(self, key: str, response: Dict[str, Any]):
+        """Disk-tier insert, then trim the directory to disk_max_bytes (oldest first)."""
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            with tempfile.NamedTemporaryFile("w", dir=self.disk_dir, suffix=".tmp", delete=False, encoding="utf-8") as tmp:
+                json.dump(response, tmp)
+            os.replace(tmp.name, path)
 
-        actual_device = torch.cuda.current_device()
-        device_name = torch.cuda.get_device_name(actual_device)
-        worker_logger.info(f"Worker {worker_id} ready on cuda:{gpu_id} (actual: {actual_device}, {device_name})")
+            files = []
+            for entry in os.scandir(self.disk_dir):
+                if entry.name.endswith(".json"):
+                    st = entry.stat()
+                    files.append((st.st_mtime, st.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            now = time.time()
+            for mtime, size, file_path in sorted(files):
+                if total <= self.disk_max_bytes and now - mtime <= self.ttl_s:
+                    break
+                os.remove(file_path)
+                total -= size
+        except OSError as e:
+            logger.warning(f"Result cache disk write failed: {e}")
 
-        # Main processing loop
-        while True:
-            request = request_queue.get()
-            if request is None:  # Shutdown signal
-                break
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "disk_dir": self.disk_dir,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
 
-            request_id = request["request_id"]
-            audio_path = request["audio_path"]
-            context = request.get("context")
-            language = request.get("language")  # Optional: force specific language
-            queued_at = request.get("queued_at", 0.0)
-            server_start = request.get("server_start", queued_at)
 
-            picked_up_time = time.perf_counter()
-            queue_wait_ms = (picked_up_time - queued_at) * 1000 if queued_at else 0.0
+# ============================================================================
+# Metrics
+# ============================================================================
 
-            try:
-                # ---------------------
-                # Load audio (CPU)
-                # ---------------------
-                t0 = time.perf_counter()
-                ext = os.path.splitext(audio_path)[1].lower()
-                if ext == ".webm":
-                    cmd = [
-                        "ffmpeg",
-                        "-hide_banner",
-                        "-loglevel", "error",
-                        "-i", audio_path,
-                        "-f", "f32le",
-                        "-ac", "1",
-                        "-ar", "16000",
-                        "pipe:1",
-                    ]
-                    proc = subprocess.run(cmd, capture_output=True, check=False)
-                    if proc.returncode != 0:
-                        raise RuntimeError(
-                            f"ffmpeg decode failed (rc={proc.returncode}): {proc.stderr.decode('utf-8', errors='replace')}"
-                        )
-                    audio_array = np.frombuffer(proc.stdout, dtype=np.float32)
-                    if audio_array.size == 0:
-                        raise RuntimeError("ffmpeg decode produced empty audio")
-                else:
-                    audio_array, _sr = librosa.load(audio_path, sr=16000, mono=True)
-                t_load = time.perf_counter()
+class ServerMetrics:
+    """
+    Prometheus metrics for the API process.
 
-                # ---------------------
-                # Preprocess (CPU -> GPU)
-                # ---------------------
-                inputs = processor(audio_array, sampling_rate=16000, return_tensors="pt")
-                input_features = inputs.input_features.to(device, non_blocking=True)
-                t_preprocess = time.perf_counter()
-
-                # prompt_ids (optional context)
-                prompt_ids = None
-                if context is not None and context.strip():
-                    # get_prompt_ids properly prepends <|startofprev|> token
-                    prompt_ids = processor.get_prompt_ids(context, return_tensors="pt").to(device)
-
-                # forced_decoder_ids (optional language forcing)
-                # When language is specified, force the model to use that language
-                # instead of auto-detecting from audio
-                forced_decoder_ids = None
-                if language is not None and language.strip():
-                    # Returns list of (position, token_id) tuples like [(1, lang_id), (2, task_id)]
-                    forced_decoder_ids = processor.get_decoder_prompt_ids(
-                        language=language.strip().lower(),
-                        task="transcribe"
-                    )
+    Worker stage timings already travel back in each response's "timing" dict,
+    so they are observed by the response pump thread; nothing extra runs in the
+    workers. Gauges (queue depth, in-flight, alive workers) are computed only
+    when /metrics is scraped.
+    """
 
-                # ---------------------
-                # Generate (GPU + CPU orchestration)
-                # Add CUDA-event timing for GPU-only measurement
-                # ---------------------
-                generate_kwargs = {
-                    "do_sample": False,
-                    "num_beams": 1,
-                    "temperature": 0.0,
-                }
-                if prompt_ids is not None:
-                    generate_kwargs["prompt_ids"] = prompt_ids
-                if forced_decoder_ids is not None:
-                    generate_kwargs["forced_decoder_ids"] = forced_decoder_ids
+    # Per-request "timing" keys aggregated into the stage latency histogram
+    STAGES = (
+        "queue_wait_ms",
+        "batch_wait_ms",
+        "load_ms",
+        "preprocess_ms",
+        "generate_wall_ms",
+        "generate_gpu_ms",
+        "decode_ms",
+        "total_worker_ms",
+        "http_wait_ms",
+    )
+    BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
 
-                torch.cuda.synchronize()
-                t_pre_generate = time.perf_counter()
+    def __init__(self):
+        from prometheus_client import CollectorRegistry, Counter, Histogram
 
-                start_evt = torch.cuda.Event(enable_timing=True)
-                end_evt = torch.cuda.Event(enable_timing=True)
+        self.registry = CollectorRegistry()
+        self.stage_seconds = Histogram(
+            "whisper_stage_latency_seconds",
+            "Per-request latency of each serving stage",
+            ["stage"],
+            buckets=self.BUCKETS_S,
+            registry=self.registry,
+        )
+        self.http_requests = Counter(
+            "whisper_http_requests",
+            "HTTP requests by route and status code",
+            ["route", "status"],
+            registry=self.registry,
+        )
+        self.worker_results = Counter(
+            "whisper_worker_results",
+            "Results returned by workers",
+            ["outcome"],
+            registry=self.registry,
+        )
+        self.result_cache = Counter(
+            "whisper_result_cache_lookups",
+            "Result cache lookups by outcome (hit, coalesced, miss)",
+            ["outcome"],
+            registry=self.registry,
+        )
+        self.class_wait_seconds = Histogram(
+            "whisper_queue_wait_seconds",
+            "Wait from admission until a worker picked the request up, by priority class",
+            ["priority"],
+            buckets=self.BUCKETS_S,
+            registry=self.registry,
+        )
+        self.shed = Counter(
+            "whisper_requests_shed",
+            "Requests rejected at admission (estimated wait over deadline) or dropped by a worker after their deadline",
+            ["reason"],
+            registry=self.registry,
+        )
+        self.cancelled = Counter(
+            "whisper_requests_cancelled",
+            "Requests abandoned after their client went away, by where the work stopped",
+            ["stage"],
+            registry=self.registry,
+        )
+        self.cancel_requests = Counter(
+            "whisper_cancel_requests",
+            "Cancellations issued by the API process",
+            ["reason"],
+            registry=self.registry,
+        )
+        self.prompt_cache = Counter(
+            "whisper_prompt_cache_lookups",
+            "Worker prompt cache lookups by outcome",
+            ["outcome"],
+            registry=self.registry,
+        )
+        self.prefix_cache = Counter(
+            "whisper_prefix_cache_lookups",
+            "Continuous-engine prefix cache lookups by outcome",
+            ["outcome"],
+            registry=self.registry,
+        )
+        self.prefix_saved_tokens = Counter(
+            "whisper_prefix_cache_saved_tokens",
+            "Prompt tokens whose first-decoder-layer prefill was served from the prefix cache",
+            registry=self.registry,
+        )
+        self.generate_by_audio_ctx = Histogram(
+            "whisper_generate_latency_by_audio_ctx_seconds",
+            "generate() wall time by encoder audio context in positions (1500 = full 30 s)",
+            ["audio_ctx"],
+            buckets=self.BUCKETS_S,
+            registry=self.registry,
+        )
+        self.speculative_tokens = Counter(
+            "whisper_speculative_tokens",
+            "Draft-model tokens proposed and accepted in speculative decoding",
+            ["kind"],
+            registry=self.registry,
+        )
+        self.registry.register(_GaugeCollector())
 
-                start_evt.record()
-                with torch.inference_mode(), torch.autocast(device_type="cuda", dtype=dtype):
-                    predicted_ids = compiled_model.generate(input_features, **generate_kwargs)
-                end_evt.record()
+    def observe_result(self, result: Dict[str, Any]):
+        """Record one final worker result (called from the response pump thread)."""
+        if result.get("expired"):
+            self.shed.labels(reason="expired").inc()
+            return
+        if result.get("cancelled"):
+            self.cancelled.labels(stage=result.get("cancel_stage", "unknown")).inc()
+            return
+        self.worker_results.labels(outcome="error" if result.get("error") else "ok").inc()
+        timing = result.get("timing") or {}
+        for stage in self.STAGES:
+            value = timing.get(stage)
+            if value is not None:
+                self.stage_seconds.labels(stage=stage).observe(value / 1000.0)
+        hit = timing.get("prompt_cache_hit")
+        if hit is not None:
+            self.prompt_cache.labels(outcome="hit" if hit else "miss").inc()
+        if timing.get("audio_ctx") is not None and timing.get("generate_wall_ms") is not None:
+            self.generate_by_audio_ctx.labels(audio_ctx=str(timing["audio_ctx"])).observe(timing["generate_wall_ms"] / 1000.0)
+        prefix_hit = timing.get("prefix_cache_hit")
+        if prefix_hit is not None:
+            self.prefix_cache.labels(outcome="hit" if prefix_hit else "miss").inc()
+            self.prefix_saved_tokens.inc(timing["prefix_saved_tokens"])
+        if timing.get("speculative"):
+            self.speculative_tokens.labels(kind="drafted").inc(timing["draft_tokens"])
+            self.speculative_tokens.labels(kind="accepted").inc(timing["accepted_tokens"])
 
-                torch.cuda.synchronize()
-                t_post_generate = time.perf_counter()
+    def render(self) -> bytes:
+        from prometheus_client import generate_latest
 
-                gpu_generate_ms = float(start_evt.elapsed_time(end_evt))
-                wall_generate_ms = (t_post_generate - t_pre_generate) * 1000.0
+        return generate_latest(self.registry)
 
-                # ---------------------
-                # Decode (CPU)
-                # ---------------------
-                predicted_ids_cpu = predicted_ids.detach().cpu()
-                transcription = processor.batch_decode(predicted_ids_cpu, skip_special_tokens=True)[0]
-                t_decode = time.perf_counter()
 
-                # Durations
-                load_ms = (t_load - t0) * 1000.0
-                preprocess_ms = (t_preprocess - t_load) * 1000.0
-                decode_ms = (t_decode - t_post_generate) * 1000.0
-                total_worker_ms = (t_decode - t0) * 1000.0
+class _GaugeCollector:
+    """Scrape-time gauges read from the router, pools and worker processes."""
 
-                # Absolute timeline (ms from server start)
-                timeline = {
-                    "picked_up": round((picked_up_time - server_start) * 1000, 1),
-                    "load_start": round((t0 - server_start) * 1000, 1),
-                    "load_end": round((t_load - server_start) * 1000, 1),
-                    "preprocess_end": round((t_preprocess - server_start) * 1000, 1),
-                    "generate_start": round((t_pre_generate - server_start) * 1000, 1),
-                    "generate_end": round((t_post_generate - server_start) * 1000, 1),
-                    "done": round((t_decode - server_start) * 1000, 1),
-                }
+    def collect(self):
+        from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
 
-                # Log
-                worker_logger.info(
-                    f"Request {request_id} W{worker_id} GPU{gpu_id} "
-                    f"q={queue_wait_ms:.0f}ms ld={load_ms:.0f}ms pp={preprocess_ms:.0f}ms "
-                    f"gen_wall={wall_generate_ms:.0f}ms gen_gpu={gpu_generate_ms:.0f}ms "
-                    f"dec={decode_ms:.0f}ms total={total_worker_ms:.0f}ms | "
-                    f"TIMELINE gen=[{timeline['generate_start']:.0f}-{timeline['generate_end']:.0f}]"
-                )
+        alive = GaugeMetricFamily("whisper_workers_alive", "GPU worker processes alive")
+        alive.add_metric([], sum(1 for w in workers if w.is_alive()))
+        yield alive
 
-                result = {
-                    "transcription": transcription,
-                    "error": None,
-                    "done": True,
-                    "worker_done_at": time.perf_counter(),
-                    "timing": {
-                        "worker_id": worker_id,
-                        "gpu_id": gpu_id,
-                        "queue_wait_ms": round(queue_wait_ms, 1),
-                        "load_ms": round(load_ms, 1),
-                        "preprocess_ms": round(preprocess_ms, 1),
-                        "generate_wall_ms": round(wall_generate_ms, 1),
-                        "generate_gpu_ms": round(gpu_generate_ms, 1),
-                        "decode_ms": round(decode_ms, 1),
-                        "total_worker_ms": round(total_worker_ms, 1),
-                        "timeline": timeline,
-                    },
-                }
+        pending = GaugeMetricFamily("whisper_requests_pending", "Requests awaiting a worker result")
+        pending.add_metric([], len(pending_futures))
+        yield pending
 
-                response_queue.put((request_id, result))
+        if router is not None:
+            depth = GaugeMetricFamily("whisper_worker_queue_depth", "Requests waiting in each worker queue", labels=["worker"])
+            inflight = GaugeMetricFamily("whisper_worker_in_flight", "Requests dispatched to each worker and not yet answered", labels=["worker"])
+            for stats in router.stats()["workers"]:
+                worker = str(stats["worker_id"])
+                if stats["queue_depth"] is not None:
+                    depth.add_metric([worker], stats["queue_depth"])
+                inflight.add_metric([worker], stats["in_flight"])
+            yield depth
+            yield inflight
 
-            except Exception as e:
-                worker_logger.exception(f"Error processing request {request_id}: {e}")
-                response_queue.put((request_id, {
-                    "transcription": None,
-                    "error": str(e),
-                    "done": True,
-                    "timing": {
-                        "worker_id": worker_id,
-                        "gpu_id": gpu_id,
-                    }
-                }))
-            finally:
-                # Clean up temp audio file
-                try:
-                    if audio_path and os.path.exists(audio_path):
-                        os.remove(audio_path)
-                except Exception:
-                    pass
+        if preprocess_router is not None:
+            pp_depth = GaugeMetricFamily("whisper_preprocess_queue_depth", "Requests waiting for the preprocessing pool")
+            depth_value = preprocess_router.depth()
+            if depth_value is not None:
+                pp_depth.add_metric([], depth_value)
+            yield pp_depth
 
-    except Exception as e:
-        worker_logger.exception(f"Worker {worker_id} failed to initialize: {e}")
-        raise
+        if encoder_router is not None:
+            enc_depth = GaugeMetricFamily("whisper_encoder_queue_depth", "Requests waiting for the encoder pool")
+            depth_value = encoder_router.depth()
+            if depth_value is not None:
+                enc_depth.add_metric([], depth_value)
+            yield enc_depth
 
-    worker_logger.info(f"Worker {worker_id} shutting down")
+        restarts = CounterMetricFamily("whisper_worker_restarts", "Times each worker was restarted by the supervisor", labels=["worker"])
+        for i, count in enumerate(worker_restarts):
+            restarts.add_metric([str(i)], count)
+        yield restarts
+
+        if encoder_router is not None:
+            enc_restarts = CounterMetricFamily(
+                "whisper_encoder_restarts", "Times each encoder was restarted by the supervisor", labels=["encoder"],
+            )
+            for i, count in enumerate(encoder_restarts):
+                enc_restarts.add_metric([str(i)], count)
+            yield enc_restarts
+
+        if preprocess_router is not None:
+            pp_restarts = CounterMetricFamily(
+                "whisper_preprocess_restarts", "Times each preprocess worker was restarted by the supervisor",
+                labels=["preprocess"],
+            )
+            for i, count in enumerate(preprocess_restarts):
+                pp_restarts.add_metric([str(i)], count)
+            yield pp_restarts
+
+        free = GaugeMetricFamily("whisper_shm_slots_free", "Free shared-memory slots", labels=["pool"])
+        for name, pool in (("audio", audio_pool), ("features", feature_pool), ("hidden", hidden_pool)):
+            if pool is not None:
+                free.add_metric([name], pool.free_slots)
+        yield free
+
+        if scheduler is not None:
+            sched_depth = GaugeMetricFamily("whisper_scheduler_pending", "Requests waiting in the API scheduler", labels=["priority"])
+            for priority, count in scheduler.stats()["pending"].items():
+                sched_depth.add_metric([priority], count)
+            yield sched_depth
 
 
 # ============================================================================
@@ -346,13 +2470,54 @@ app = FastAPI(
 
 # Global state
 ctx: Optional[mp.context.BaseContext] = None
-request_queue: Optional["mp.Queue"] = None
+router: Optional[WorkerRouter] = None
 response_queue: Optional["mp.Queue"] = None
 workers: list[mp.Process] = []
 
 pending_futures: Dict[str, asyncio.Future] = {}
 pending_lock = threading.Lock()
 response_thread: Optional[threading.Thread] = None
+forward_queue: Optional["mp.Queue"] = None  # prepared requests from the pools, moved to worker queues by _forward_pump
+forward_thread: Optional[threading.Thread] = None
+
+audio_pool: Optional[ShmSlabPool] = None
+feature_pool: Optional[ShmSlabPool] = None
+pending_slots: Dict[str, list] = {}  # request_id -> [(pool, slot), ...], guarded by pending_lock
+claimed_requests: set = set()  # request ids a worker or pool process has taken, guarded by pending_lock
+
+preprocess_router: Optional[PoolRouter] = None
+preprocess_workers: list[mp.Process] = []
+preprocess_args: List[Dict[str, Any]] = []  # preprocess_main kwargs (queue taken from preprocess_router), reused to respawn
+preprocess_restarts: list = []
+preprocess_exit_codes: list = []
+
+hidden_pool: Optional[ShmSlabPool] = None
+encoder_router: Optional[PoolRouter] = None
+encoder_workers: list[mp.Process] = []
+encoder_args: List[Dict[str, Any]] = []  # encoder_main kwargs (queue taken from encoder_router), reused to respawn
+encoder_restarts: list = []
+encoder_exit_codes: list = []
+
+stream_queues: Dict[str, asyncio.Queue] = {}  # request_id -> text deltas (stream=true), guarded by pending_lock
+cancel_board: Optional[CancelBoard] = None
+scheduler: Optional[RequestScheduler] = None
+scheduler_wakeup: Optional[asyncio.Event] = None
+scheduler_task: Optional[asyncio.Task] = None
+pending_requests: Dict[str, Dict[str, Any]] = {}  # request_id -> request_data, for re-dispatch; guarded by pending_lock
+
+# Worker supervisor state (index = worker id)
+worker_args: List[Dict[str, Any]] = []  # worker_main kwargs, reused to respawn a worker
+worker_restarts: list = []
+worker_exit_codes: list = []
+worker_started_at: list = []
+worker_backend: Dict[str, Any] = {}  # device, threads and cores the workers were started with
+supervisor_task: Optional[asyncio.Task] = None
+
+metrics = ServerMetrics()
+
+result_cache: Optional[ResultCache] = None
+inflight_results: Dict[str, asyncio.Future] = {}  # result-cache key -> leader's future (event loop only)
+dispatch_events: Dict[str, asyncio.Event] = {}  # request_id -> set once the scheduler hands it to a worker (event loop only)
 
 
 def _response_pump(loop: asyncio.AbstractEventLoop):
@@ -360,8 +2525,6 @@ def _response_pump(loop: asyncio.AbstractEventLoop):
     Runs in a background thread.
     Drains response_queue and completes the matching asyncio.Future.
     """
-    global response_queue, pending_futures
-
     while True:
         item = response_queue.get()
         if item is None:
@@ -369,8 +2532,67 @@ def _response_pump(loop: asyncio.AbstractEventLoop):
 
         request_id, result = item
 
+        # A worker (or pool process) took requests off its queue
+        if result.get("claimed") is not None:
+            with pending_lock:
+                claimed_requests.update(result["claimed"])
+            if router is not None and result.get("worker_id") is not None:
+                router.claim(result["worker_id"], result["claimed"])
+            continue
+
+        # A decoder worker has copied its hidden states out of the slot
+        if result.get("hidden_consumed"):
+            with pending_lock:
+                slots = pending_slots.get(request_id, [])
+                consumed = [entry for entry in slots if entry[0] is hidden_pool]
+                for entry in consumed:
+                    slots.remove(entry)
+            for pool, slot in consumed:
+                pool.release(slot)
+            if scheduler_wakeup is not None:
+                try:
+                    loop.call_soon_threadsafe(scheduler_wakeup.set)
+                except RuntimeError:
+                    pass
+            continue
+
+        # Streaming text delta: forward it, the request is still running
+        if result.get("partial"):
+            with pending_lock:
+                stream = stream_queues.get(request_id)
+            if stream is not None:
+                try:
+                    loop.call_soon_threadsafe(stream.put_nowait, result)
+                except RuntimeError:
+                    # event loop is closed
+                    pass
+            continue
+
+        if preprocess_router is not None:
+            preprocess_router.complete(request_id)
+        if encoder_router is not None:
+            encoder_router.complete(request_id)
+        if router is not None:
+            router.complete(request_id)
+            timing = result.get("timing") or {}
+            if timing.get("total_worker_ms") is not None:
+                router.observe_service(timing["total_worker_ms"] / 1000.0 / max(1, timing.get("batch_size", 1)))
+            if scheduler_wakeup is not None:
+                # A worker has room again
+                try:
+                    loop.call_soon_threadsafe(scheduler_wakeup.set)
+                except RuntimeError:
+                    pass
+        metrics.observe_result(result)
+
         with pending_lock:
             fut = pending_futures.pop(request_id, None)
+            slots = pending_slots.pop(request_id, [])
+            claimed_requests.discard(request_id)
+
+        # The worker is done with the audio/features, so their slots can be reused
+        for pool, slot in slots:
+            pool.release(slot)
 
         if fut is not None and not fut.done():
             try:
@@ -380,16 +2602,462 @@ def _response_pump(loop: asyncio.AbstractEventLoop):
                 pass
 
 
+def _forward_pump():
+    """
+    Runs in a background thread.
+    Moves requests the preprocess and encoder pools have prepared on: to the
+    encoder pool if they still need encoding, else onto their worker's current
+    queue. Only the API process writes worker and encoder queues, so a
+    respawned process's fresh queue is used by every path at once.
+    """
+    while True:
+        request = forward_queue.get()
+        if request is None:
+            break
+        encoded = request.get("encoder") is not None
+        # A request sent just before its process was declared dead has already been recovered by the supervisor
+        if encoded:
+            if encoder_router.complete(request["request_id"]) is None:
+                continue
+        elif request.get("preprocess") is not None:
+            if preprocess_router.complete(request["request_id"]) is None:
+                continue
+        try:
+            if encoder_router is not None and not encoded and request.get("hidden_shm") is not None:
+                if encoder_router.any_alive():
+                    encoder_router.put(request, timeout=5)
+                    continue
+                request["hidden_shm"] = None  # no encoder left: the decoder worker encodes it
+            router.forward(request, timeout=5)
+        except Exception as e:
+            logger.warning(f"Could not forward request {request['request_id']} to worker {request['worker_idx']}: {e}")
+            _discard_request_audio(request)
+            response_queue.put((request["request_id"], {
+                "transcription": None,
+                "error": "Request queue is full. Please try again later.",
+                "done": True,
+            }))
+
+
+def _spawn_preprocess(preprocess_idx: int) -> mp.Process:
+    """Start (or restart) preprocessing process preprocess_idx on its current queue."""
+    kwargs = {**preprocess_args[preprocess_idx], "preprocess_queue": preprocess_router.queues[preprocess_idx]}
+    p = ctx.Process(target=preprocess_main, kwargs=kwargs, daemon=True)
+    p.start()
+    logger.info(f"Started preprocess worker {preprocess_idx} (PID: {p.pid})")
+    return p
+
+
+def _spawn_encoder(encoder_idx: int) -> mp.Process:
+    """Start (or restart) encoder process encoder_idx on its current queue."""
+    kwargs = {**encoder_args[encoder_idx], "encoder_queue": encoder_router.queues[encoder_idx]}
+    p = ctx.Process(target=encoder_main, kwargs=kwargs, daemon=True)
+    p.start()
+    logger.info(f"Started encoder {encoder_idx} (PID: {p.pid}) on GPU {kwargs['gpu_id']}")
+    return p
+
+
+def _spawn_worker(worker_idx: int) -> mp.Process:
+    """Start (or restart) worker process worker_idx with its original arguments."""
+    kwargs = worker_args[worker_idx]
+    p = ctx.Process(target=worker_main, kwargs={**kwargs, "spawned_at": time.time()}, daemon=True)
+    p.start()
+    if worker_idx < len(worker_started_at):
+        worker_started_at[worker_idx] = time.monotonic()
+    else:
+        worker_started_at.append(time.monotonic())
+    if kwargs["gpu_id"] is not None:
+        where = f"GPU {kwargs['gpu_id']}"
+    else:
+        where = f"CPU ({kwargs['cpu_threads']} threads, cores {kwargs['cpu_cores'] or 'unpinned'})"
+    logger.info(f"Started worker {worker_idx} (PID: {p.pid}) on {where}")
+    return p
+
+
+def _parse_cpulist(text: str) -> set:
+    """Kernel cpulist format ('0-3,8,10-11') -> set of CPU ids."""
+    cpus = set()
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        cpus.update(range(int(lo), int(hi or lo) + 1))
+    return cpus
+
+
+def _numa_nodes() -> list:
+    """CPUs this process may run on, grouped by NUMA node (one group if the topology is unknown)."""
+    import glob
+
+    allowed = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else set(range(os.cpu_count() or 1))
+    nodes = []
+    paths = glob.glob("/sys/devices/system/node/node[0-9]*")
+    for path in sorted(paths, key=lambda p: int(p.rsplit("node", 1)[1])):
+        try:
+            with open(os.path.join(path, "cpulist")) as f:
+                cpus = _parse_cpulist(f.read()) & allowed
+        except (OSError, ValueError):
+            continue
+        if cpus:
+            nodes.append(sorted(cpus))
+    return nodes or [sorted(allowed)]
+
+
+def _cpu_core_sets(num_workers: int, threads_per_worker: int) -> list:
+    """
+    Disjoint core sets for CPU workers, one list of CPU ids per worker.
+
+    Workers are spread round-robin over NUMA nodes and each takes consecutive
+    cores from a single node, so its threads share caches and a memory
+    controller. A worker that no node has room for gets None (not pinned).
+    """
+    free = _numa_nodes()
+    core_sets = []
+    for i in range(num_workers):
+        order = [(i + k) % len(free) for k in range(len(free))]
+        node = next((n for n in order if len(free[n]) >= threads_per_worker), None)
+        if node is None:
+            core_sets.append(None)
+            continue
+        core_sets.append(free[node][:threads_per_worker])
+        del free[node][:threads_per_worker]
+    return core_sets
+
+
+def _recover_request(request_id: str):
+    """
+    Re-dispatch a request whose worker or encoder died, or fail it fast.
+
+    A request can be retried once, and only if its audio is still in a
+    shared-memory slot (slots are held until the response arrives); temp files
+    are deleted by the worker as soon as it loads them.
+    """
+    with pending_lock:
+        request_data = pending_requests.get(request_id)
+        fut = pending_futures.get(request_id)
+    if fut is None or fut.done():
+        # Nobody is waiting any more (timeout, disconnect), but its slots are still held
+        _fail_request(request_id, 503, "Worker exited while processing request")
+        return
+
+    if (
+        request_data is not None
+        and request_data.get("audio_shm") is not None
+        and request_data.get("attempts", 0) < WORKER_MAX_REDISPATCH
+    ):
+        request_data["attempts"] = request_data.get("attempts", 0) + 1
+        # Decode and encode again in the worker; the features/hidden slots may be half written
+        request_data["features_shm"] = None
+        request_data["hidden_shm"] = None
+        request_data.pop("preprocess", None)
+        request_data.pop("encoder", None)
+        with pending_lock:
+            claimed_requests.discard(request_id)
+            slots = pending_slots.get(request_id, [])
+            unused = [entry for entry in slots if entry[0] is hidden_pool]
+            for entry in unused:
+                slots.remove(entry)
+        for pool, slot in unused:
+            pool.release(slot)
+        try:
+            idx = router.dispatch(request_data, [w.is_alive() for w in workers], timeout=5)
+            logger.warning(f"Re-dispatched request {request_id} to worker {idx}")
+            return
+        except Exception as e:
+            logger.warning(f"Could not re-dispatch request {request_id}: {e}")
+
+    _fail_request(request_id, 503, "Worker exited while processing request")
+
+
+def _fail_request(request_id: str, status_code: int, detail: str):
+    """Fail a request that no worker will answer: free its slots and raise in its waiter."""
+    with pending_lock:
+        fut = pending_futures.pop(request_id, None)
+        slots = pending_slots.pop(request_id, [])
+        claimed_requests.discard(request_id)
+    for pool, slot in slots:
+        pool.release(slot)
+    if fut is not None and not fut.done():
+        fut.set_exception(HTTPException(status_code=status_code, detail=detail))
+
+
+def _drain_queue(q: "mp.Queue") -> list:
+    """
+    Requests left in a dead worker's queue. If the worker died holding the
+    queue's reader lock, get() just times out and whatever is behind the lock
+    is left to the request timeout.
+    """
+    items = []
+    while True:
+        try:
+            item = q.get(timeout=0.1)
+        except Exception:  # queue.Empty, or a message the worker had half read
+            break
+        if item is not None:
+            items.append(item)
+    return items
+
+
+async def _replace_worker_queue(worker_idx: int):
+    """
+    Give a dead worker's replacement a fresh queue, since the dead process may
+    hold the old one's reader lock, and re-dispatch what was waiting in the old one.
+    """
+    fresh = ctx.Queue(maxsize=MAX_QUEUE_SIZE)
+    old = router.replace_queue(worker_idx, fresh)
+    worker_args[worker_idx]["request_queue"] = fresh
+    stranded = await asyncio.to_thread(_drain_queue, old)
+    old.cancel_join_thread()
+    old.close()
+    if stranded:
+        logger.warning(f"Re-dispatching {len(stranded)} request(s) queued for worker {worker_idx}")
+
+    for request_data in stranded:
+        request_id = request_data["request_id"]
+        router.complete(request_id)
+        with pending_lock:
+            waiting = request_id in pending_futures
+        if not waiting:
+            _discard_request_audio(request_data)
+            _fail_request(request_id, 503, "Worker exited while processing request")
+            continue
+        alive = [w.is_alive() for w in workers]
+        if not any(alive):
+            alive[worker_idx] = True  # only the replacement is left to serve it
+        try:
+            router.dispatch(request_data, alive, timeout=5)
+        except Exception as e:
+            logger.warning(f"Could not re-dispatch request {request_id}: {e}")
+            _discard_request_audio(request_data)
+            _fail_request(request_id, 503, "Worker exited while processing request")
+
+
+async def _supervise_workers():
+    """
+    Restart workers that exit unexpectedly, on the same GPU and with a fresh
+    queue, and recover the requests they had claimed or left queued. Restarts
+    of a worker that keeps crashing right after start are spaced out
+    exponentially (capped at 60 s). Encoder and preprocessing processes are
+    supervised the same way.
+    """
+    consecutive = [0] * len(workers)
+    restart_at: list = [None] * len(workers)  # set while a dead worker awaits restart
+    encoder_consecutive = [0] * len(encoder_workers)
+    encoder_restart_at: list = [None] * len(encoder_workers)
+    encoder_started_at = [time.monotonic()] * len(encoder_workers)
+    preprocess_consecutive = [0] * len(preprocess_workers)
+    preprocess_restart_at: list = [None] * len(preprocess_workers)
+    preprocess_started_at = [time.monotonic()] * len(preprocess_workers)
+    while True:
+        await asyncio.sleep(WORKER_SUPERVISOR_INTERVAL_S)
+        now = time.monotonic()
+        for i, w in enumerate(workers):
+            if w.is_alive():
+                continue
+            try:
+                if restart_at[i] is None:
+                    worker_exit_codes[i] = w.exitcode
+                    lost = router.release_worker(i)
+                    logger.error(f"Worker {i} exited with code {w.exitcode}; recovering {len(lost)} claimed request(s)")
+                    for request_id in lost:
+                        _recover_request(request_id)
+                    await _replace_worker_queue(i)
+
+                    uptime = now - worker_started_at[i]
+                    consecutive[i] = consecutive[i] + 1 if uptime < 60.0 else 1
+                    restart_at[i] = now + min(60.0, 2.0 ** (consecutive[i] - 1) - 1.0)
+
+                if now >= restart_at[i]:
+                    worker_restarts[i] += 1
+                    workers[i] = _spawn_worker(i)
+                    restart_at[i] = None
+                    scheduler_wakeup.set()
+            except Exception as e:
+                logger.exception(f"Supervisor failed to recover worker {i}: {e}")
+
+        for i, p in enumerate(encoder_workers):
+            if p.is_alive():
+                continue
+            try:
+                if encoder_restart_at[i] is None:
+                    encoder_exit_codes[i] = p.exitcode
+                    # Requests it held or had queued are decoded without the encoder pool
+                    lost = encoder_router.fail_process(i, ctx.Queue(maxsize=MAX_QUEUE_SIZE))
+                    logger.error(f"Encoder {i} exited with code {p.exitcode}; recovering {len(lost)} request(s)")
+                    for request_id in lost:
+                        router.complete(request_id)
+                        _recover_request(request_id)
+
+                    uptime = now - encoder_started_at[i]
+                    encoder_consecutive[i] = encoder_consecutive[i] + 1 if uptime < 60.0 else 1
+                    encoder_restart_at[i] = now + min(60.0, 2.0 ** (encoder_consecutive[i] - 1) - 1.0)
+
+                if now >= encoder_restart_at[i]:
+                    encoder_restarts[i] += 1
+                    encoder_workers[i] = _spawn_encoder(i)
+                    encoder_started_at[i] = time.monotonic()
+                    encoder_router.mark_alive(i)
+                    encoder_restart_at[i] = None
+                    scheduler_wakeup.set()
+            except Exception as e:
+                logger.exception(f"Supervisor failed to recover encoder {i}: {e}")
+
+        for i, p in enumerate(preprocess_workers):
+            if p.is_alive():
+                continue
+            try:
+                if preprocess_restart_at[i] is None:
+                    preprocess_exit_codes[i] = p.exitcode
+                    # Requests it held or had queued are decoded by their worker instead
+                    lost = preprocess_router.fail_process(i, ctx.Queue(maxsize=MAX_QUEUE_SIZE))
+                    logger.error(f"Preprocess worker {i} exited with code {p.exitcode}; recovering {len(lost)} request(s)")
+                    for request_id in lost:
+                        router.complete(request_id)
+                        _recover_request(request_id)
+
+                    uptime = now - preprocess_started_at[i]
+                    preprocess_consecutive[i] = preprocess_consecutive[i] + 1 if uptime < 60.0 else 1
+                    preprocess_restart_at[i] = now + min(60.0, 2.0 ** (preprocess_consecutive[i] - 1) - 1.0)
+
+                if now >= preprocess_restart_at[i]:
+                    preprocess_restarts[i] += 1
+                    preprocess_workers[i] = _spawn_preprocess(i)
+                    preprocess_started_at[i] = time.monotonic()
+                    preprocess_router.mark_alive(i)
+                    preprocess_restart_at[i] = None
+            except Exception as e:
+                logger.exception(f"Supervisor failed to recover preprocess worker {i}: {e}")
+
+
+async def _schedule_requests(worker_depth: int):
+    """
+    Hand requests from the scheduler to workers whenever one has capacity.
+    Woken when a request is admitted and whenever a worker answers.
+    """
+    while True:
+        await scheduler_wakeup.wait()
+        scheduler_wakeup.clear()
+        while len(scheduler) > 0:
+            capacity = router.with_capacity([w.is_alive() for w in workers], worker_depth)
+            if not any(capacity):
+                break
+            use_encoder = encoder_router is not None and encoder_router.any_alive()
+            if use_encoder and hidden_pool.free_slots == 0:
+                # Woken again when a decoder worker has read a hidden-state slot
+                break
+            request_data, priority, enqueued_at = scheduler.pop()
+            request_id = request_data["request_id"]
+
+            with pending_lock:
+                waiting = request_id in pending_futures
+            if not waiting or (cancel_board is not None and cancel_board.is_cancelled(request_data.get("cancel_token"))):
+                # Client gave up while the request was still held here
+                with pending_lock:
+                    slots = pending_slots.pop(request_id, [])
+                for pool, slot in slots:
+                    pool.release(slot)
+                _discard_request_audio(request_data)
+                metrics.cancelled.labels(stage="scheduled").inc()
+                continue
+
+            now = time.perf_counter()
+            if request_data.get("deadline_at") is not None and now > request_data["deadline_at"]:
+                _discard_request_audio(request_data)
+                metrics.shed.labels(reason="expired").inc()
+                _fail_request(request_id, 504, "Deadline exceeded before processing")
+                continue
+
+            request_data["scheduled_at"] = now
+            if use_encoder:
+                # Held from here until the decoder worker has copied the hidden states out
+                hidden_slot = hidden_pool.try_acquire()
+                request_data["hidden_shm"] = hidden_pool.describe(hidden_slot)
+                with pending_lock:
+                    pending_slots.setdefault(request_id, []).append((hidden_pool, hidden_slot))
+            via = None
+            if request_data.get("features_shm") is not None:
+                if preprocess_router.any_alive():
+                    via = preprocess_router
+                else:
+                    request_data["features_shm"] = None  # no preprocess worker left: decoded downstream
+            if via is None and request_data.get("hidden_shm") is not None:
+                via = encoder_router
+            try:
+                router.dispatch(request_data, capacity, timeout=5, via=via)
+            except Exception as e:
+                logger.warning(f"Could not dispatch request {request_id}: {e}")
+                _discard_request_audio(request_data)
+                _fail_request(request_id, 503, "Request queue is full. Please try again later.")
+                continue
+            dispatched = dispatch_events.pop(request_id, None)
+            if dispatched is not None:
+                dispatched.set()
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize queues, response pump, and workers on startup."""
-    global ctx, request_queue, response_queue, workers, response_thread
+    global ctx, router, response_queue, workers, response_thread, audio_pool
+    global feature_pool, preprocess_router, preprocess_workers, result_cache, supervisor_task, cancel_board
+    global scheduler, scheduler_wakeup, scheduler_task, hidden_pool, encoder_router, encoder_workers
+    global worker_backend, forward_queue, forward_thread
+    global LONGFORM_CHUNK_S, LONGFORM_OVERLAP_S, WS_PARTIAL_INTERVAL_MS, WS_MAX_BUFFER_MB, DEFAULT_DEADLINE_MS
 
     num_workers = int(os.environ.get("NUM_WORKERS", "8"))
     model_id = os.environ.get("MODEL_ID", MODEL_ID)
+    max_batch_size = int(os.environ.get("MAX_BATCH_SIZE", MAX_BATCH_SIZE))
+    batch_window_ms = float(os.environ.get("BATCH_WINDOW_MS", BATCH_WINDOW_MS))
+    shm_slots = int(os.environ.get("SHM_SLOTS", SHM_SLOTS))
+    shm_slot_bytes = int(os.environ.get("SHM_SLOT_BYTES", SHM_SLOT_BYTES))
+    routing_policy = os.environ.get("ROUTING_POLICY", ROUTING_POLICY)
+    preprocess_setting = os.environ.get("PREPROCESS_WORKERS", PREPROCESS_WORKERS)
+    num_preprocess = (os.cpu_count() or 1) if preprocess_setting == "auto" else int(preprocess_setting)
+    feature_slots = int(os.environ.get("FEATURE_SLOTS", FEATURE_SLOTS))
+    prompt_cache_entries = int(os.environ.get("PROMPT_CACHE_ENTRIES", PROMPT_CACHE_ENTRIES))
+    decode_engine = os.environ.get("DECODE_ENGINE", DECODE_ENGINE)
+    engine_slots = int(os.environ.get("ENGINE_SLOTS", ENGINE_SLOTS))
+    num_encoders = int(os.environ.get("ENCODER_WORKERS", ENCODER_WORKERS))
+    encoder_batch_size = int(os.environ.get("ENCODER_BATCH_SIZE", ENCODER_BATCH_SIZE))
+    encoder_batch_window_ms = float(os.environ.get("ENCODER_BATCH_WINDOW_MS", ENCODER_BATCH_WINDOW_MS))
+    hidden_slots = int(os.environ.get("HIDDEN_SLOTS", HIDDEN_SLOTS))
+    assistant_model_id = os.environ.get("ASSISTANT_MODEL_ID", ASSISTANT_MODEL_ID)
+    num_assistant_tokens = int(os.environ.get("NUM_ASSISTANT_TOKENS", NUM_ASSISTANT_TOKENS))
+    prefix_cache_bytes = int(float(os.environ.get("PREFIX_CACHE_MB", PREFIX_CACHE_MB)) * (1 << 20))
+    audio_ctx_margin_s = float(os.environ.get("AUDIO_CTX_MARGIN_S", AUDIO_CTX_MARGIN_S))
+    prompt_cache_bytes = int(float(os.environ.get("PROMPT_CACHE_MB", PROMPT_CACHE_MB)) * (1 << 20))
+    result_cache_entries = int(os.environ.get("RESULT_CACHE_ENTRIES", RESULT_CACHE_ENTRIES))
+    result_cache_ttl_s = float(os.environ.get("RESULT_CACHE_TTL_S", RESULT_CACHE_TTL_S))
+    result_cache_dir = os.environ.get("RESULT_CACHE_DIR", RESULT_CACHE_DIR)
+    result_cache_disk_bytes = int(float(os.environ.get("RESULT_CACHE_DISK_MB", RESULT_CACHE_DISK_MB)) * (1 << 20))
+    LONGFORM_CHUNK_S = float(os.environ.get("LONGFORM_CHUNK_S", LONGFORM_CHUNK_S))
+    LONGFORM_OVERLAP_S = float(os.environ.get("LONGFORM_OVERLAP_S", LONGFORM_OVERLAP_S))
+    if not 0 < LONGFORM_CHUNK_S <= 30.0:
+        raise ValueError(f"LONGFORM_CHUNK_S must be in (0, 30] seconds (got {LONGFORM_CHUNK_S})")
+    if not 0 <= LONGFORM_OVERLAP_S < LONGFORM_CHUNK_S:
+        raise ValueError(
+            f"LONGFORM_OVERLAP_S must be in [0, LONGFORM_CHUNK_S) (got {LONGFORM_OVERLAP_S} with chunk {LONGFORM_CHUNK_S})"
+        )
+    WS_PARTIAL_INTERVAL_MS = float(os.environ.get("WS_PARTIAL_INTERVAL_MS", WS_PARTIAL_INTERVAL_MS))
+    WS_MAX_BUFFER_MB = float(os.environ.get("WS_MAX_BUFFER_MB", WS_MAX_BUFFER_MB))
+    DEFAULT_DEADLINE_MS = float(os.environ.get("DEFAULT_DEADLINE_MS", DEFAULT_DEADLINE_MS))
+    device_setting = os.environ.get("DEVICE", DEVICE)
+    cpu_threads = int(os.environ.get("CPU_THREADS_PER_WORKER", CPU_THREADS_PER_WORKER))
+    cpu_pin = os.environ.get("CPU_PIN_WORKERS", "1" if CPU_PIN_WORKERS else "0") != "0"
+    workers_per_device = max(1, int(os.environ.get("WORKERS_PER_DEVICE", WORKERS_PER_DEVICE)))
+    gpu_memory_fraction = float(os.environ.get("GPU_MEMORY_FRACTION", GPU_MEMORY_FRACTION))
+    quantize = os.environ.get("QUANTIZE", QUANTIZE)
+    quantize_cache_dir = os.environ.get("QUANTIZE_CACHE_DIR", QUANTIZE_CACHE_DIR)
+    shared_weights_dir = os.environ.get("SHARED_WEIGHTS_DIR", SHARED_WEIGHTS_DIR)
 
-    # Use a dedicated spawn context (works well with CUDA)
-    ctx = mp.get_context("spawn")
+    # Use a dedicated spawn context (works well with CUDA). The forkserver never
+    # touches CUDA either; it only imports, so its children start warm.
+    start_method = os.environ.get("START_METHOD", START_METHOD)
+    ctx = mp.get_context(start_method)
+    if start_method == "forkserver":
+        # Read by worker_preload when the forkserver imports it; unset under spawn,
+        # so a spawned worker parses the files inside its timed weight-load phase
+        os.environ["WORKER_PRELOAD_MODEL_ID"] = model_id
+        ctx.set_forkserver_preload(["__main__", "worker_preload"])
 
     # Discover GPUs without importing torch globally at module import time
     try:
@@ -398,40 +3066,210 @@ async def startup_event():
     except Exception:
         num_gpus = int(os.environ.get("NUM_GPUS", "0"))
 
-    if num_gpus <= 0:
+    if device_setting == "cuda" and num_gpus <= 0:
         raise RuntimeError("No CUDA GPUs detected (torch.cuda.device_count() == 0).")
 
-    num_workers = min(num_workers, num_gpus)
-    logger.info(f"Starting {num_workers} workers on {num_gpus} GPUs")
+    use_cpu = device_setting == "cpu" or num_gpus <= 0
+    if use_cpu:
+        # A CPU "device" is a core group; workers_per_device workers share each
+        # group, splitting its cores between their intra-op threads
+        num_groups = -(-num_workers // workers_per_device)
+        usable_cores = sum(len(node) for node in _numa_nodes())
+        group_size = cpu_threads * workers_per_device if cpu_threads else max(1, usable_cores // num_groups)
+        cpu_threads = max(1, group_size // workers_per_device)
+        group_cores = _cpu_core_sets(num_groups, group_size) if cpu_pin else [None] * num_groups
+        device_map = [i % num_groups for i in range(num_workers)]
+        core_sets = [group_cores[group] for group in device_map]
+        worker_backend = {
+            "device": "cpu", "threads_per_worker": cpu_threads, "workers_per_device": workers_per_device,
+            "device_map": [f"cpu:{group}" for group in device_map], "cores": core_sets,
+        }
+        logger.info(
+            f"Starting {num_workers} CPU workers x {cpu_threads} threads on {num_groups} core groups "
+            f"of {group_size} cores ({usable_cores} usable cores, pinning {'on' if cpu_pin else 'off'})"
+        )
+        if num_encoders > 0:
+            logger.warning("Encoder pool needs GPUs; disabled on the CPU backend")
+            num_encoders = 0
+        if quantize:
+            logger.info(f"Quantization: {quantize}, cache {quantize_cache_dir or 'off'}")
+        if quantize and shared_weights_dir:
+            # Quantized Linear layers repack their weights on load, so there is nothing to map
+            logger.warning("--shared-weights-dir is ignored with --quantize")
+            shared_weights_dir = ""
+        elif shared_weights_dir:
+            logger.info(f"Shared weights: mapped from {shared_weights_dir}")
+        worker_backend.update(quantize=quantize or None, shared_weights_dir=shared_weights_dir or None)
+    else:
+        if quantize:
+            logger.warning(f"--quantize {quantize} is CPU-only and is ignored on GPUs")
+            quantize = ""
+        if shared_weights_dir:
+            logger.warning("--shared-weights-dir is CPU-only and is ignored on GPUs")
+            shared_weights_dir = ""
+        num_workers = min(num_workers, num_gpus * workers_per_device)
+        device_map = [i % num_gpus for i in range(num_workers)]
+        worker_backend = {
+            "device": "cuda", "gpus": num_gpus, "workers_per_device": workers_per_device,
+            "device_map": [f"cuda:{gpu}" for gpu in device_map],
+            "gpu_memory_fraction": gpu_memory_fraction or None,
+        }
+        logger.info(
+            f"Starting {num_workers} workers on {num_gpus} GPUs (up to {workers_per_device} per GPU"
+            + (f", {gpu_memory_fraction:.2f} of memory each)" if gpu_memory_fraction > 0 else ")")
+        )
     logger.info(f"Using model: {model_id}")
+    logger.info(f"Process start method: {start_method}")
+    logger.info(f"Micro-batching: max_batch_size={max_batch_size} batch_window_ms={batch_window_ms}")
+    logger.info(f"Decode engine: {decode_engine}" + (f" ({engine_slots} slots)" if decode_engine == "continuous" else ""))
+    from audio_context import parse_buckets
 
-    request_queue = ctx.Queue(maxsize=MAX_QUEUE_SIZE)
+    audio_ctx_buckets = parse_buckets(os.environ.get("AUDIO_CTX_BUCKETS", AUDIO_CTX_BUCKETS))
+    if audio_ctx_buckets:
+        logger.info(f"Reduced audio context: buckets {audio_ctx_buckets} s, margin {audio_ctx_margin_s} s")
+    if assistant_model_id:
+        logger.info(f"Speculative decoding: draft {assistant_model_id}, {num_assistant_tokens} tokens per step")
+
+    # One request queue per worker; the router picks which one each request goes to
+    router = WorkerRouter([ctx.Queue(maxsize=MAX_QUEUE_SIZE) for _ in range(num_workers)], routing_policy)
     response_queue = ctx.Queue(maxsize=MAX_QUEUE_SIZE)
+    forward_queue = ctx.Queue(maxsize=MAX_QUEUE_SIZE)
+    logger.info(f"Routing policy: {routing_policy}")
+
+    # Cancelled-request flags, sized so a slot is not reused while its request could still be queued
+    cancel_board = CancelBoard(ctx, 4 * MAX_QUEUE_SIZE)
 
     loop = asyncio.get_running_loop()
+
+    if shm_slots > 0:
+        audio_pool = ShmSlabPool(shm_slots, shm_slot_bytes)
+        audio_pool.bind(loop)
+        logger.info(f"Audio shared memory: {shm_slots} slots x {shm_slot_bytes} bytes ({audio_pool.shm.name})")
+
+    if num_encoders > 0:
+        from transformers import WhisperConfig
+
+        # Room for float32 hidden states; encoders write bf16/fp16, half of that
+        config = WhisperConfig.from_pretrained(model_id)
+        hidden_pool = ShmSlabPool(hidden_slots, config.max_source_positions * config.d_model * 4)
+        hidden_pool.bind(loop)
+        encoder_router = PoolRouter([ctx.Queue(maxsize=MAX_QUEUE_SIZE) for _ in range(num_encoders)], "encoder")
+        encoder_args.clear()
+        encoder_workers = []
+        for i in range(num_encoders):
+            encoder_args.append(dict(
+                encoder_id=i,
+                gpu_id=i % num_gpus,
+                forward_queue=forward_queue,
+                response_queue=response_queue,
+                model_id=model_id,
+                max_batch_size=encoder_batch_size,
+                batch_window_ms=encoder_batch_window_ms,
+                cancel_board=cancel_board,
+            ))
+            encoder_workers.append(_spawn_encoder(i))
+        encoder_restarts[:] = [0] * num_encoders
+        encoder_exit_codes[:] = [None] * num_encoders
+        logger.info(
+            f"Started {num_encoders} encoder workers (batch {encoder_batch_size}, "
+            f"window {encoder_batch_window_ms} ms, {hidden_slots} hidden slots x {hidden_pool.slot_bytes} bytes)"
+        )
+
+    if num_preprocess > 0:
+        feature_pool = ShmSlabPool(feature_slots, FEATURE_SLOT_BYTES)
+        feature_pool.bind(loop)
+        preprocess_router = PoolRouter([ctx.Queue(maxsize=MAX_QUEUE_SIZE) for _ in range(num_preprocess)], "preprocess")
+        preprocess_args.clear()
+        preprocess_workers = []
+        for i in range(num_preprocess):
+            preprocess_args.append(dict(
+                preprocess_id=i,
+                forward_queue=forward_queue,
+                response_queue=response_queue,
+                model_id=model_id,
+                cancel_board=cancel_board,
+            ))
+            preprocess_workers.append(_spawn_preprocess(i))
+        preprocess_restarts[:] = [0] * num_preprocess
+        preprocess_exit_codes[:] = [None] * num_preprocess
+        logger.info(f"Started {num_preprocess} preprocess workers ({feature_slots} feature slots)")
+
+    if result_cache_entries > 0 or result_cache_dir:
+        # Reduced audio context can change transcripts, so it is part of the key
+        cache_model_id = model_id
+        if audio_ctx_buckets:
+            cache_model_id = f"{model_id}#audio_ctx={','.join(map(str, audio_ctx_buckets))}+{audio_ctx_margin_s}"
+        if quantize:
+            cache_model_id = f"{cache_model_id}#{quantize}"
+        result_cache = ResultCache(cache_model_id, result_cache_entries, result_cache_ttl_s, result_cache_dir, result_cache_disk_bytes)
+        logger.info(
+            f"Result cache: {result_cache_entries} entries, ttl={result_cache_ttl_s}s, "
+            f"disk={result_cache_dir or 'off'}"
+        )
+
     response_thread = threading.Thread(target=_response_pump, args=(loop,), daemon=True)
     response_thread.start()
+    forward_thread = threading.Thread(target=_forward_pump, daemon=True)
+    forward_thread.start()
 
     workers = []
+    worker_args.clear()
+    worker_started_at.clear()
     for i in range(num_workers):
-        gpu_id = i % num_gpus
-        p = ctx.Process(
-            target=worker_main,
-            args=(i, gpu_id, request_queue, response_queue, model_id),
-            daemon=True,
-        )
-        p.start()
-        workers.append(p)
-        logger.info(f"Started worker {i} (PID: {p.pid}) on GPU {gpu_id}")
+        gpu_id = None if use_cpu else device_map[i]
+        worker_args.append(dict(
+            worker_id=i,
+            gpu_id=gpu_id,
+            request_queue=router.queues[i],
+            response_queue=response_queue,
+            model_id=model_id,
+            max_batch_size=max_batch_size,
+            batch_window_ms=batch_window_ms,
+            prompt_cache_entries=prompt_cache_entries,
+            prompt_cache_bytes=prompt_cache_bytes,
+            cancel_board=cancel_board,
+            decode_engine=decode_engine,
+            engine_slots=engine_slots,
+            assistant_model_id=assistant_model_id,
+            num_assistant_tokens=num_assistant_tokens,
+            prefix_cache_bytes=prefix_cache_bytes,
+            audio_ctx_buckets=audio_ctx_buckets,
+            audio_ctx_margin_s=audio_ctx_margin_s,
+            cpu_threads=cpu_threads if use_cpu else 1,
+            cpu_cores=core_sets[i] if use_cpu else None,
+            quantize=quantize,
+            quantize_cache_dir=quantize_cache_dir,
+            shared_weights_dir=shared_weights_dir,
+            gpu_memory_fraction=gpu_memory_fraction,
+        ))
+        workers.append(_spawn_worker(i))
+    worker_restarts[:] = [0] * num_workers
+    worker_exit_codes[:] = [None] * num_workers
+
+    supervisor_task = asyncio.create_task(_supervise_workers())
+
+    per_worker_batch = engine_slots if decode_engine == "continuous" else max_batch_size
+    worker_depth = int(os.environ.get("SCHEDULER_WORKER_DEPTH", SCHEDULER_WORKER_DEPTH)) or max(2, 2 * per_worker_batch)
+    aging_ms = float(os.environ.get("PRIORITY_AGING_MS", PRIORITY_AGING_MS))
+    scheduler = RequestScheduler(aging_ms / 1000.0)
+    scheduler_wakeup = asyncio.Event()
+    scheduler_task = asyncio.create_task(_schedule_requests(worker_depth))
+    logger.info(f"Scheduler: {worker_depth} requests per worker, priority aging {aging_ms} ms")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up workers and background response thread."""
-    global workers, request_queue, response_queue, response_thread, pending_futures
+    global audio_pool, feature_pool, hidden_pool
 
     logger.info("Shutting down...")
 
+    # Stop restarting workers and dispatching before asking them to exit
+    if supervisor_task is not None:
+        supervisor_task.cancel()
+    if scheduler_task is not None:
+        scheduler_task.cancel()
+
     # Fail any in-flight requests
     with pending_lock:
         for req_id, fut in list(pending_futures.items()):
@@ -439,11 +3277,47 @@ async def shutdown_event():
                 fut.set_exception(HTTPException(status_code=503, detail="Server shutting down"))
         pending_futures.clear()
 
+    # Stop preprocessing pool first so nothing is forwarded to stopped workers
+    if preprocess_router is not None:
+        for q in preprocess_router.queues:
+            try:
+                q.put(None, timeout=1)
+            except Exception:
+                pass
+
+    for p in preprocess_workers:
+        p.join(timeout=5)
+        if p.is_alive():
+            p.terminate()
+
+    # Then the encoder pool, which forwards to workers too
+    if encoder_router is not None:
+        for q in encoder_router.queues:
+            try:
+                q.put(None, timeout=1)
+            except Exception:
+                pass
+
+    for p in encoder_workers:
+        p.join(timeout=5)
+        if p.is_alive():
+            p.terminate()
+
+    # Nothing is left to forward once both pools have stopped
+    if forward_queue is not None:
+        try:
+            forward_queue.put(None, timeout=1)
+        except Exception:
+            pass
+
+    if forward_thread is not None:
+        forward_thread.join(timeout=2)
+
     # Stop workers
-    if request_queue is not None:
-        for _ in workers:
+    if router is not None:
+        for q in router.queues:
             try:
-                request_queue.put(None, timeout=1)
+                q.put(None, timeout=1)
             except Exception:
                 pass
 
@@ -462,18 +3336,98 @@ async def shutdown_event():
     if response_thread is not None:
         response_thread.join(timeout=2)
 
+    for pool in (audio_pool, feature_pool, hidden_pool):
+        if pool is not None:
+            pool.close()
+    audio_pool = None
+    feature_pool = None
+    hidden_pool = None
+
     logger.info("All workers shut down")
 
 
+def _queue_depth(q: Optional["mp.Queue"]) -> Optional[int]:
+    if q is None:
+        return None
+    try:
+        return q.qsize()
+    except NotImplementedError:  # macOS
+        return None
+
+
 @app.get("/health")
 async def health_check():
+    from shared_weights import process_memory
+
     alive_workers = sum(1 for w in workers if w.is_alive())
+    alive_encoders = sum(1 for p in encoder_workers if p.is_alive())
+    alive_preprocess = sum(1 for p in preprocess_workers if p.is_alive())
     return {
-        "status": "healthy" if alive_workers > 0 else "degraded",
+        "status": (
+            "healthy"
+            if alive_workers > 0 and alive_encoders == len(encoder_workers) and alive_preprocess == len(preprocess_workers)
+            else "degraded"
+        ),
         "workers_alive": alive_workers,
         "workers_total": len(workers),
+        "backend": worker_backend or None,
+        "worker_memory_mb": [process_memory(w.pid) if w.is_alive() else None for w in workers],
+        "audio_pool": {
+            "slots_total": audio_pool.num_slots,
+            "slots_free": audio_pool.free_slots,
+            "slot_bytes": audio_pool.slot_bytes,
+        } if audio_pool is not None else None,
+        "routing": router.stats() if router is not None else None,
+        "scheduler": scheduler.stats() if scheduler is not None else None,
+        "preprocess": {
+            "workers_alive": alive_preprocess,
+            "workers_total": len(preprocess_workers),
+            "queue_depth": preprocess_router.depth(),
+            "feature_slots_free": feature_pool.free_slots if feature_pool is not None else None,
+            "restarts": list(preprocess_restarts),
+            "last_exit_codes": list(preprocess_exit_codes),
+        } if preprocess_router is not None else None,
+        "encoder": {
+            "workers_alive": alive_encoders,
+            "workers_total": len(encoder_workers),
+            "queue_depth": encoder_router.depth(),
+            "hidden_slots_free": hidden_pool.free_slots if hidden_pool is not None else None,
+            "hidden_slot_bytes": hidden_pool.slot_bytes if hidden_pool is not None else None,
+            "restarts": list(encoder_restarts),
+            "last_exit_codes": list(encoder_exit_codes),
+        } if encoder_router is not None else None,
+        "result_cache": result_cache.stats() if result_cache is not None else None,
+        "supervisor": {
+            "restarts": list(worker_restarts),
+            "last_exit_codes": list(worker_exit_codes),
+        },
     }
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape endpoint."""
+    from prometheus_client import CONTENT_TYPE_LATEST
+
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.middleware("http")
+async def count_requests(request: Request, call_next):
+    try:
+        response = await call_next(request)
+    except Exception:
+        metrics.http_requests.labels(route=_route_label(request), status="500").inc()
+        raise
+    metrics.http_requests.labels(route=_route_label(request), status=str(response.status_code)).inc()
+    return response
+
+
+def _route_label(request: Request) -> str:
+    # Route template rather than raw path, so unknown URLs share one label
+    route = request.scope.get("route")
+    return getattr(route, "path", "other")
+
+
 @app.get("/ping")
 async def ping():
     """
@@ -486,15 +3440,62 @@ async def ping():
     return {"status": "ok", "workers_alive": alive_workers, "workers_total": len(workers)}
 
 
+def _cancel_request(request_data: Dict[str, Any], reason: str):
+    """
+    Flag a dispatched request so workers skip or abandon it.
+
+    If no worker or pool process has claimed it yet, its slots are freed right
+    away: whoever dequeues it checks the flag before touching them. A claimed
+    request's slots are freed when its worker answers, or by the supervisor if
+    the worker dies.
+    """
+    if cancel_board is None or request_data.get("cancel_token") is None:
+        return
+    cancel_board.cancel(request_data["cancel_token"])
+    metrics.cancel_requests.labels(reason=reason).inc()
+    request_id = request_data["request_id"]
+    with pending_lock:
+        if request_id in claimed_requests:
+            return
+        slots = pending_slots.pop(request_id, [])
+    for pool, slot in slots:
+        pool.release(slot)
+
+
+async def _cancel_on_disconnect(request: Request, coro):
+    """
+    Await coro, cancelling it if the HTTP client disconnects first.
+    Starlette does not cancel a handler on disconnect, so poll for it.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_S)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                # Nobody will read this; 499 = client closed request
+                return JSONResponse({"detail": "Client disconnected"}, status_code=499)
+    finally:
+        if not task.done():
+            task.cancel()
+
+
 async def _run_transcription(
     audio_bytes: bytes,
     suffix: str,
     context: Optional[str],
     language: Optional[str] = None,
+    delta_queue: Optional[asyncio.Queue] = None,
+    deadline_ms: Optional[float] = None,
+    priority: str = "standard",
+    dispatched: Optional[asyncio.Event] = None,
 ) -> Dict[str, Any]:
     """
     Shared request path for /transcribe and /invocations.
-    Writes bytes to a temp file, enqueues to a GPU worker, and awaits the result.
+    Hands the bytes to a worker through a shared-memory slot (or a temp file if
+    they do not fit in one), enqueues the request, and awaits the result.
     
     Args:
         audio_bytes: Raw audio file bytes
@@ -502,8 +3503,15 @@ async def _run_transcription(
         context: Optional context/prompt text for conditioning transcription
         language: Optional language code (e.g., "en", "es", "zh") to force.
                   If None, auto-detects language from audio.
+        delta_queue: If given, the worker streams text deltas and the response
+                     pump puts them on this queue as they are generated
+        deadline_ms: Time budget for the whole request (default DEFAULT_DEADLINE_MS).
+                     Rejected with 429 up front if the estimated wait exceeds it;
+                     workers drop the request once it has passed.
+        priority: RequestScheduler class ("interactive", "standard" or "bulk")
+        dispatched: Optional event set once the request has been handed to a worker
     """
-    if request_queue is None or response_queue is None:
+    if router is None or response_queue is None or scheduler is None:
         raise HTTPException(status_code=503, detail="Server not initialized yet")
 
     # Check workers
@@ -511,15 +3519,60 @@ async def _run_transcription(
     if alive_workers == 0:
         raise HTTPException(status_code=503, detail="No workers available to process request")
 
+    # Admission control against the request's deadline
+    if deadline_ms is None and DEFAULT_DEADLINE_MS > 0:
+        deadline_ms = DEFAULT_DEADLINE_MS
+    deadline_at: Optional[float] = None
+    if deadline_ms is not None:
+        deadline_s = deadline_ms / 1000.0
+        deadline_at = time.perf_counter() + deadline_s
+        estimate_s = router.estimate_wait([w.is_alive() for w in workers], queued_ahead=len(scheduler))
+        if estimate_s is not None and estimate_s > deadline_s:
+            metrics.shed.labels(reason="admission").inc()
+            raise HTTPException(
+                status_code=429,
+                detail=f"Estimated wait {estimate_s * 1000.0:.0f} ms exceeds deadline {deadline_ms:.0f} ms",
+                headers={"Retry-After": str(max(1, math.ceil(estimate_s - deadline_s)))},
+            )
+
+    if len(scheduler) >= MAX_QUEUE_SIZE:
+        raise HTTPException(status_code=503, detail="Request queue is full. Please try again later.")
+
     request_id = str(uuid.uuid4())
 
-    # Save audio to temp file
-    try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, prefix=f"whisper_{request_id}_") as tmp:
-            tmp.write(audio_bytes)
-            audio_path = tmp.name
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save audio bytes: {e}")
+    # Hand off audio: shared-memory slot if it fits, otherwise a temp file
+    slot_wait_ms = 0.0
+    slot: Optional[int] = None
+    audio_shm: Optional[Dict[str, Any]] = None
+    audio_path: Optional[str] = None
+    if audio_pool is not None and len(audio_bytes) <= audio_pool.slot_bytes:
+        t_slot = time.perf_counter()
+        try:
+            slot = await audio_pool.acquire(timeout=REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Audio buffer pool is full. Please try again later.")
+        slot_wait_ms = (time.perf_counter() - t_slot) * 1000.0
+        audio_shm = audio_pool.write(slot, audio_bytes)
+    else:
+        try:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, prefix=f"whisper_{request_id}_") as tmp:
+                tmp.write(audio_bytes)
+                audio_path = tmp.name
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to save audio bytes: {e}")
+
+    # Reserve a features slot for the preprocessing pool to fill
+    features_shm: Optional[Dict[str, Any]] = None
+    slots = [(audio_pool, slot)] if slot is not None else []
+    if feature_pool is not None:
+        try:
+            features_slot = await feature_pool.acquire(timeout=REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            for pool, pool_slot in slots:
+                pool.release(pool_slot)
+            raise HTTPException(status_code=503, detail="Feature buffer pool is full. Please try again later.")
+        features_shm = feature_pool.describe(features_slot)
+        slots.append((feature_pool, features_slot))
 
     # Create per-request future
     loop = asyncio.get_running_loop()
@@ -527,39 +3580,61 @@ async def _run_transcription(
 
     with pending_lock:
         pending_futures[request_id] = fut
+        if slots:
+            pending_slots[request_id] = slots
+        if delta_queue is not None:
+            stream_queues[request_id] = delta_queue
 
     # Enqueue request
     queued_at = time.perf_counter()
     request_data = {
         "request_id": request_id,
         "audio_path": audio_path,
+        "audio_shm": audio_shm,
+        "audio_suffix": suffix,
+        "features_shm": None,
+        "hidden_shm": None,  # reserved by the scheduler when it sends the request to the encoder pool
         "context": context,
         "language": language,
+        "stream": delta_queue is not None,
         "queued_at": queued_at,
+        "deadline_at": deadline_at,
+        "cancel_token": cancel_board.token() if cancel_board is not None else None,
+        "priority": priority,
         "server_start": SERVER_START_TIME,
     }
+    if features_shm is not None:
+        # The preprocessing pool fills features_shm, then forwards to the chosen worker
+        request_data["features_shm"] = features_shm
+    with pending_lock:
+        pending_requests[request_id] = request_data
 
-    try:
-        request_queue.put(request_data, timeout=5)
-    except Exception:
-        with pending_lock:
-            pending_futures.pop(request_id, None)
-        try:
-            os.remove(audio_path)
-        except Exception:
-            pass
-        raise HTTPException(status_code=503, detail="Request queue is full. Please try again later.")
+    # The scheduler dispatches it once a worker has capacity
+    if dispatched is not None:
+        dispatch_events[request_id] = dispatched
+    scheduler.push(request_data, priority, deadline_at)
+    scheduler_wakeup.set()
 
     # Await response (no polling)
     try:
         result = await asyncio.wait_for(fut, timeout=REQUEST_TIMEOUT)
     except asyncio.TimeoutError:
+        _cancel_request(request_data, "timeout")
         raise HTTPException(status_code=504, detail="Request timed out waiting for transcription")
+    except asyncio.CancelledError:
+        # Client disconnected (or a coalesced/streaming caller went away)
+        _cancel_request(request_data, "disconnect")
+        raise
     finally:
+        dispatch_events.pop(request_id, None)
         with pending_lock:
             pending_futures.pop(request_id, None)
+            stream_queues.pop(request_id, None)
+            pending_requests.pop(request_id, None)
 
     # Error handling
+    if result.get("expired"):
+        raise HTTPException(status_code=504, detail=result["error"])
     if result.get("error"):
         raise HTTPException(status_code=500, detail=f"Transcription failed: {result['error']}")
 
@@ -574,15 +3649,365 @@ async def _run_transcription(
     if "timing" in result:
         response_data["timing"] = dict(result["timing"])
         response_data["timing"]["http_wait_ms"] = round(http_wait_ms, 1)
+        response_data["timing"]["audio_handoff"] = "shm" if slot is not None else "file"
+        response_data["timing"]["slot_wait_ms"] = round(slot_wait_ms, 1)
+        response_data["timing"]["priority"] = priority
+        if request_data.get("scheduled_at") is not None:
+            response_data["timing"]["schedule_wait_ms"] = round((request_data["scheduled_at"] - queued_at) * 1000.0, 1)
+        picked_up_ms = (response_data["timing"].get("timeline") or {}).get("picked_up")
+        if picked_up_ms is not None:
+            class_wait_ms = picked_up_ms - (queued_at - SERVER_START_TIME) * 1000.0
+            response_data["timing"]["class_queue_wait_ms"] = round(class_wait_ms, 1)
+            metrics.class_wait_seconds.labels(priority=priority).observe(max(0.0, class_wait_ms) / 1000.0)
+    metrics.stage_seconds.labels(stage="http_wait_ms").observe(http_wait_ms / 1000.0)
 
     return response_data
 
 
+# ============================================================================
+# Long-form Transcription
+# ============================================================================
+
+def _chunk_windows(num_samples: int, chunk_samples: int, overlap_samples: int) -> list:
+    """[(start, end), ...] sample ranges of overlapping windows covering num_samples."""
+    stride = max(1, chunk_samples - overlap_samples)
+    windows = []
+    start = 0
+    while True:
+        end = min(start + chunk_samples, num_samples)
+        windows.append((start, end))
+        if end >= num_samples:
+            return windows
+        start += stride
+
+
+def _normalize_word(word: str) -> str:
+    return "".join(ch for ch in word.lower() if ch.isalnum())
+
+
+def _merge_overlap(prev_words: list, next_words: list, max_overlap: int) -> list:
+    """
+    Join two word lists whose boundary regions transcribe the same audio.
+
+    Finds the longest run of (normalized) words shared by the tail of prev_words
+    and the head of next_words, keeps prev up to the end of that run and next
+    after it. Runs shorter than 2 words are treated as no match, since single
+    common words ("the", "a") align spuriously; the lists are then concatenated.
+    """
+    tail = [_normalize_word(w) for w in prev_words[-max_overlap:]]
+    head = [_normalize_word(w) for w in next_words[:max_overlap]]
+
+    best_len, best_i, best_j = 0, 0, 0
+    run = [[0] * (len(head) + 1) for _ in range(len(tail) + 1)]
+    for i in range(1, len(tail) + 1):
+        for j in range(1, len(head) + 1):
+            if tail[i - 1] and tail[i - 1] == head[j - 1]:
+                run[i][j] = run[i - 1][j - 1] + 1
+                if run[i][j] > best_len:
+                    best_len, best_i, best_j = run[i][j], i, j
+
+    if best_len < 2:
+        return prev_words + next_words
+
+    cut_prev = len(prev_words) - len(tail) + best_i
+    return prev_words[:cut_prev] + next_words[best_j:]
+
+
+def _stitch_chunks(texts: list, overlap_s: float) -> str:
+    """Concatenate chunk transcriptions, removing text repeated in the overlap regions."""
+    # Generous bound on words spoken during one overlap region (~3 words/s, x2 margin)
+    max_overlap = max(8, int(overlap_s * 6))
+    words: list = []
+    for text in texts:
+        chunk_words = (text or "").split()
+        words = _merge_overlap(words, chunk_words, max_overlap) if words else chunk_words
+    return " ".join(words)
+
+
+async def _run_longform_transcription(
+    audio_bytes: bytes,
+    suffix: str,
+    context: Optional[str],
+    language: Optional[str] = None,
+    deadline_ms: Optional[float] = None,
+    priority: str = "standard",
+) -> Dict[str, Any]:
+    """
+    Long-form request path: decode once in the API process, split into
+    overlapping windows, transcribe all windows in parallel across workers,
+    and stitch the texts back together.
+
+    Windows are sent to workers as raw 16 kHz int16 PCM (".s16"), so a 30 s
+    window fits in one shared-memory slot. Audio that fits in one window goes
+    through the regular single-request path.
+    """
+    import numpy as np
+
+    t_start = time.perf_counter()
+    try:
+        audio_array = await asyncio.to_thread(_load_audio, audio_bytes, suffix)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to decode audio: {e}")
+    decode_ms = (time.perf_counter() - t_start) * 1000.0
+    if deadline_ms is not None:
+        deadline_ms = max(0.0, deadline_ms - decode_ms)
+
+    chunk_samples = int(LONGFORM_CHUNK_S * 16000)
+    overlap_samples = int(LONGFORM_OVERLAP_S * 16000)
+    duration_s = len(audio_array) / 16000.0
+    if len(audio_array) <= chunk_samples:
+        response_data = await _run_transcription(
+            audio_bytes=audio_bytes, suffix=suffix, context=context, language=language,
+            deadline_ms=deadline_ms, priority=priority,
+        )
+        response_data["duration_s"] = round(duration_s, 2)
+        return response_data
+
+    pcm = (np.clip(audio_array, -1.0, 1.0) * 32767.0).astype(np.int16)
+    windows = _chunk_windows(len(pcm), chunk_samples, overlap_samples)
+
+    tasks = [
+        asyncio.ensure_future(_run_transcription(
+            audio_bytes=pcm[start:end].tobytes(), suffix=".s16", context=context, language=language,
+            deadline_ms=deadline_ms, priority=priority,
+        ))
+        for start, end in windows
+    ]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        # A failed window (or a caller that went away) fails the whole request: cancel
+        # the other windows, which flags them on the cancel board and frees their slots
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+    transcription = _stitch_chunks([r["transcription"] for r in results], LONGFORM_OVERLAP_S)
+    wall_ms = (time.perf_counter() - t_start) * 1000.0
+
+    chunks = []
+    for index, ((start, end), result) in enumerate(zip(windows, results)):
+        chunks.append({
+            "index": index,
+            "start_s": round(start / 16000.0, 2),
+            "end_s": round(end / 16000.0, 2),
+            "transcription": result["transcription"],
+            "timing": result.get("timing"),
+        })
+
+    return {
+        "request_id": str(uuid.uuid4()),
+        "transcription": transcription,
+        "duration_s": round(duration_s, 2),
+        "chunks": chunks,
+        "timing": {
+            "long_form": True,
+            "num_chunks": len(chunks),
+            "chunk_s": LONGFORM_CHUNK_S,
+            "overlap_s": LONGFORM_OVERLAP_S,
+            "api_decode_ms": round(decode_ms, 1),
+            "http_wait_ms": round(wall_ms, 1),
+        },
+    }
+
+
+async def _cached_transcription(
+    audio_bytes: bytes,
+    suffix: str,
+    context: Optional[str],
+    language: Optional[str] = None,
+    long_form: bool = False,
+    idempotency_key: Optional[str] = None,
+    deadline_ms: Optional[float] = None,
+    priority: str = "standard",
+) -> Dict[str, Any]:
+    """
+    Result-cache front of _run_transcription / _run_longform_transcription.
+
+    A cached response is returned without touching the workers; an identical
+    request (same content key or Idempotency-Key) that is already in flight is
+    awaited instead of enqueued again. The response's "cache" field is "hit",
+    "coalesced" or "miss".
+    """
+    t_start = time.perf_counter()
+    run = _run_longform_transcription if long_form else _run_transcription
+    if result_cache is None:
+        return await run(
+            audio_bytes=audio_bytes, suffix=suffix, context=context, language=language,
+            deadline_ms=deadline_ms, priority=priority,
+        )
+
+    key = result_cache.key(
+        audio_bytes, suffix, context, language, long_form, idempotency_key,
+        windows=(LONGFORM_CHUNK_S, LONGFORM_OVERLAP_S),
+    )
+
+    cached = result_cache.get(key)
+    if cached is None and result_cache.disk_dir is not None:
+        cached = await asyncio.to_thread(result_cache.load, key)
+        if cached is not None:
+            result_cache.disk_hits += 1
+    if cached is not None:
+        result_cache.hits += 1
+        metrics.result_cache.labels(outcome="hit").inc()
+        return _reused_response(cached, "hit", t_start)
+
+    leader = inflight_results.get(key)
+    if leader is not None:
+        result_cache.coalesced += 1
+        metrics.result_cache.labels(outcome="coalesced").inc()
+        try:
+            response = await asyncio.shield(leader)
+        except asyncio.CancelledError:
+            if not leader.cancelled():
+                raise
+            # The original request was cancelled; run this one ourselves
+        else:
+            return _reused_response(response, "coalesced", t_start)
+
+    result_cache.misses += 1
+    metrics.result_cache.labels(outcome="miss").inc()
+    fut = asyncio.get_running_loop().create_future()
+    inflight_results[key] = fut
+    try:
+        response = await run(
+            audio_bytes=audio_bytes, suffix=suffix, context=context, language=language,
+            deadline_ms=deadline_ms, priority=priority,
+        )
+    except asyncio.CancelledError:
+        fut.cancel()
+        raise
+    except Exception as e:
+        fut.set_exception(e)
+        fut.exception()  # followers re-raise it; mark retrieved for the leader
+        raise
+    else:
+        fut.set_result(response)
+    finally:
+        if inflight_results.get(key) is fut:
+            del inflight_results[key]
+
+    result_cache.put(key, response)
+    if result_cache.disk_dir is not None:
+        await asyncio.to_thread(result_cache.persist, key, response)
+    return {**copy.deepcopy(response), "cache": "miss"}
+
+
+def _reused_response(response: Dict[str, Any], cache: str, t_start: float) -> Dict[str, Any]:
+    """
+    Copy of another request's response for this one: a fresh request_id, and a
+    timing block describing this request rather than the one that ran the workers.
+    """
+    reused = copy.deepcopy(response)
+    reused["request_id"] = str(uuid.uuid4())
+    reused["cache"] = cache
+    reused["timing"] = {
+        "cache": cache,
+        "source_request_id": response.get("request_id"),
+        "http_wait_ms": round((time.perf_counter() - t_start) * 1000.0, 1),
+    }
+    return reused
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _start_stream(task: asyncio.Task, dispatched: asyncio.Event):
+    """
+    Wait until a streaming request has reached a worker, before any SSE bytes
+    are sent. A failure up to then (pool full, admission, deadline) is raised
+    as its HTTPException, so the client sees the real status instead of 200.
+    """
+    waiter = asyncio.ensure_future(dispatched.wait())
+    try:
+        await asyncio.wait({waiter, task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        waiter.cancel()
+    if task.done() and task.exception() is not None:
+        raise task.exception()
+
+
+async def _stream_transcription(task: asyncio.Task, deltas: asyncio.Queue, t_start: float):
+    """
+    Server-Sent Events request path (stream=true), for a request already started by _start_stream.
+
+    Yields a "delta" event for each text fragment the worker streams out of
+    generate(), then one "done" event carrying the same body as a regular
+    response (plus time_to_first_token_ms), or an "error" event for failures
+    after the stream has started.
+    """
+    first_token_at: Optional[float] = None
+
+    try:
+        while True:
+            getter = asyncio.ensure_future(deltas.get())
+            done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            delta = getter.result()
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            yield _sse_event("delta", {"text": delta["delta"]})
+
+        # Deltas that landed together with the final result
+        while not deltas.empty():
+            yield _sse_event("delta", {"text": deltas.get_nowait()["delta"]})
+
+        try:
+            response_data = task.result()
+        except HTTPException as e:
+            yield _sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+            return
+
+        if first_token_at is not None and "timing" in response_data:
+            response_data["timing"]["time_to_first_token_ms"] = round((first_token_at - t_start) * 1000.0, 1)
+        yield _sse_event("done", response_data)
+    finally:
+        # Client went away mid-stream
+        if not task.done():
+            task.cancel()
+
+
+def _parse_deadline(value: Optional[str]) -> Optional[float]:
+    """X-Request-Deadline-Ms header value -> milliseconds (None if absent)."""
+    if value is None or value == "":
+        return None
+    try:
+        deadline_ms = float(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="X-Request-Deadline-Ms must be a number of milliseconds")
+    if deadline_ms <= 0:
+        raise HTTPException(status_code=400, detail="X-Request-Deadline-Ms must be positive")
+    return deadline_ms
+
+
+def _parse_priority(value: Optional[str], default: str) -> str:
+    """X-Priority header / "priority" field -> RequestScheduler class."""
+    if value is None or value == "":
+        return default
+    priority = value.strip().lower()
+    if priority not in RequestScheduler.CLASSES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(RequestScheduler.CLASSES)}")
+    return priority
+
+
 @app.post("/transcribe")
 async def transcribe(
+    request: Request,
     audio: UploadFile = File(..., description="Audio file (.wav or .webm)"),
     context: Optional[str] = Form(None, description="Optional context/prompt text"),
     language: Optional[str] = Form(None, description="Optional language code (e.g., 'en', 'es', 'zh'). If not specified, auto-detects from audio."),
+    long_form: bool = Form(False, description="Transcribe audio longer than 30 s as overlapping windows in parallel"),
+    stream: bool = Form(False, description="Stream text as Server-Sent Events while it is generated"),
+    idempotency_key: Optional[str] = Header(None, description="Requests sharing a key get one transcription"),
+    x_request_deadline_ms: Optional[str] = Header(None, description="Time budget in ms; rejected with 429 if it cannot be met"),
+    x_priority: Optional[str] = Header(None, description="interactive (default), standard or bulk"),
 ):
     # Validate extension
     filename = audio.filename or ""
@@ -590,8 +4015,36 @@ async def transcribe(
         raise HTTPException(status_code=400, detail="Invalid file format. Only .wav or .webm supported.")
     suffix = ".wav" if filename.lower().endswith(".wav") else ".webm"
     audio_bytes = await audio.read()
-    response_data = await _run_transcription(audio_bytes=audio_bytes, suffix=suffix, context=context, language=language)
-    return JSONResponse(response_data)
+    deadline_ms = _parse_deadline(x_request_deadline_ms)
+    priority = _parse_priority(x_priority, "interactive")
+    if stream:
+        if long_form:
+            raise HTTPException(status_code=400, detail="stream and long_form cannot be combined")
+        t_start = time.perf_counter()
+        deltas: asyncio.Queue = asyncio.Queue()
+        dispatched = asyncio.Event()
+        task = asyncio.create_task(_run_transcription(
+            audio_bytes=audio_bytes, suffix=suffix, context=context, language=language, delta_queue=deltas,
+            deadline_ms=deadline_ms, priority=priority, dispatched=dispatched,
+        ))
+        try:
+            started = await _cancel_on_disconnect(request, _start_stream(task, dispatched))
+        except BaseException:
+            task.cancel()
+            raise
+        if isinstance(started, JSONResponse):  # client disconnected while waiting
+            task.cancel()
+            return started
+        return StreamingResponse(
+            _stream_transcription(task, deltas, t_start),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    response_data = await _cancel_on_disconnect(request, _cached_transcription(
+        audio_bytes=audio_bytes, suffix=suffix, context=context, language=language,
+        long_form=long_form, idempotency_key=idempotency_key, deadline_ms=deadline_ms, priority=priority,
+    ))
+    return response_data if isinstance(response_data, JSONResponse) else JSONResponse(response_data)
 
 
 @app.post("/invocations")
@@ -606,10 +4059,19 @@ async def invocations(request: Request):
             "audio_base64": "<base64>",
             "audio_format": "wav" | "webm",   // optional, defaults to "wav"
             "context": "optional prompt",
-            "language": "en" | "es" | ...     // optional, auto-detects if not specified
+            "language": "en" | "es" | ...,    // optional, auto-detects if not specified
+            "long_form": true,                // optional, transcribe > 30 s audio in parallel windows
+            "priority": "bulk"                // optional, overrides the X-Priority header
           }
+      - Raw bytes accept long-form mode via the query string: /invocations?long_form=true
+      - Optional Idempotency-Key header: requests sharing a key get one transcription
+      - Optional X-Request-Deadline-Ms header: rejected with 429 if the deadline cannot be met
+      - Optional X-Priority header (or "priority" JSON field): interactive, standard (default) or bulk
     """
     content_type = (request.headers.get("content-type") or "").lower()
+    idempotency_key = request.headers.get("idempotency-key")
+    deadline_ms = _parse_deadline(request.headers.get("x-request-deadline-ms"))
+    priority = _parse_priority(request.headers.get("x-priority"), "standard")
 
     # JSON payload
     if "application/json" in content_type:
@@ -636,8 +4098,14 @@ async def invocations(request: Request):
 
         context = payload.get("context")
         language = payload.get("language")  # Optional language code
+        priority = _parse_priority(payload.get("priority"), priority)
         suffix = ".wav" if audio_format == "wav" else ".webm"
-        return JSONResponse(await _run_transcription(audio_bytes=audio_bytes, suffix=suffix, context=context, language=language))
+        response_data = await _cancel_on_disconnect(request, _cached_transcription(
+            audio_bytes=audio_bytes, suffix=suffix, context=context, language=language,
+            long_form=bool(payload.get("long_form")), idempotency_key=idempotency_key, deadline_ms=deadline_ms,
+            priority=priority,
+        ))
+        return response_data if isinstance(response_data, JSONResponse) else JSONResponse(response_data)
 
     # Raw bytes payload
     audio_bytes = await request.body()
@@ -650,7 +4118,348 @@ async def invocations(request: Request):
     else:
         suffix = ".wav"
 
-    return JSONResponse(await _run_transcription(audio_bytes=audio_bytes, suffix=suffix, context=None))
+    long_form = request.query_params.get("long_form", "").lower() in ("1", "true", "yes")
+    response_data = await _cancel_on_disconnect(request, _cached_transcription(
+        audio_bytes=audio_bytes, suffix=suffix, context=None, long_form=long_form, idempotency_key=idempotency_key,
+        deadline_ms=deadline_ms, priority=priority,
+    ))
+    return response_data if isinstance(response_data, JSONResponse) else JSONResponse(response_data)
+
+
+# ============================================================================
+# Streaming Transcription (WebSocket)
+# ============================================================================
+
+class StreamingSession:
+    """
+    Rolling audio buffer for one /ws/transcribe connection.
+
+    Audio is kept as 16 kHz float32 starting at window_start (absolute sample
+    index). Once the window grows past LONGFORM_CHUNK_S its transcription is
+    committed and the window slides forward, keeping LONGFORM_OVERLAP_S of
+    overlap so committed texts can be stitched like long-form chunks.
+
+    Formats:
+        pcm_s16le: raw little-endian int16 mono frames at sample_rate
+                   (resampled to 16 kHz on the fly)
+        webm:      consecutive MediaRecorder chunks of one webm/opus stream,
+                   piped into one ffmpeg process for the whole session; each
+                   tick picks up what it has decoded since the last one
+
+    add() raises ValueError once the session holds more than max_buffer_bytes
+    of audio that has not been transcribed yet (undecoded webm plus the window).
+    """
+
+    FORMATS = ("pcm_s16le", "webm")
+
+    def __init__(
+        self,
+        fmt: str,
+        sample_rate: int,
+        context: Optional[str],
+        language: Optional[str],
+        max_buffer_bytes: int = 32 << 20,
+    ):
+        import numpy as np
+
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unknown format {fmt!r} (expected one of {self.FORMATS})")
+        self.fmt = fmt
+        self.sample_rate = sample_rate
+        self.context = context
+        self.language = language
+        self.max_buffer_bytes = max_buffer_bytes
+
+        self.window_start = 0
+        self.committed: list = []
+        self.received_bytes = 0
+        self.inferred_bytes = 0
+
+        self._pcm = np.zeros(0, dtype=np.float32)  # audio from window_start
+        self._resampler = None
+        if fmt == "pcm_s16le" and sample_rate != 16000:
+            import soxr
+            self._resampler = soxr.ResampleStream(sample_rate, 16000, 1, dtype="float32")
+
+        # webm: ffmpeg decoder, fed by a writer thread and drained by a reader thread
+        self._decoder = None
+        self._decoder_errors = None
+        self._feed = None
+        self._reader = None
+        self._lock = threading.Lock()
+        self._decoded: list = []  # float32 chunks the reader has not handed to _pcm yet
+        self._pending_bytes = 0   # webm bytes not yet written to the decoder
+        self._ended = False
+
+    def _start_decoder(self):
+        import subprocess
+
+        self._decoder_errors = tempfile.TemporaryFile()
+        self._decoder = subprocess.Popen(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0", "-f", "f32le", "-ac", "1", "-ar", "16000", "pipe:1"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._decoder_errors,
+        )
+        self._feed = queue.Queue()
+        threading.Thread(target=self._write_decoder, daemon=True).start()
+        self._reader = threading.Thread(target=self._read_decoder, daemon=True)
+        self._reader.start()
+
+    def _write_decoder(self):
+        stdin = self._decoder.stdin
+        while True:
+            data = self._feed.get()
+            if data is None:
+                break
+            try:
+                stdin.write(data)
+                stdin.flush()
+            except (OSError, ValueError):  # decoder exited or was killed
+                break
+            finally:
+                with self._lock:
+                    self._pending_bytes -= len(data)
+        try:
+            stdin.close()
+        except OSError:
+            pass
+
+    def _read_decoder(self):
+        import numpy as np
+
+        stdout = self._decoder.stdout
+        leftover = b""
+        while True:
+            data = stdout.read1(1 << 16)
+            if not data:
+                break
+            data = leftover + data
+            usable = len(data) // 4 * 4
+            leftover = data[usable:]
+            with self._lock:
+                self._decoded.append(np.frombuffer(data[:usable], dtype=np.float32))
+
+    @property
+    def buffered_bytes(self) -> int:
+        with self._lock:
+            return self._pending_bytes + sum(chunk.nbytes for chunk in self._decoded) + self._pcm.nbytes
+
+    def add(self, data: bytes, last: bool = False):
+        import numpy as np
+
+        self.received_bytes += len(data)
+        if self.fmt == "webm":
+            if self._decoder is None:
+                if not data:
+                    return
+                self._start_decoder()
+            if data:
+                with self._lock:
+                    self._pending_bytes += len(data)
+                self._feed.put(data)
+            if last and not self._ended:
+                self._ended = True
+                self._feed.put(None)  # closes the decoder's input, so it flushes and exits
+        else:
+            samples = np.frombuffer(data[: len(data) // 2 * 2], dtype=np.int16).astype(np.float32) / 32768.0
+            if self._resampler is not None:
+                samples = self._resampler.resample_chunk(samples, last=last)
+            self._pcm = np.concatenate([self._pcm, samples])
+        if self.buffered_bytes > self.max_buffer_bytes:
+            raise ValueError(
+                f"Streaming session holds over {self.max_buffer_bytes >> 20} MB of untranscribed audio; "
+                "audio is arriving faster than it is transcribed"
+            )
+
+    @property
+    def total_samples(self) -> int:
+        return self.window_start + len(self._pcm)
+
+    async def window(self):
+        """16 kHz float32 audio from window_start to the end of what has been decoded."""
+        import subprocess
+        import numpy as np
+
+        if self._decoder is None:
+            return self._pcm
+        if self._ended:
+            # Final tick: wait for the decoder to flush the end of the stream and exit
+            try:
+                await asyncio.to_thread(self._decoder.wait, 30.0)
+            except subprocess.TimeoutExpired:
+                raise HTTPException(status_code=504, detail="ffmpeg did not finish decoding the stream")
+            await asyncio.to_thread(self._reader.join, 30.0)
+        with self._lock:
+            decoded, self._decoded = self._decoded, []
+        if decoded:
+            self._pcm = np.concatenate([self._pcm, *decoded])
+        returncode = self._decoder.poll()
+        if returncode not in (None, 0):
+            self._decoder_errors.seek(0)
+            detail = self._decoder_errors.read().decode("utf-8", errors="replace")
+            raise HTTPException(status_code=400, detail=f"ffmpeg decode failed (rc={returncode}): {detail}")
+        return self._pcm
+
+    def advance(self, num_samples: int):
+        self.window_start += num_samples
+        self._pcm = self._pcm[num_samples:]
+
+    def close(self):
+        """Stop the webm decoder, if any."""
+        if self._decoder is None:
+            return
+        if self._decoder.poll() is None:
+            self._decoder.kill()
+        self._feed.put(None)
+        self._decoder.wait()
+        self._decoder_errors.close()
+
+
+async def _transcribe_pcm(audio_array, context: Optional[str], language: Optional[str]) -> Dict[str, Any]:
+    import numpy as np
+
+    pcm = (np.clip(audio_array, -1.0, 1.0) * 32767.0).astype(np.int16)
+    return await _run_transcription(
+        audio_bytes=pcm.tobytes(), suffix=".s16", context=context, language=language, priority="interactive",
+    )
+
+
+async def _stream_tick(session: StreamingSession) -> Dict[str, Any]:
+    """
+    Transcribe the session's current window, committing and sliding full
+    windows first. Returns the stitched text so far and inference timing.
+    """
+    chunk_samples = int(LONGFORM_CHUNK_S * 16000)
+    advance = chunk_samples - int(LONGFORM_OVERLAP_S * 16000)
+    session.inferred_bytes = session.received_bytes
+
+    t0 = time.perf_counter()
+    audio = await session.window()
+    while len(audio) > chunk_samples:
+        result = await _transcribe_pcm(audio[:chunk_samples], session.context, session.language)
+        session.committed.append(result["transcription"])
+        session.advance(advance)
+        audio = audio[advance:]
+
+    texts = list(session.committed)
+    timing = None
+    if len(audio) > 0:
+        result = await _transcribe_pcm(audio, session.context, session.language)
+        texts.append(result["transcription"])
+        timing = result.get("timing")
+
+    return {
+        "text": _stitch_chunks(texts, LONGFORM_OVERLAP_S),
+        "audio_s": round(session.total_samples / 16000.0, 2),
+        "inference_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+        "timing": timing,
+    }
+
+
+@app.websocket("/ws/transcribe")
+async def ws_transcribe(websocket: WebSocket):
+    """
+    Streaming transcription over a WebSocket.
+
+    Protocol:
+      1. Client sends a JSON text message:
+           {"type": "start", "format": "pcm_s16le" | "webm", "sample_rate": 16000,
+            "context": "...", "language": "en", "partial_interval_ms": 1000}
+         (all fields optional)
+      2. Client sends audio as binary frames while recording.
+      3. Server pushes {"type": "partial", "text": ..., "audio_s": ...} every
+         partial_interval_ms while new audio keeps arriving.
+      4. Client sends {"type": "stop"}; server replies with {"type": "final", ...}
+         including final_latency_ms (stop received -> final text sent) and closes.
+    """
+    await websocket.accept()
+
+    session: Optional[StreamingSession] = None
+    ticker: Optional[asyncio.Task] = None
+    tick_lock = asyncio.Lock()
+
+    async def run_partials(interval_s: float):
+        while True:
+            await asyncio.sleep(interval_s)
+            if session.received_bytes == session.inferred_bytes:
+                continue
+            try:
+                async with tick_lock:
+                    out = await _stream_tick(session)
+            except HTTPException as e:
+                await websocket.send_json({"type": "error", "error": e.detail})
+                continue
+            await websocket.send_json({"type": "partial", **out})
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            if message.get("bytes") is not None:
+                if session is None:
+                    session = StreamingSession("pcm_s16le", 16000, None, None, int(WS_MAX_BUFFER_MB * (1 << 20)))
+                    ticker = asyncio.create_task(run_partials(WS_PARTIAL_INTERVAL_MS / 1000.0))
+                try:
+                    session.add(message["bytes"])
+                except ValueError as e:
+                    await websocket.send_json({"type": "error", "error": str(e)})
+                    await websocket.close(code=1009)
+                    return
+                continue
+
+            try:
+                control = json.loads(message.get("text") or "{}")
+            except json.JSONDecodeError as e:
+                await websocket.send_json({"type": "error", "error": f"Invalid JSON control message: {e}"})
+                continue
+
+            if control.get("type") == "start" and session is None:
+                try:
+                    session = StreamingSession(
+                        control.get("format", "pcm_s16le"),
+                        int(control.get("sample_rate", 16000)),
+                        control.get("context"),
+                        control.get("language"),
+                        int(WS_MAX_BUFFER_MB * (1 << 20)),
+                    )
+                except ValueError as e:
+                    await websocket.send_json({"type": "error", "error": str(e)})
+                    await websocket.close(code=1003)
+                    return
+                interval_ms = float(control.get("partial_interval_ms", WS_PARTIAL_INTERVAL_MS))
+                ticker = asyncio.create_task(run_partials(interval_ms / 1000.0))
+
+            elif control.get("type") == "stop":
+                stop_received = time.perf_counter()
+                if ticker is not None:
+                    ticker.cancel()
+                if session is None:
+                    await websocket.send_json({"type": "final", "text": "", "audio_s": 0.0})
+                    break
+                session.add(b"", last=True)  # flush the resampler, or end the webm decoder's input
+                async with tick_lock:
+                    out = await _stream_tick(session)
+                out["final_latency_ms"] = round((time.perf_counter() - stop_received) * 1000.0, 1)
+                out["windows"] = len(session.committed) + 1
+                await websocket.send_json({"type": "final", **out})
+                break
+
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except HTTPException as e:
+        # Worker-side failure surfaced by _run_transcription
+        try:
+            await websocket.send_json({"type": "error", "error": e.detail})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+    finally:
+        if ticker is not None:
+            ticker.cancel()
+        if session is not None:
+            session.close()
 
 
 # ============================================================================
@@ -664,15 +4473,96 @@ if __name__ == "__main__":
     parser.add_argument("--host", type=str, default="0.0.0.0", help="Server host")
     parser.add_argument("--num-workers", type=int, default=8, help="Number of worker processes")
     parser.add_argument("--model-id", type=str, default=MODEL_ID, help="Model ID or checkpoint path (default: openai/whisper-large-v3-turbo)")
+    parser.add_argument("--device", type=str, default=DEVICE, choices=("auto", "cuda", "cpu"), help="Worker device (auto = GPUs if present, else CPU)")
+    parser.add_argument("--start-method", type=str, default=START_METHOD, choices=("spawn", "forkserver"), help="How worker processes start: spawn, or fork from a server with torch/transformers and the processor preloaded")
+    parser.add_argument("--workers-per-device", type=int, default=WORKERS_PER_DEVICE, help="Worker processes per GPU, or per CPU core group on the CPU backend")
+    parser.add_argument("--gpu-memory-fraction", type=float, default=GPU_MEMORY_FRACTION, help="Cap on each GPU worker's share of its device memory (0 = no cap)")
+    parser.add_argument("--cpu-threads-per-worker", type=int, default=CPU_THREADS_PER_WORKER, help="Intra-op threads per CPU worker (0 = usable cores / core groups / workers per device)")
+    parser.add_argument("--no-cpu-pinning", action="store_true", help="Do not pin CPU workers to disjoint NUMA-local core sets")
+    parser.add_argument("--quantize", type=str, default=QUANTIZE, choices=("", "int8"), help="CPU workers: dynamic int8 quantization of Linear layers (empty = off)")
+    parser.add_argument("--quantize-cache-dir", type=str, default=QUANTIZE_CACHE_DIR, help="Private (0700) directory the quantized weights are cached in across worker starts (empty = off)")
+    parser.add_argument("--shared-weights-dir", type=str, default=SHARED_WEIGHTS_DIR, help="Private (0700) directory CPU workers map one float32 weights file from, instead of private copies (empty = off)")
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE, help="Max requests per worker generate() call (1 disables micro-batching)")
+    parser.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW_MS, help="Max time a worker waits for a micro-batch to fill")
+    parser.add_argument("--routing", type=str, default=ROUTING_POLICY, choices=WorkerRouter.POLICIES, help="How requests are assigned to per-worker queues")
+    parser.add_argument("--preprocess-workers", type=str, default=PREPROCESS_WORKERS, help="CPU decode/feature processes ahead of GPU workers (0 = off, 'auto' = one per CPU core)")
+    parser.add_argument("--feature-slots", type=int, default=FEATURE_SLOTS, help="Shared-memory slots for precomputed features (bounds preprocessed requests in flight)")
+    parser.add_argument("--longform-chunk-s", type=float, default=LONGFORM_CHUNK_S, help="Window length for long-form mode (seconds, at most 30)")
+    parser.add_argument("--longform-overlap-s", type=float, default=LONGFORM_OVERLAP_S, help="Overlap between consecutive long-form windows (seconds, less than the window)")
+    parser.add_argument("--ws-partial-interval-ms", type=float, default=WS_PARTIAL_INTERVAL_MS, help="Default cadence of partial transcripts on /ws/transcribe")
+    parser.add_argument("--ws-max-buffer-mb", type=float, default=WS_MAX_BUFFER_MB, help="Untranscribed audio a /ws/transcribe session may hold before it is closed")
+    parser.add_argument("--prompt-cache-entries", type=int, default=PROMPT_CACHE_ENTRIES, help="Per-worker cached context/language prompts (0 = off)")
+    parser.add_argument("--prompt-cache-mb", type=float, default=PROMPT_CACHE_MB, help="Per-worker device memory cap for cached prompt_ids")
+    parser.add_argument("--result-cache-entries", type=int, default=RESULT_CACHE_ENTRIES, help="In-memory cached responses (0 = off)")
+    parser.add_argument("--result-cache-ttl-s", type=float, default=RESULT_CACHE_TTL_S, help="Seconds a cached response stays valid")
+    parser.add_argument("--result-cache-dir", type=str, default=RESULT_CACHE_DIR, help="Directory for the on-disk result cache tier (empty = off)")
+    parser.add_argument("--result-cache-disk-mb", type=float, default=RESULT_CACHE_DISK_MB, help="Size cap of the on-disk result cache tier")
+    parser.add_argument("--default-deadline-ms", type=float, default=DEFAULT_DEADLINE_MS, help="Deadline for requests without X-Request-Deadline-Ms (0 = none)")
+    parser.add_argument("--scheduler-worker-depth", type=int, default=SCHEDULER_WORKER_DEPTH, help="Max requests handed to one worker at a time; the rest wait in the priority scheduler (0 = 2 x max batch size or engine slots)")
+    parser.add_argument("--priority-aging-ms", type=float, default=PRIORITY_AGING_MS, help="Wait after which a lower-priority request is served ahead of higher classes")
+    parser.add_argument("--decode-engine", type=str, default=DECODE_ENGINE, choices=("generate", "continuous"), help="Worker decoder loop: micro-batched generate() or continuous batching")
+    parser.add_argument("--engine-slots", type=int, default=ENGINE_SLOTS, help="Concurrent sequences per worker with --decode-engine continuous")
+    parser.add_argument("--audio-ctx-buckets", type=str, default=AUDIO_CTX_BUCKETS, help="Comma-separated seconds, e.g. 5,10,15: short clips encode only the bucket's frames (empty = full 30 s context)")
+    parser.add_argument("--audio-ctx-margin-s", type=float, default=AUDIO_CTX_MARGIN_S, help="Audio added past the clip end before picking an audio-context bucket")
+    parser.add_argument("--prefix-cache-mb", type=float, default=PREFIX_CACHE_MB, help="Continuous engine: cache of first-decoder-layer state for repeated context prompts (0 = off)")
+    parser.add_argument("--assistant-model-id", type=str, default=ASSISTANT_MODEL_ID, help="Draft model for speculative decoding, same tokenizer as --model-id (empty = off)")
+    parser.add_argument("--num-assistant-tokens", type=int, default=NUM_ASSISTANT_TOKENS, help="Draft tokens proposed per main-model step")
+    parser.add_argument("--encoder-workers", type=int, default=ENCODER_WORKERS, help="GPU processes that only run the encoder, ahead of the decoder workers (0 = off)")
+    parser.add_argument("--encoder-batch-size", type=int, default=ENCODER_BATCH_SIZE, help="Max clips per encoder-pool pass")
+    parser.add_argument("--encoder-batch-window-ms", type=float, default=ENCODER_BATCH_WINDOW_MS, help="Max time an encoder waits to fill its batch")
+    parser.add_argument("--hidden-slots", type=int, default=HIDDEN_SLOTS, help="Shared-memory slots for encoder hidden states (bounds requests between encoder and decoder)")
+    parser.add_argument("--shm-slots", type=int, default=SHM_SLOTS, help="Shared-memory audio slots (0 = always hand off via temp files)")
+    parser.add_argument("--shm-slot-bytes", type=int, default=SHM_SLOT_BYTES, help="Bytes per shared-memory audio slot; larger uploads use a temp file")
     args = parser.parse_args()
 
     os.environ["NUM_WORKERS"] = str(args.num_workers)
     os.environ["PORT"] = str(args.port)
     os.environ["MODEL_ID"] = args.model_id
+    os.environ["DEVICE"] = args.device
+    os.environ["CPU_THREADS_PER_WORKER"] = str(args.cpu_threads_per_worker)
+    os.environ["START_METHOD"] = args.start_method
+    os.environ["WORKERS_PER_DEVICE"] = str(args.workers_per_device)
+    os.environ["GPU_MEMORY_FRACTION"] = str(args.gpu_memory_fraction)
+    os.environ["CPU_PIN_WORKERS"] = "0" if args.no_cpu_pinning or not CPU_PIN_WORKERS else "1"
+    os.environ["QUANTIZE"] = args.quantize
+    os.environ["QUANTIZE_CACHE_DIR"] = args.quantize_cache_dir
+    os.environ["SHARED_WEIGHTS_DIR"] = args.shared_weights_dir
+    os.environ["MAX_BATCH_SIZE"] = str(args.max_batch_size)
+    os.environ["BATCH_WINDOW_MS"] = str(args.batch_window_ms)
+    os.environ["ROUTING_POLICY"] = args.routing
+    os.environ["SHM_SLOTS"] = str(args.shm_slots)
+    os.environ["LONGFORM_CHUNK_S"] = str(args.longform_chunk_s)
+    os.environ["LONGFORM_OVERLAP_S"] = str(args.longform_overlap_s)
+    os.environ["WS_PARTIAL_INTERVAL_MS"] = str(args.ws_partial_interval_ms)
+    os.environ["WS_MAX_BUFFER_MB"] = str(args.ws_max_buffer_mb)
+    os.environ["PREPROCESS_WORKERS"] = args.preprocess_workers
+    os.environ["FEATURE_SLOTS"] = str(args.feature_slots)
+    os.environ["SHM_SLOT_BYTES"] = str(args.shm_slot_bytes)
+    os.environ["PROMPT_CACHE_ENTRIES"] = str(args.prompt_cache_entries)
+    os.environ["PROMPT_CACHE_MB"] = str(args.prompt_cache_mb)
+    os.environ["DEFAULT_DEADLINE_MS"] = str(args.default_deadline_ms)
+    os.environ["DECODE_ENGINE"] = args.decode_engine
+    os.environ["ENGINE_SLOTS"] = str(args.engine_slots)
+    os.environ["PREFIX_CACHE_MB"] = str(args.prefix_cache_mb)
+    os.environ["AUDIO_CTX_BUCKETS"] = args.audio_ctx_buckets
+    os.environ["AUDIO_CTX_MARGIN_S"] = str(args.audio_ctx_margin_s)
+    os.environ["ASSISTANT_MODEL_ID"] = args.assistant_model_id
+    os.environ["NUM_ASSISTANT_TOKENS"] = str(args.num_assistant_tokens)
+    os.environ["ENCODER_WORKERS"] = str(args.encoder_workers)
+    os.environ["ENCODER_BATCH_SIZE"] = str(args.encoder_batch_size)
+    os.environ["ENCODER_BATCH_WINDOW_MS"] = str(args.encoder_batch_window_ms)
+    os.environ["HIDDEN_SLOTS"] = str(args.hidden_slots)
+    os.environ["SCHEDULER_WORKER_DEPTH"] = str(args.scheduler_worker_depth)
+    os.environ["PRIORITY_AGING_MS"] = str(args.priority_aging_ms)
+    os.environ["RESULT_CACHE_ENTRIES"] = str(args.result_cache_entries)
+    os.environ["RESULT_CACHE_TTL_S"] = str(args.result_cache_ttl_s)
+    os.environ["RESULT_CACHE_DIR"] = args.result_cache_dir
+    os.environ["RESULT_CACHE_DISK_MB"] = str(args.result_cache_disk_mb)
 
     logger.info(f"Starting Whisper Inference Server on {args.host}:{args.port}")
     logger.info(f"Configured for {args.num_workers} workers")
     logger.info(f"Model: {args.model_id}")
+    logger.info(f"Micro-batching: max_batch_size={args.max_batch_size} batch_window_ms={args.batch_window_ms}")
 
     # NOTE: Do NOT run uvicorn with multiple server workers for this design.
     # Use a single FastAPI/uvicorn process that spawns GPU workers itself.
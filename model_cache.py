@@ -0,0 +1,62 @@
+"""
+Helpers for the on-disk model caches (quantized state dicts, shared float32 weights).
+
+Cache entries are derived from a checkpoint, so they are keyed by a hash of
+the checkpoint's files, not just its id: a checkpoint retrained in place under
+the same path gets a new entry. Workers load what they find in a cache
+directory, so it has to be private to the server's user.
+
+Used by quantization.py and shared_weights.py.
+"""
+
+import hashlib
+import json
+import os
+
+
+def checkpoint_hash(model_id: str) -> str:
+    """
+    sha256 (first 16 hex digits) of model_id's config and weight files, so a
+    checkpoint retrained in place gets a new cache entry. Hub ids are resolved
+    to their local copies (downloaded if needed, as from_pretrained would).
+    """
+    from transformers.utils import cached_file
+
+    def resolve(filename: str):
+        return cached_file(model_id, filename, _raise_exceptions_for_missing_entries=False)
+
+    files = [resolve("config.json")]
+    for weights in ("model.safetensors", "pytorch_model.bin"):
+        path = resolve(weights)
+        if path is None:
+            index = resolve(f"{weights}.index.json")
+            if index is not None:
+                with open(index) as f:
+                    shards = sorted(set(json.load(f)["weight_map"].values()))
+                path = [index] + [resolve(shard) for shard in shards]
+        if path is not None:
+            files.extend(path if isinstance(path, list) else [path])
+            break
+    else:
+        raise FileNotFoundError(f"No safetensors or PyTorch weights found for {model_id}")
+
+    digest = hashlib.sha256()
+    for path in files:
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def private_dir(path: str):
+    """
+    Create path as a 0700 directory, or check that an existing one is.
+
+    Raises:
+        PermissionError: If path is owned by another user or open to group/others
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.stat(path)
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(f"Model cache directory {path} must be owned by this user with mode 0700")
@@ -1,8 +1,15 @@
 import os
+import sys
 import argparse
+from pathlib import Path
+
 import torch
 from datasets import load_dataset, load_from_disk, Audio
 
+# Shared batched log-mel extractor lives at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from whisper_features import LogMelExtractor  # noqa: E402
+
 
 # Language mapping for dataset mode
 LANG_CODE_MAP = {
@@ -106,15 +113,22 @@ def load_and_prepare_dataset(
     bos_id_precomputed = model.module.config.decoder_start_token_id if isinstance(model, torch.nn.DataParallel) else model.config.decoder_start_token_id
     eos_id_precomputed = processor.tokenizer.eos_token_id
 
+    # Log-Mel features are computed in batches by a separate map (see below)
+    extractor = LogMelExtractor(processor.feature_extractor, "cpu")
+
+    def compute_features(batch):
+        """Compute log-Mel spectrogram features for a batch of audio entries."""
+        audios = batch["audio"]
+        sampling_rates = {audio["sampling_rate"] for audio in audios}
+        if len(sampling_rates) != 1:
+            raise ValueError(f"Mixed sampling rates in batch: {sorted(sampling_rates)}")
+        features = extractor([audio["array"] for audio in audios], sampling_rate=sampling_rates.pop())
+        batch["input_features"] = list(features.numpy())
+        return batch
+
     # Create the prepare function with closure over required variables
     def prepare_dataset(batch):
-        """Process each dataset entry: compute features and encode labels."""
-        audio = batch["audio"]
-        # Compute log-Mel spectrogram features from the audio
-        batch["input_features"] = processor.feature_extractor(
-            audio["array"], sampling_rate=audio["sampling_rate"]
-        ).input_features[0]
-        
+        """Process each dataset entry: encode labels (input_features are already computed)."""
         text = batch["transcription"]
         
         # Handle context field (optional)
@@ -186,6 +200,16 @@ def load_and_prepare_dataset(
     total_samples = len(dataset)
     print(f"Processing {total_samples} samples (single-process mode to avoid fork issues)...", flush=True)
     
+    print("Computing log-Mel features in batches...", flush=True)
+    dataset = dataset.map(
+        compute_features,
+        batched=True,
+        batch_size=64,
+        num_proc=map_workers,
+        desc="Computing features",
+        load_from_cache_file=False,
+    )
+
     # Process first sample to check for errors
     print("Testing with first sample...", flush=True)
     try:
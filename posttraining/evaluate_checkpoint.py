@@ -22,12 +22,23 @@ Usage:
         --dataset_path ~/slackbot-inference/tts_out/hf_dataset \
         --checkpoint_path /path/to/checkpoint \
         --max_samples 50
+
+    # Reduced audio context for short clips (compare against a run without it):
+    python evaluate_checkpoint.py \
+        --dataset_path ~/slackbot-inference/tts_out/hf_dataset \
+        --audio_ctx_buckets 5,10,15
+
+    # int8 dynamic quantization on CPU, with WER delta against the float32 model:
+    python evaluate_checkpoint.py \
+        --dataset_path ~/slackbot-inference/tts_out/hf_dataset \
+        --quantize int8 --max_samples 50
 """
 
 import os
 import sys
 import json
 import argparse
+import copy
 import time
 from pathlib import Path
 from typing import Optional, List, Dict, Any
@@ -38,6 +49,12 @@ from tqdm import tqdm
 from datasets import load_from_disk, Audio
 from transformers import WhisperProcessor, WhisperForConditionalGeneration
 
+# Shared batched log-mel extractor lives at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from whisper_features import LogMelExtractor  # noqa: E402
+from audio_context import encode as encode_audio_ctx, parse_buckets, pick_audio_ctx  # noqa: E402
+from quantization import QUANT_MODES, quantize_model  # noqa: E402
+
 
 def compute_wer(reference: str, hypothesis: str) -> float:
     """
@@ -207,6 +224,17 @@ def load_model(
     return model, processor
 
 
+_EXTRACTORS: Dict[Any, LogMelExtractor] = {}
+
+
+def _get_extractor(processor, device) -> LogMelExtractor:
+    """One LogMelExtractor per (processor, device), built on first use."""
+    key = (id(processor), str(device))
+    if key not in _EXTRACTORS:
+        _EXTRACTORS[key] = LogMelExtractor(processor.feature_extractor, device)
+    return _EXTRACTORS[key]
+
+
 def transcribe_sample(
     model,
     processor,
@@ -215,14 +243,16 @@ def transcribe_sample(
     context: Optional[str] = None,
     language: Optional[str] = None,
     device: str = "cuda",
-    dtype: torch.dtype = torch.float16
+    dtype: torch.dtype = torch.float16,
+    audio_ctx: Optional[int] = None,
 ) -> str:
     """
     Transcribe a single audio sample.
+
+    With audio_ctx, the encoder only sees that many positions (see audio_context.py).
     """
-    # Preprocess audio
-    inputs = processor(audio_array, sampling_rate=sampling_rate, return_tensors="pt")
-    input_features = inputs.input_features.to(device)
+    # Preprocess audio (log-mel computed directly on device)
+    input_features = _get_extractor(processor, device)([audio_array], sampling_rate=sampling_rate)
     
     # Build generation kwargs
     generate_kwargs = {
@@ -246,7 +276,13 @@ def transcribe_sample(
     
     # Generate
     with torch.inference_mode(), torch.autocast(device_type="cuda", dtype=dtype):
-        predicted_ids = model.generate(input_features, **generate_kwargs)
+        if audio_ctx is not None:
+            from transformers.modeling_outputs import BaseModelOutput
+
+            hidden = encode_audio_ctx(model.model.encoder, input_features, audio_ctx)
+            generate_kwargs["encoder_outputs"] = BaseModelOutput(last_hidden_state=hidden)
+            input_features = None
+        predicted_ids = model.generate(input_features=input_features, **generate_kwargs)
     
     # Decode
     transcription = processor.batch_decode(predicted_ids, skip_special_tokens=True)[0]
@@ -264,6 +300,9 @@ def evaluate_dataset(
     include_context_variants: bool = False,
     device: str = "cuda",
     show_samples: int = 10,
+    audio_ctx_buckets: tuple = (),
+    audio_ctx_margin_s: float = 1.0,
+    quantize: str = "",
 ) -> Dict[str, Any]:
     """
     Evaluate a Whisper model/checkpoint on a dataset.
@@ -279,6 +318,10 @@ def evaluate_dataset(
         include_context_variants: If True, also capture transcriptions with/without context when available
         device: Device to run on
         show_samples: Number of sample comparisons to display
+        audio_ctx_buckets: Reduced audio context bucket lengths in seconds (() = full context)
+        audio_ctx_margin_s: Audio added past the clip end before picking a bucket
+        quantize: Quantize the model (quantization.QUANT_MODES) on CPU and also run
+                  the float32 model to report the WER delta ("" = off)
     
     Returns:
         Dictionary with evaluation results
@@ -298,7 +341,15 @@ def evaluate_dataset(
     
     # Load model
     dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+    if quantize:
+        # Quantized kernels are CPU-only; keep the float32 model as the reference
+        device, dtype = "cpu", torch.float32
     model, processor = load_model(model_id, checkpoint_path, device, dtype)
+    fp32_model = None
+    if quantize:
+        print(f"Quantizing model to {quantize}...")
+        fp32_model = model
+        model = quantize_model(copy.deepcopy(model), quantize)
     
     # Load base model for default reference if requested
     base_model = None
@@ -309,13 +360,17 @@ def evaluate_dataset(
         # Warmup base model
         dummy_audio = np.zeros(16000, dtype=np.float32)
         _ = transcribe_sample(base_model, base_processor, dummy_audio, 16000, device=device, dtype=dtype)
-        torch.cuda.synchronize()
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
     
     # Warmup
     print("Warming up model...")
     dummy_audio = np.zeros(16000, dtype=np.float32)
     _ = transcribe_sample(model, processor, dummy_audio, 16000, device=device, dtype=dtype)
-    torch.cuda.synchronize()
+    if fp32_model is not None:
+        _ = transcribe_sample(fp32_model, processor, dummy_audio, 16000, device=device, dtype=dtype)
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
     
     # Evaluate
     results = []
@@ -329,6 +384,14 @@ def evaluate_dataset(
     total_default_cer = 0.0
     improvements_vs_default = 0
     
+    # float32 reference for a quantized model
+    total_fp32_wer = 0.0
+    total_fp32_time = 0.0
+    fp32_matches = 0
+    
+    # Per audio-context bucket: [samples, total WER, total time]
+    bucket_totals: Dict[str, list] = {}
+    
     print("\nRunning evaluation...")
     for i in tqdm(range(total_samples)):
         sample = dataset[i]
@@ -346,6 +409,12 @@ def evaluate_dataset(
         # Only use for conditioning if flags are set
         context_for_transcription = context_value if use_context else None
         language_for_transcription = language_value if use_language else None
+        audio_ctx = None
+        if audio_ctx_buckets:
+            audio_ctx = pick_audio_ctx(
+                len(audio_array), audio_ctx_buckets, audio_ctx_margin_s, sampling_rate,
+                model.config.max_source_positions,
+            )
         
         # Transcribe with main model
         if include_context_variants and context_present:
@@ -353,29 +422,30 @@ def evaluate_dataset(
                 start_time = time.perf_counter()
                 hypothesis = transcribe_sample(
                     model, processor, audio_array, sampling_rate,
-                    context=context_for_transcription, language=language_for_transcription, device=device, dtype=dtype
+                    context=context_for_transcription, language=language_for_transcription, device=device, dtype=dtype, audio_ctx=audio_ctx
                 )
                 inference_time = time.perf_counter() - start_time
                 alternate_hypothesis = transcribe_sample(
                     model, processor, audio_array, sampling_rate,
-                    context=None, language=language_for_transcription, device=device, dtype=dtype
+                    context=None, language=language_for_transcription, device=device, dtype=dtype, audio_ctx=audio_ctx
                 )
             else:
                 start_time = time.perf_counter()
                 hypothesis = transcribe_sample(
                     model, processor, audio_array, sampling_rate,
-                    context=None, language=language_for_transcription, device=device, dtype=dtype
+                    context=None, language=language_for_transcription, device=device, dtype=dtype, audio_ctx=audio_ctx
                 )
                 inference_time = time.perf_counter() - start_time
                 alternate_hypothesis = transcribe_sample(
                     model, processor, audio_array, sampling_rate,
-                    context=context_value, language=language_for_transcription, device=device, dtype=dtype
+                    context=context_value, language=language_for_transcription, device=device, dtype=dtype, audio_ctx=audio_ctx
                 )
         else:
             start_time = time.perf_counter()
             hypothesis = transcribe_sample(
                 model, processor, audio_array, sampling_rate,
-                context=context_for_transcription, language=language_for_transcription, device=device, dtype=dtype
+                context=context_for_transcription, language=language_for_transcription, device=device, dtype=dtype,
+                audio_ctx=audio_ctx,
             )
             inference_time = time.perf_counter() - start_time
             alternate_hypothesis = None
@@ -391,6 +461,12 @@ def evaluate_dataset(
         if reference.lower().strip() == hypothesis.lower().strip():
             perfect_matches += 1
         
+        if audio_ctx_buckets:
+            bucket = bucket_totals.setdefault(str(audio_ctx or "full"), [0, 0.0, 0.0])
+            bucket[0] += 1
+            bucket[1] += wer
+            bucket[2] += inference_time
+        
         result = {
             "index": i,
             "reference": reference,
@@ -401,6 +477,27 @@ def evaluate_dataset(
             "context": context_value,  # Always store actual context from dataset
             "language": language_value,  # Always store actual language from dataset
         }
+        if audio_ctx_buckets:
+            result["audio_ctx"] = audio_ctx
+        
+        # Same call on the float32 model, for the quantization WER delta
+        if fp32_model is not None:
+            start_time = time.perf_counter()
+            fp32_hypothesis = transcribe_sample(
+                fp32_model, processor, audio_array, sampling_rate,
+                context=context_for_transcription, language=language_for_transcription, device=device, dtype=dtype,
+                audio_ctx=audio_ctx,
+            )
+            fp32_time = time.perf_counter() - start_time
+            fp32_wer = compute_wer(reference, fp32_hypothesis)
+            total_fp32_wer += fp32_wer
+            total_fp32_time += fp32_time
+            fp32_matches += fp32_hypothesis.strip() == hypothesis.strip()
+            result["fp32"] = {
+                "hypothesis": fp32_hypothesis,
+                "wer": round(fp32_wer, 4),
+                "inference_time_ms": round(fp32_time * 1000, 1),
+            }
 
         if include_context_variants and context_present:
             if use_context:
@@ -490,6 +587,43 @@ def evaluate_dataset(
     print(f"Average inference time: {avg_time*1000:.1f}ms")
     print(f"Total inference time: {total_time:.1f}s")
     
+    audio_ctx_summary = None
+    if audio_ctx_buckets:
+        audio_ctx_summary = {
+            label: {
+                "samples": count,
+                "avg_wer": round(wer_sum / count, 4),
+                "avg_inference_time_ms": round(time_sum / count * 1000, 1),
+            }
+            for label, (count, wer_sum, time_sum) in sorted(bucket_totals.items())
+        }
+        print("-" * 60)
+        print(f"AUDIO CONTEXT BUCKETS ({', '.join(f'{b:g}s' for b in audio_ctx_buckets)}, margin {audio_ctx_margin_s}s):")
+        for label, bucket in audio_ctx_summary.items():
+            print(
+                f"  audio_ctx={label}: {bucket['samples']} samples, "
+                f"WER {bucket['avg_wer']*100:.2f}%, {bucket['avg_inference_time_ms']:.1f}ms avg"
+            )
+    
+    quantized_summary = None
+    if fp32_model is not None:
+        avg_fp32_wer = total_fp32_wer / total_samples
+        avg_fp32_time = total_fp32_time / total_samples
+        quantized_summary = {
+            "mode": quantize,
+            "fp32_avg_wer": round(avg_fp32_wer, 4),
+            "wer_delta": round(avg_wer - avg_fp32_wer, 4),  # Positive = quantized model is worse
+            "fp32_avg_inference_time_ms": round(avg_fp32_time * 1000, 1),
+            "speedup": round(avg_fp32_time / avg_time, 2) if avg_time else None,
+            "same_text_as_fp32": fp32_matches,
+        }
+        print("-" * 60)
+        print(f"QUANTIZATION ({quantize}) vs FLOAT32:")
+        print(f"  float32 WER: {avg_fp32_wer:.4f} ({avg_fp32_wer*100:.2f}%)")
+        print(f"  WER delta: {quantized_summary['wer_delta']:+.4f} ({quantized_summary['wer_delta']*100:+.2f}%)")
+        print(f"  float32 inference time: {avg_fp32_time*1000:.1f}ms avg (speedup {quantized_summary['speedup']}x)")
+        print(f"  Same text as float32: {fp32_matches}/{total_samples}")
+    
     if default_summary:
         print("-" * 60)
         print("COMPARISON vs BASE MODEL (default reference):")
@@ -542,6 +676,10 @@ def evaluate_dataset(
     
     if default_summary:
         summary["base_model"] = default_summary
+    if audio_ctx_summary:
+        summary["audio_ctx_buckets"] = audio_ctx_summary
+    if quantized_summary:
+        summary["quantized"] = quantized_summary
     
     return {
         "summary": summary,
@@ -654,6 +792,25 @@ Examples:
         default=10,
         help="Number of sample comparisons to display (default: 10)"
     )
+    parser.add_argument(
+        "--audio_ctx_buckets",
+        type=str,
+        default="",
+        help="Reduced audio context for short clips, comma-separated bucket seconds (e.g. 5,10,15; default: full 30 s)"
+    )
+    parser.add_argument(
+        "--audio_ctx_margin_s",
+        type=float,
+        default=1.0,
+        help="Audio added past the clip end before picking a bucket (default: 1.0)"
+    )
+    parser.add_argument(
+        "--quantize",
+        type=str,
+        default="",
+        choices=("",) + QUANT_MODES,
+        help="Quantize the model on CPU and report the WER delta against float32 (default: off)"
+    )
     
     args = parser.parse_args()
     
@@ -682,6 +839,9 @@ Examples:
         include_context_variants=args.include_context_variants,
         device=args.device,
         show_samples=args.show_samples,
+        audio_ctx_buckets=parse_buckets(args.audio_ctx_buckets),
+        audio_ctx_margin_s=args.audio_ctx_margin_s,
+        quantize=args.quantize,
     )
     
     # Save results if requested
@@ -15,6 +15,7 @@ from __future__ import annotations
 import argparse
 import json
 import os
+import sys
 from typing import Any, Dict, List, Optional
 
 import librosa
@@ -22,6 +23,10 @@ import soundfile as sf
 from datasets import Dataset
 from transformers import WhisperForConditionalGeneration, WhisperProcessor
 
+# Shared batched log-mel extractor lives at the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from whisper_features import LogMelExtractor  # noqa: E402
+
 
 def _load_jsonl(path: str, base_dir: str, limit: Optional[int]) -> List[Dict[str, Any]]:
     rows: List[Dict[str, Any]] = []
@@ -60,10 +65,6 @@ def _prepare_sample(
         audio_array = librosa.resample(audio_array, orig_sr=sr, target_sr=16000)
         sr = 16000
 
-    input_features = processor.feature_extractor(
-        audio_array, sampling_rate=sr
-    ).input_features[0]
-
     text = sample["transcription"]
     if language_option == "dataset":
         lang_str = sample.get("language") or default_language
@@ -85,7 +86,23 @@ def _prepare_sample(
     else:
         labels = processor.tokenizer(text).input_ids
 
-    return {"input_features": input_features, "labels": labels}
+    return {"audio_array": audio_array, "labels": labels}
+
+
+def _prepare_batch(
+    batch: Dict[str, List[Any]],
+    *,
+    extractor: LogMelExtractor,
+    **sample_kwargs: Any,
+) -> Dict[str, List[Any]]:
+    """Load/label each sample, then compute log-mel features for the whole batch at once."""
+    samples = [dict(zip(batch.keys(), values)) for values in zip(*batch.values())]
+    prepared = [_prepare_sample(sample, **sample_kwargs) for sample in samples]
+    features = extractor([p["audio_array"] for p in prepared], sampling_rate=16000)
+    return {
+        "input_features": list(features.numpy()),
+        "labels": [p["labels"] for p in prepared],
+    }
 
 
 def main(argv: Optional[List[str]] = None) -> int:
@@ -108,6 +125,7 @@ def main(argv: Optional[List[str]] = None) -> int:
     parser.add_argument("--language-option", choices=["auto", "dataset"], default="auto")
     parser.add_argument("--language", default="en", help="Default language for dataset mode.")
     parser.add_argument("--limit", type=int, default=None, help="Limit number of rows processed.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Samples per feature-extraction batch.")
     args = parser.parse_args(argv)
 
     input_dir = os.path.abspath(args.input_dir)
@@ -124,16 +142,20 @@ def main(argv: Optional[List[str]] = None) -> int:
         language=None if args.language_option == "auto" else "auto",
     )
     model = WhisperForConditionalGeneration.from_pretrained(args.model_id)
+    extractor = LogMelExtractor(processor.feature_extractor, "cpu")
 
     dataset = Dataset.from_list(rows)
     dataset = dataset.map(
-        lambda sample: _prepare_sample(
-            sample,
+        lambda batch: _prepare_batch(
+            batch,
+            extractor=extractor,
             processor=processor,
             model=model,
             language_option=args.language_option,
             default_language=args.language if args.language_option == "dataset" else None,
         ),
+        batched=True,
+        batch_size=args.batch_size,
         remove_columns=dataset.column_names,
     )
 
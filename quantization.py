@@ -0,0 +1,201 @@
+"""
+Dynamic int8 quantization of Whisper for CPU workers.
+
+Every nn.Linear in the encoder and decoder (attention projections, MLPs and
+proj_out) is replaced by torch's dynamically quantized Linear: weights are
+stored as int8 with a per-tensor scale, activations are quantized per call,
+and the matmuls run through fbgemm/onednn int8 kernels. Convolutions,
+embeddings and layer norms stay float32. The quantized kernels are CPU-only.
+
+Quantizing large-v3-turbo takes a while, so the quantized state dict can be
+cached in a private (0700) directory. Entries are keyed by model id, mode,
+torch version and a hash of the checkpoint's config and weight files, and are
+read back with torch.load(weights_only=True) into a freshly built quantized
+module tree, so a cache file can only supply tensors, never code. A file lock
+makes one worker build it while the others wait and then load the result.
+
+Used by inference_server.py (--quantize int8) and posttraining/evaluate_checkpoint.py.
+
+Benchmark latency, RSS and transcript agreement against float32 (CPU):
+  python quantization.py --model-id openai/whisper-small --clips 8
+"""
+
+import argparse
+import os
+import re
+import time
+from typing import Any, Dict, List, Tuple
+
+import torch
+
+from model_cache import checkpoint_hash, private_dir
+
+QUANT_MODES = ("int8",)
+
+
+def quantize_model(model, mode: str = "int8"):
+    """
+    Quantize a float32 WhisperForConditionalGeneration in place.
+
+    Raises:
+        ValueError: If mode is not in QUANT_MODES
+    """
+    if mode not in QUANT_MODES:
+        raise ValueError(f"Unknown quantization mode {mode!r}; expected one of {QUANT_MODES}")
+    from torch.ao.quantization import quantize_dynamic
+
+    return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def cache_path(cache_dir: str, model_id: str, mode: str) -> str:
+    """File the quantized state dict of model_id is cached under."""
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", model_id.strip("/"))
+    return os.path.join(cache_dir, f"{name}-{checkpoint_hash(model_id)}-{mode}-torch{torch.__version__}.pt")
+
+
+def load_quantized(model_id: str, mode: str = "int8", cache_dir: str = "") -> Tuple[Any, bool]:
+    """
+    Quantized model for model_id, from cache_dir when it has been built before.
+
+    Args:
+        model_id: Model ID or checkpoint path
+        mode: One of QUANT_MODES
+        cache_dir: Private directory for quantized state dicts ("" = quantize on every call)
+
+    Returns:
+        (model, loaded_from_cache)
+    """
+    if not cache_dir:
+        return _build(model_id, mode), False
+
+    from filelock import FileLock
+
+    private_dir(cache_dir)
+    path = cache_path(cache_dir, model_id, mode)
+    with FileLock(path + ".lock"):
+        if os.path.exists(path):
+            model = _skeleton(model_id, mode)
+            model.load_state_dict(torch.load(path, map_location="cpu", weights_only=True))
+            return model, True
+        model = _build(model_id, mode)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        torch.save(model.state_dict(), tmp)
+        os.replace(tmp, path)
+    return model, False
+
+
+def _build(model_id: str, mode: str):
+    from transformers import WhisperForConditionalGeneration
+
+    model = WhisperForConditionalGeneration.from_pretrained(model_id, torch_dtype=torch.float32)
+    model.config.forced_decoder_ids = None
+    model.eval()
+    return quantize_model(model, mode)
+
+
+def _skeleton(model_id: str, mode: str):
+    """Quantized module tree of model_id with uninitialized weights, to load a cached state dict into."""
+    from transformers import GenerationConfig, WhisperConfig, WhisperForConditionalGeneration
+
+    with torch.device("meta"):
+        model = WhisperForConditionalGeneration(WhisperConfig.from_pretrained(model_id))
+    model = model.to_empty(device="cpu")
+    model.generation_config = GenerationConfig.from_pretrained(model_id)
+    model.config.forced_decoder_ids = None
+    model.eval()
+    return quantize_model(model, mode)
+
+
+def rss_mb() -> float:
+    """Resident set size of this process in MiB (0.0 where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+    except (OSError, ValueError):
+        return 0.0
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level edit distance / reference length (case-insensitive)."""
+    ref, hyp = reference.lower().split(), hypothesis.lower().split()
+    if not ref:
+        return float(bool(hyp))
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (r != h))
+    return row[-1] / len(ref)
+
+
+def _run_variant(model_id: str, mode: str, cache_dir: str, clips: List, iters: int) -> Dict[str, Any]:
+    """Load one variant and time it; run in its own process so RSS is not shared."""
+    from transformers import WhisperForConditionalGeneration, WhisperProcessor
+
+    torch.set_num_threads(1)
+    processor = WhisperProcessor.from_pretrained(model_id)
+    t0 = time.perf_counter()
+    if mode:
+        model, cached = load_quantized(model_id, mode, cache_dir)
+    else:
+        model, cached = WhisperForConditionalGeneration.from_pretrained(model_id, torch_dtype=torch.float32), False
+        model.config.forced_decoder_ids = None
+        model.eval()
+    load_s = time.perf_counter() - t0
+
+    kwargs = {"language": "en", "task": "transcribe", "do_sample": False, "num_beams": 1}
+    texts = []
+    elapsed = 0.0
+    with torch.inference_mode():
+        model.generate(processor.feature_extractor(clips[0], sampling_rate=16000, return_tensors="pt").input_features, **kwargs)
+        for clip in clips:
+            features = processor.feature_extractor(clip, sampling_rate=16000, return_tensors="pt").input_features
+            t0 = time.perf_counter()
+            for _ in range(iters):
+                ids = model.generate(features, **kwargs)
+            elapsed += (time.perf_counter() - t0) / iters
+            texts.append(processor.batch_decode(ids, skip_special_tokens=True)[0].strip())
+    return {"load_s": load_s, "cached": cached, "rss_mb": rss_mb(), "ms": elapsed / len(clips) * 1000.0, "texts": texts}
+
+
+def _benchmark(model_id: str, mode: str, cache_dir: str, audio: str, clips: int, iters: int, seed: int):
+    import multiprocessing as mp
+
+    import librosa
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    speech, _ = librosa.load(audio, sr=16000, mono=True)
+    excerpts = []
+    for _ in range(clips):
+        length = int(rng.uniform(3.0, min(20.0, len(speech) / 16000)) * 16000)
+        start = int(rng.integers(0, max(1, len(speech) - length)))
+        excerpts.append(speech[start:start + length])
+
+    with mp.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        fp32 = pool.apply(_run_variant, (model_id, "", "", excerpts, iters))
+        quant = pool.apply(_run_variant, (model_id, mode, cache_dir, excerpts, iters))
+
+    wer = sum(word_error_rate(r, h) for r, h in zip(fp32["texts"], quant["texts"])) / clips
+    print(f"Model: {model_id}  mode={mode}  clips={clips}  iters={iters}  device=cpu  threads=1")
+    print(f"  {'':10} {'load s':>8} {'RSS MiB':>9} {'ms/clip':>9}")
+    print(f"  {'float32':10} {fp32['load_s']:>8.1f} {fp32['rss_mb']:>9.0f} {fp32['ms']:>9.1f}")
+    print(f"  {mode:10} {quant['load_s']:>8.1f} {quant['rss_mb']:>9.0f} {quant['ms']:>9.1f}"
+          f"  ({'from cache' if quant['cached'] else 'quantized'})")
+    print(f"  Speedup                   : {fp32['ms'] / quant['ms']:8.2f}x")
+    print(f"  Same text as float32      : {sum(a == b for a, b in zip(fp32['texts'], quant['texts']))}/{clips}")
+    print(f"  WER vs float32 transcripts: {wer:.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark int8 dynamic quantization against float32 on CPU")
+    parser.add_argument("--model-id", type=str, default="openai/whisper-small", help="Whisper checkpoint")
+    parser.add_argument("--mode", type=str, default="int8", choices=QUANT_MODES, help="Quantization mode")
+    parser.add_argument("--cache-dir", type=str, default="", help="Quantized model cache directory (empty = quantize in place)")
+    parser.add_argument("--audio", type=str, default="MLKDream_20s.wav", help="Speech file excerpts are cut from")
+    parser.add_argument("--clips", type=int, default=8, help="Excerpts to decode")
+    parser.add_argument("--iters", type=int, default=1, help="Timed iterations per excerpt")
+    parser.add_argument("--seed", type=int, default=0, help="RNG seed for excerpt positions")
+    args = parser.parse_args()
+    _benchmark(args.model_id, args.mode, args.cache_dir, args.audio, args.clips, args.iters, args.seed)
@@ -0,0 +1,194 @@
+"""
+Model weights shared by all CPU workers through one memory-mapped file.
+
+from_pretrained gives every worker process a private copy of the weights. In
+this mode the float32 state dict is written once to a safetensors file. Each
+worker then maps that file copy-on-write and builds the model around tensors
+that point into the mapping. Inference never writes to the weights, so all
+workers share the same page-cache pages and per-worker RSS grows only with
+activations and KV cache. Put the directory on /dev/shm to keep the pages in
+RAM with no disk reads. The file is keyed by model id and a hash of the
+checkpoint's config and weight files, and the directory must be private
+(0700, owned by the server's user).
+
+Used by inference_server.py (--shared-weights-dir).
+
+Per-process memory of N workers, shared vs private weights (CPU):
+  python shared_weights.py --model-id openai/whisper-small --processes 4 --dir /dev/shm/whisper-shared
+"""
+
+import argparse
+import json
+import os
+import re
+import struct
+from typing import Any, Dict, Tuple
+
+import torch
+
+from model_cache import checkpoint_hash, private_dir
+
+_DTYPES = {"F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16}
+
+
+def weights_path(cache_dir: str, model_id: str) -> str:
+    """safetensors file the float32 weights of model_id are written to (keyed by checkpoint hash)."""
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", model_id.strip("/"))
+    return os.path.join(cache_dir, f"{name}-{checkpoint_hash(model_id)}-float32.safetensors")
+
+
+def materialize(model_id: str, path: str):
+    """Write model_id's float32 state dict to path (tied weights stored once)."""
+    from safetensors.torch import save_file
+    from transformers import WhisperForConditionalGeneration
+
+    model = WhisperForConditionalGeneration.from_pretrained(model_id, torch_dtype=torch.float32)
+    tensors = {}
+    seen = set()
+    for name, tensor in model.state_dict().items():
+        if tensor.data_ptr() in seen:  # proj_out.weight is tied to embed_tokens
+            continue
+        seen.add(tensor.data_ptr())
+        tensors[name] = tensor.contiguous()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    save_file(tensors, tmp, metadata={"model_id": model_id})
+    os.replace(tmp, path)
+
+
+def map_tensors(path: str) -> Dict[str, torch.Tensor]:
+    """
+    Tensors of a safetensors file, all viewing one copy-on-write mapping of it.
+
+    Raises:
+        ValueError: If a tensor has an unsupported dtype or is not aligned to its element size
+    """
+    with open(path, "rb") as f:
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_len))
+    header.pop("__metadata__", None)
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=os.path.getsize(path))
+    data = torch.empty(0, dtype=torch.uint8).set_(storage)[8 + header_len:]
+
+    tensors = {}
+    for name, info in header.items():
+        dtype = _DTYPES.get(info["dtype"])
+        if dtype is None:
+            raise ValueError(f"{path}: {name} has unsupported dtype {info['dtype']}")
+        start, end = info["data_offsets"]
+        if (8 + header_len + start) % dtype.itemsize:
+            raise ValueError(f"{path}: {name} is not aligned for {info['dtype']}")
+        tensors[name] = data[start:end].view(dtype).view(info["shape"])
+    return tensors
+
+
+def load_shared(model_id: str, cache_dir: str) -> Tuple[Any, bool]:
+    """
+    WhisperForConditionalGeneration whose parameters live in the shared mapping.
+
+    The first caller writes the file (under a file lock); the others wait and map it.
+    cache_dir must be private to this user (mode 0700), since workers load whatever it holds.
+
+    Returns:
+        (model, built_the_file)
+    """
+    from filelock import FileLock
+    from transformers import GenerationConfig, WhisperConfig, WhisperForConditionalGeneration
+
+    private_dir(cache_dir)
+    path = weights_path(cache_dir, model_id)
+    built = False
+    with FileLock(path + ".lock"):
+        if not os.path.exists(path):
+            materialize(model_id, path)
+            built = True
+
+    config = WhisperConfig.from_pretrained(model_id)
+    with torch.device("meta"):
+        model = WhisperForConditionalGeneration(config)
+    model.load_state_dict(map_tensors(path), strict=False, assign=True)
+    model.tie_weights()
+    missing = [name for name, t in list(model.named_parameters()) + list(model.named_buffers()) if t.is_meta]
+    if missing:
+        raise ValueError(f"{path} has no weights for {missing[:5]}")
+    model.generation_config = GenerationConfig.from_pretrained(model_id)
+    model.config.forced_decoder_ids = None
+    model.eval()
+    return model, built
+
+
+def process_memory(pid: int) -> Dict[str, float]:
+    """
+    Memory of process pid in MiB, from /proc ({} where unavailable).
+
+    rss counts shared pages in full, pss splits them between the processes
+    mapping them, file is the file-backed part of rss (e.g. mapped weights).
+    """
+    fields = {"VmRSS": "rss_mb", "RssAnon": "anon_mb", "RssFile": "file_mb", "RssShmem": "shmem_mb"}
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in fields:
+                    memory[fields[key]] = round(int(value.split()[0]) / 1024, 1)
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    memory["pss_mb"] = round(int(line.split()[1]) / 1024, 1)
+                    break
+    except (OSError, ValueError):
+        pass
+    return memory
+
+
+def _hold_model(model_id: str, cache_dir: str, ready, done):
+    """Benchmark child: load the model, run one forward pass, then wait to be measured."""
+    from transformers import WhisperForConditionalGeneration
+
+    torch.set_num_threads(1)
+    if cache_dir:
+        model, _ = load_shared(model_id, cache_dir)
+    else:
+        model = WhisperForConditionalGeneration.from_pretrained(model_id, torch_dtype=torch.float32).eval()
+        model.config.forced_decoder_ids = None
+    features = torch.zeros(1, model.config.num_mel_bins, 3000)
+    with torch.inference_mode():
+        model.generate(features, language="en", task="transcribe", max_new_tokens=8)
+    ready.set()
+    done.wait()
+
+
+def _benchmark(model_id: str, processes: int, cache_dir: str):
+    import multiprocessing as mp
+
+    ctx = mp.get_context("spawn")
+    print(f"Model: {model_id}  processes={processes}  device=cpu")
+    print(f"  {'weights':8} {'RSS MiB':>10} {'PSS MiB':>10} {'file MiB':>10} {'total PSS':>10}")
+    for label, directory in (("private", ""), ("shared", cache_dir)):
+        done = ctx.Event()
+        children = []
+        for _ in range(processes):
+            ready = ctx.Event()
+            p = ctx.Process(target=_hold_model, args=(model_id, directory, ready, done), daemon=True)
+            p.start()
+            children.append((p, ready))
+        for _, ready in children:
+            ready.wait()
+        memory = [process_memory(p.pid) for p, _ in children]
+        done.set()
+        for p, _ in children:
+            p.join()
+        mean = lambda key: sum(m.get(key, 0.0) for m in memory) / processes  # noqa: E731
+        print(
+            f"  {label:8} {mean('rss_mb'):>10.0f} {mean('pss_mb'):>10.0f} {mean('file_mb'):>10.0f} "
+            f"{sum(m.get('pss_mb', 0.0) for m in memory):>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-process memory with private and shared model weights")
+    parser.add_argument("--model-id", type=str, default="openai/whisper-small", help="Whisper checkpoint")
+    parser.add_argument("--processes", type=int, default=4, help="Worker-like processes to start per mode")
+    parser.add_argument("--dir", type=str, default="/dev/shm/whisper-shared", help="Directory for the shared weights file")
+    args = parser.parse_args()
+    _benchmark(args.model_id, args.processes, args.dir)
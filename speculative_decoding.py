@@ -0,0 +1,183 @@
+"""
+Speculative (assisted) decoding for Whisper with a small draft model.
+
+The draft model (e.g. distil-whisper/distil-large-v3 for large-v3-turbo, or
+openai/whisper-tiny for whisper-small) shares the tokenizer of the main model.
+Each round it proposes num_assistant_tokens tokens greedily; the main model
+checks all of them in one forward pass and keeps the longest matching prefix
+plus its own next token. Output is identical to greedy decoding with the main
+model alone. HF assisted generation only supports one clip per generate() call.
+
+SpeculationCounter counts decoder passes of both models with forward hooks to
+report how many proposed tokens were accepted.
+
+Used by inference_server.py workers with --assistant-model-id.
+
+Benchmark against plain greedy generate() (CPU):
+  python speculative_decoding.py --model-id openai/whisper-small --assistant-model-id openai/whisper-tiny
+"""
+
+import argparse
+import time
+from typing import Any, Dict, Sequence, Tuple
+
+import torch
+
+
+def load_assistant(assistant_model_id: str, model, num_assistant_tokens: int, device, dtype):
+    """
+    Load a draft model for assisted generation with `model`.
+
+    Args:
+        assistant_model_id: Draft checkpoint; must use the main model's vocabulary
+        model: Main WhisperForConditionalGeneration
+        num_assistant_tokens: Tokens proposed per round (kept constant)
+        device: Device to load the draft model on
+        dtype: Draft model dtype
+
+    Raises:
+        ValueError: If the two models do not share a vocabulary
+    """
+    from transformers import WhisperForConditionalGeneration
+
+    assistant = WhisperForConditionalGeneration.from_pretrained(assistant_model_id, torch_dtype=dtype)
+    if assistant.config.vocab_size != model.config.vocab_size:
+        raise ValueError(
+            f"Draft model {assistant_model_id} has vocab_size {assistant.config.vocab_size}, "
+            f"main model has {model.config.vocab_size}; they must share a tokenizer"
+        )
+    assistant.config.forced_decoder_ids = None
+    assistant.generation_config.num_assistant_tokens = int(num_assistant_tokens)
+    assistant.generation_config.num_assistant_tokens_schedule = "constant"
+    assistant.to(device)
+    assistant.eval()
+    return assistant
+
+
+def generated_tokens(sequence: Sequence[int], special_ids: set, eos_token_id: int) -> int:
+    """Tokens the decoder produced for one output row (text tokens plus the final EOS)."""
+    return sum(1 for tok in sequence if tok not in special_ids) + int(eos_token_id in sequence)
+
+
+class SpeculationCounter:
+    """
+    Decoder forward-pass counters for a main model and its draft model.
+
+    Every main-model pass in assisted decoding verifies one round of draft
+    tokens and yields the accepted ones plus one token of its own, so
+    accepted = generated tokens - verification passes. Each draft pass
+    proposes one token.
+
+    Args:
+        model: Main WhisperForConditionalGeneration
+        assistant: Draft model from load_assistant
+    """
+
+    def __init__(self, model, assistant):
+        self.assistant = assistant
+        self.main_passes = 0
+        self.draft_passes = 0
+        self.drafted = 0
+        self.accepted = 0
+        model.model.decoder.register_forward_hook(self._count_main)
+        assistant.model.decoder.register_forward_hook(self._count_draft)
+
+    def _count_main(self, module, args, output):
+        self.main_passes += 1
+
+    def _count_draft(self, module, args, output):
+        self.draft_passes += 1
+
+    def snapshot(self) -> Tuple[int, int]:
+        return self.main_passes, self.draft_passes
+
+    def record(self, before: Tuple[int, int], new_tokens: int, detected_language: bool) -> Dict[str, Any]:
+        """
+        Acceptance for one assisted generate() call.
+
+        Args:
+            before: snapshot() taken just before the call
+            new_tokens: Tokens generated by the call (see generated_tokens)
+            detected_language: Whether generate() ran language detection, which
+                               costs one extra main-model pass
+        """
+        verify_passes = self.main_passes - before[0] - int(detected_language)
+        drafted = self.draft_passes - before[1]
+        accepted = min(drafted, max(0, new_tokens - verify_passes))
+        self.drafted += drafted
+        self.accepted += accepted
+        return {
+            "draft_tokens": drafted,
+            "accepted_tokens": accepted,
+            "acceptance_rate": round(accepted / drafted, 4) if drafted else None,
+            "verify_steps": verify_passes,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "draft_tokens": self.drafted,
+            "accepted_tokens": self.accepted,
+            "acceptance_rate": round(self.accepted / self.drafted, 4) if self.drafted else None,
+        }
+
+
+def _benchmark(model_id: str, assistant_model_id: str, num_assistant_tokens: int, audio: str, clips: int, seed: int):
+    import librosa
+    import numpy as np
+    from transformers import WhisperForConditionalGeneration, WhisperProcessor
+
+    torch.set_num_threads(1)
+    rng = np.random.default_rng(seed)
+    processor = WhisperProcessor.from_pretrained(model_id)
+    model = WhisperForConditionalGeneration.from_pretrained(model_id, torch_dtype=torch.float32).eval()
+    model.config.forced_decoder_ids = None
+    assistant = load_assistant(assistant_model_id, model, num_assistant_tokens, "cpu", torch.float32)
+    counter = SpeculationCounter(model, assistant)
+
+    # Random excerpts of real speech, so the draft model has something to agree on
+    speech, _ = librosa.load(audio, sr=16000, mono=True)
+    excerpts = []
+    for _ in range(clips):
+        length = int(rng.uniform(3.0, min(20.0, len(speech) / 16000)) * 16000)
+        start = int(rng.integers(0, max(1, len(speech) - length)))
+        excerpts.append(speech[start:start + length])
+
+    special = set(processor.tokenizer.all_special_ids)
+    eos = processor.tokenizer.eos_token_id
+    greedy_s = assisted_s = 0.0
+    matches = 0
+    for clip in excerpts:
+        features = processor.feature_extractor(clip, sampling_rate=16000, return_tensors="pt").input_features
+        kwargs = {"language": "en", "task": "transcribe", "do_sample": False, "num_beams": 1}
+        with torch.inference_mode():
+            t0 = time.perf_counter()
+            reference = model.generate(features, **kwargs)[0].tolist()
+            greedy_s += time.perf_counter() - t0
+
+            before = counter.snapshot()
+            t0 = time.perf_counter()
+            ours = model.generate(features, assistant_model=assistant, **kwargs)[0].tolist()
+            assisted_s += time.perf_counter() - t0
+        counter.record(before, generated_tokens(ours, special, eos), detected_language=False)
+        matches += [t for t in reference if t not in special] == [t for t in ours if t not in special]
+
+    stats = counter.stats()
+    print(f"Model: {model_id}  draft: {assistant_model_id}  k={num_assistant_tokens}  clips={clips}  device=cpu  threads=1")
+    print(f"  Token-exact vs greedy     : {matches}/{clips}")
+    print(f"  Greedy generate()         : {greedy_s / clips * 1000:8.1f} ms/clip")
+    print(f"  Assisted generate()       : {assisted_s / clips * 1000:8.1f} ms/clip")
+    print(f"  Speedup                   : {greedy_s / assisted_s:8.2f}x")
+    print(f"  Draft tokens / accepted   : {stats['draft_tokens']} / {stats['accepted_tokens']}")
+    print(f"  Acceptance rate           : {stats['acceptance_rate']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark assisted generation against greedy generate() on CPU")
+    parser.add_argument("--model-id", type=str, default="openai/whisper-small", help="Main Whisper checkpoint")
+    parser.add_argument("--assistant-model-id", type=str, default="openai/whisper-tiny", help="Draft checkpoint with the same tokenizer")
+    parser.add_argument("--num-assistant-tokens", type=int, default=5, help="Tokens proposed per round")
+    parser.add_argument("--audio", type=str, default="MLKDream_20s.wav", help="Speech file excerpts are cut from")
+    parser.add_argument("--clips", type=int, default=8, help="Excerpts to decode")
+    parser.add_argument("--seed", type=int, default=0, help="RNG seed for excerpt positions")
+    args = parser.parse_args()
+    _benchmark(args.model_id, args.assistant_model_id, args.num_assistant_tokens, args.audio, args.clips, args.seed)
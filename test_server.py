@@ -5,11 +5,24 @@ Warms up the server and measures transcription speed.
 
 Usage:
   python test_server.py --url http://localhost:8000 --audio MLKDream_20s.wav
+
+  # Stream the .wav over /ws/transcribe in real time and report partials/final latency
+  python test_server.py --url http://localhost:8000 --audio MLKDream_20s.wav --streaming
+
+  # CPU backend: start a local server per (workers x threads/worker) configuration
+  # and compare throughput and latency (result cache off, --url is not used)
+  python test_server.py --cpu-sweep 1x8,2x4,4x2,8x1 --sweep-model-id openai/whisper-small
 """
 
 import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import threading
 import time
 import statistics
+import wave
 import requests
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -174,6 +187,148 @@ def benchmark_concurrent(base_url: str, audio_path: str, num_requests: int = 16,
     return latencies, total_time, all_timings
 
 
+def benchmark_streaming(base_url: str, audio_path: str, frame_ms: int = 100, partial_interval_ms: int = 1000, realtime: bool = True):
+    """
+    Stream a 16-bit PCM .wav to /ws/transcribe frame by frame and print partials
+    as they arrive. Returns (final_message, end_of_audio_to_final_seconds).
+    """
+    from websockets.sync.client import connect
+
+    print(f"\n{'='*60}")
+    print("STREAMING BENCHMARK")
+    print(f"{'='*60}")
+
+    with wave.open(audio_path, "rb") as wf:
+        if wf.getsampwidth() != 2 or wf.getnchannels() != 1:
+            raise ValueError("Streaming test needs a mono 16-bit PCM .wav")
+        sample_rate = wf.getframerate()
+        pcm = wf.readframes(wf.getnframes())
+
+    frame_bytes = int(sample_rate * frame_ms / 1000) * 2
+    ws_url = base_url.replace("http://", "ws://").replace("https://", "wss://") + "/ws/transcribe"
+    print(f"Streaming {len(pcm) / 2 / sample_rate:.1f}s at {sample_rate} Hz in {frame_ms}ms frames "
+          f"({'real time' if realtime else 'as fast as possible'})...")
+
+    final = {}
+    with connect(ws_url, max_size=None) as ws:
+        def receive():
+            for raw in ws:
+                message = json.loads(raw)
+                if message.get("type") == "partial":
+                    print(f"  partial @ {message['audio_s']:5.1f}s ({message['inference_ms']:.0f}ms): {message['text'][:70]}")
+                elif message.get("type") == "error":
+                    print(f"  ERROR: {message.get('error')}")
+                else:
+                    final.update(message)
+                    return
+
+        receiver = threading.Thread(target=receive, daemon=True)
+        receiver.start()
+
+        ws.send(json.dumps({
+            "type": "start",
+            "format": "pcm_s16le",
+            "sample_rate": sample_rate,
+            "partial_interval_ms": partial_interval_ms,
+        }))
+        start = time.perf_counter()
+        for i, offset in enumerate(range(0, len(pcm), frame_bytes)):
+            ws.send(pcm[offset:offset + frame_bytes])
+            if realtime:
+                # Pace frames against the wall clock so drift does not accumulate
+                delay = start + (i + 1) * frame_ms / 1000.0 - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        end_of_audio = time.perf_counter()
+        ws.send(json.dumps({"type": "stop"}))
+        receiver.join(timeout=300)
+        final_latency = time.perf_counter() - end_of_audio
+
+    print(f"\n  Final text       : {final.get('text', '')[:500]}")
+    print(f"  End of audio -> final (client): {final_latency*1000:8.1f} ms")
+    if "final_latency_ms" in final:
+        print(f"  Stop -> final (server)        : {final['final_latency_ms']:8.1f} ms")
+    return final, final_latency
+
+
+def _percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def benchmark_cpu_sweep(audio_path: str, configs: list, model_id: str, port: int, num_requests: int, max_workers: int):
+    """
+    Start inference_server.py on the CPU backend once per (workers, threads per
+    worker) pair, warm it up, run num_requests concurrent requests, and print
+    throughput and latency per configuration. The result cache is turned off so
+    every request is transcribed.
+    """
+    print(f"\n{'='*60}")
+    print("CPU WORKERS x THREADS SWEEP")
+    print(f"{'='*60}")
+    print(f"Model: {model_id}, {num_requests} requests per configuration (max {max_workers} in flight)")
+
+    server = Path(__file__).parent / "inference_server.py"
+    base_url = f"http://127.0.0.1:{port}"
+    rows = []
+    for num_workers, threads in configs:
+        label = f"{num_workers}x{threads}"
+        print(f"\n--- {label}: {num_workers} workers x {threads} threads ---")
+        log_path = Path(tempfile.gettempdir()) / f"whisper-sweep-{label}.log"
+        with open(log_path, "w") as log:
+            proc = subprocess.Popen(
+                [
+                    sys.executable, str(server), "--host", "127.0.0.1", "--port", str(port), "--device", "cpu",
+                    "--model-id", model_id, "--num-workers", str(num_workers),
+                    "--cpu-threads-per-worker", str(threads), "--result-cache-entries", "0", "--result-cache-dir", "",
+                ],
+                stdout=log, stderr=subprocess.STDOUT,
+            )
+            try:
+                started = time.perf_counter()
+                while True:
+                    if proc.poll() is not None:
+                        raise RuntimeError(f"server exited with code {proc.returncode} (see {log_path})")
+                    try:
+                        if health_check(base_url)["workers_alive"] == num_workers:
+                            break
+                    except requests.RequestException:
+                        pass
+                    if time.perf_counter() - started > 600:
+                        raise RuntimeError(f"server not healthy after 600 s (see {log_path})")
+                    time.sleep(1)
+                # Until every worker has answered once, model loading would count as latency
+                benchmark_concurrent(base_url, audio_path, 2 * num_workers, num_workers, verbose=False, label=f"{label} WARMUP")
+                latencies, total_time, _ = benchmark_concurrent(
+                    base_url, audio_path, num_requests, max_workers, verbose=False, label=label,
+                )
+            except Exception as e:
+                print(f"  {label} failed: {e}")
+                latencies, total_time = [], 0.0
+            finally:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+        rows.append((label, latencies, total_time))
+
+    print(f"\n{'-'*60}")
+    print("SWEEP SUMMARY")
+    print(f"{'-'*60}")
+    print(f"  {'config':>8} {'ok':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for label, latencies, total_time in rows:
+        if not latencies:
+            print(f"  {label:>8} {0:>5} {'-':>8} {'-':>9} {'-':>9} {'-':>9}")
+            continue
+        print(
+            f"  {label:>8} {len(latencies):>5} {len(latencies) / total_time:8.2f} "
+            f"{_percentile(latencies, 0.5) * 1000:9.1f} {_percentile(latencies, 0.95) * 1000:9.1f} "
+            f"{max(latencies) * 1000:9.1f}"
+        )
+
+
 def print_stats(latencies, label: str, total_time: float = None):
     if not latencies:
         print(f"\n{label}: No successful requests")
@@ -215,7 +370,9 @@ def print_timing_stats(timings, label: str):
     print()
 
     keys = [
+        "batch_size",
         "queue_wait_ms",
+        "batch_wait_ms",
         "load_ms",
         "preprocess_ms",
         "generate_wall_ms",
@@ -292,6 +449,13 @@ def main():
     parser.add_argument("--skip-256-concurrent", action="store_true", help="Skip 256 concurrent requests benchmark")
     parser.add_argument("--concurrent-256-requests", type=int, default=256, help="Number of concurrent requests for 256 test")
     parser.add_argument("--max-workers-256", type=int, default=128, help="Max concurrency in the client for 256 test")
+    parser.add_argument("--streaming", action="store_true", help="Only run the /ws/transcribe streaming test")
+    parser.add_argument("--frame-ms", type=int, default=100, help="Frame size for the streaming test")
+    parser.add_argument("--partial-interval-ms", type=int, default=1000, help="Partial transcript cadence requested in the streaming test")
+    parser.add_argument("--cpu-sweep", type=str, default=None, help="Only run a CPU sweep over local servers, e.g. 1x8,2x4,4x2 (workers x threads per worker)")
+    parser.add_argument("--sweep-model-id", type=str, default="openai/whisper-small", help="Model the sweep servers load")
+    parser.add_argument("--sweep-port", type=int, default=8190, help="Port the sweep servers listen on")
+    parser.add_argument("--sweep-requests", type=int, default=32, help="Concurrent requests measured per sweep configuration")
     args = parser.parse_args()
 
     audio_path = Path(args.audio)
@@ -302,6 +466,19 @@ def main():
         print(f"ERROR: Audio file not found: {audio_path}")
         return 1
 
+    if args.cpu_sweep:
+        try:
+            configs = [tuple(int(n) for n in part.lower().split("x")) for part in args.cpu_sweep.split(",")]
+            if any(len(c) != 2 or min(c) < 1 for c in configs):
+                raise ValueError
+        except ValueError:
+            print(f"ERROR: --cpu-sweep expects WORKERSxTHREADS[,...], got {args.cpu_sweep!r}")
+            return 1
+        benchmark_cpu_sweep(
+            str(audio_path), configs, args.sweep_model_id, args.sweep_port, args.sweep_requests, args.max_workers,
+        )
+        return 0
+
     print(f"\n{'='*60}")
     print("WHISPER INFERENCE SERVER TEST")
     print(f"{'='*60}")
@@ -314,10 +491,21 @@ def main():
         health = health_check(args.url)
         print(f"  Status: {health['status']}")
         print(f"  Workers alive: {health['workers_alive']}/{health['workers_total']}")
+        backend = health.get("backend") or {}
+        if backend.get("device") == "cpu":
+            print(f"  Backend: cpu, {backend['threads_per_worker']} threads/worker, cores {backend['cores']}")
+        elif backend:
+            print(f"  Backend: {backend['device']}, {backend.get('gpus')} GPUs")
+        if backend.get("device_map"):
+            print(f"  Workers per device: {backend['workers_per_device']} ({', '.join(backend['device_map'])})")
     except Exception as e:
         print(f"ERROR: Server health check failed: {e}")
         return 1
 
+    if args.streaming:
+        benchmark_streaming(args.url, str(audio_path), args.frame_ms, args.partial_interval_ms)
+        return 0
+
     if not args.skip_warmup:
         warmup(args.url, str(audio_path), args.warmup_requests, args.max_workers)
 
@@ -0,0 +1,154 @@
+"""
+Batched Whisper log-mel feature extraction in torch.
+
+Drop-in replacement for WhisperFeatureExtractor's input_features: takes a batch
+of variable-length 16 kHz waveforms, pads/truncates them to 30 s on the target
+device, and computes the log-mel spectrogram with torch.stft in one pass.
+Output matches the HuggingFace extractor within float32 tolerance.
+
+Used by inference_server.py (GPU workers + CPU preprocessing pool) and by
+posttraining/evaluate_checkpoint.py, dataset_prep.py and tts_out_to_dataset.py.
+
+Benchmark / numerical check (CPU):
+  python whisper_features.py --model-id openai/whisper-tiny --batch-size 16
+"""
+
+import argparse
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+import torch
+
+
+class LogMelExtractor:
+    """
+    Vectorized log-mel extractor configured from a WhisperFeatureExtractor.
+
+    Args:
+        feature_extractor: WhisperFeatureExtractor (e.g. processor.feature_extractor);
+                           only its config and mel filter bank are used
+        device: Device features are computed and returned on
+    """
+
+    def __init__(self, feature_extractor, device="cpu"):
+        self.sampling_rate = feature_extractor.sampling_rate
+        self.n_fft = feature_extractor.n_fft
+        self.hop_length = feature_extractor.hop_length
+        self.n_samples = feature_extractor.n_samples
+        self.nb_max_frames = feature_extractor.nb_max_frames
+        self.dither = float(getattr(feature_extractor, "dither", 0.0) or 0.0)
+        self.device = torch.device(device)
+
+        self.window = torch.hann_window(self.n_fft, device=self.device)
+        # HF stores filters as (n_freq, n_mels); keep (n_mels, n_freq) for a left matmul
+        mel_filters = np.asarray(feature_extractor.mel_filters, dtype=np.float32)
+        self.mel_filters = torch.from_numpy(mel_filters).T.contiguous().to(self.device)
+        self.n_mels = self.mel_filters.shape[0]
+
+    @classmethod
+    def from_pretrained(cls, model_id: str, device="cpu") -> "LogMelExtractor":
+        from transformers import WhisperFeatureExtractor
+
+        return cls(WhisperFeatureExtractor.from_pretrained(model_id), device)
+
+    def pad(self, waveforms: Sequence) -> torch.Tensor:
+        """
+        Zero-pad / truncate waveforms to n_samples as one (B, n_samples) float32 tensor.
+        Each clip is copied straight into a buffer on self.device, so only the
+        real samples cross the host -> device boundary.
+        """
+        batch = torch.zeros(len(waveforms), self.n_samples, dtype=torch.float32, device=self.device)
+        for i, waveform in enumerate(waveforms):
+            if not isinstance(waveform, torch.Tensor):
+                waveform = np.asarray(waveform, dtype=np.float32)
+                if not waveform.flags.writeable:  # e.g. np.frombuffer over ffmpeg output
+                    waveform = waveform.copy()
+                waveform = torch.from_numpy(waveform)
+            waveform = waveform.to(torch.float32).reshape(-1)[: self.n_samples]
+            batch[i, : waveform.numel()].copy_(waveform, non_blocking=True)
+        return batch
+
+    def __call__(self, waveforms: Sequence, sampling_rate: Optional[int] = None) -> torch.Tensor:
+        """
+        Args:
+            waveforms: Sequence of 1-D float arrays/tensors (any lengths)
+            sampling_rate: Optional check; must equal the extractor's rate (16 kHz)
+
+        Returns:
+            float32 tensor (B, n_mels, nb_max_frames) on self.device
+        """
+        if sampling_rate is not None and sampling_rate != self.sampling_rate:
+            raise ValueError(
+                f"Audio must be sampled at {self.sampling_rate} Hz (got {sampling_rate}); resample first."
+            )
+
+        with torch.no_grad():
+            waveform = self.pad(waveforms)
+            if self.dither != 0.0:
+                waveform = waveform + self.dither * torch.randn_like(waveform)
+
+            stft = torch.stft(waveform, self.n_fft, self.hop_length, window=self.window, return_complex=True)
+            magnitudes = stft[..., :-1].abs() ** 2
+
+            mel_spec = self.mel_filters @ magnitudes
+            log_spec = torch.clamp(mel_spec, min=1e-10).log10()
+            # Dynamic range clamp is per clip, as in the HF extractor
+            max_val = log_spec.amax(dim=(1, 2), keepdim=True)
+            log_spec = torch.maximum(log_spec, max_val - 8.0)
+            return (log_spec + 4.0) / 4.0
+
+
+def _benchmark(model_id: str, batch_size: int, iters: int, seed: int):
+    from transformers import WhisperFeatureExtractor
+
+    torch.set_num_threads(1)
+    rng = np.random.default_rng(seed)
+    fe = WhisperFeatureExtractor.from_pretrained(model_id)
+    extractor = LogMelExtractor(fe, "cpu")
+
+    # Variable-length clips between 1 s and 30 s
+    lengths = rng.integers(16000, fe.n_samples, size=batch_size)
+    waveforms = [(rng.standard_normal(n) * 0.1).astype(np.float32) for n in lengths]
+
+    def hf_per_clip():
+        return np.stack([fe(w, sampling_rate=16000).input_features[0] for w in waveforms])
+
+    def hf_batched():
+        return fe(waveforms, sampling_rate=16000, return_tensors="np").input_features
+
+    def torch_batched():
+        return extractor(waveforms, sampling_rate=16000)
+
+    reference = hf_per_clip()
+    ours = torch_batched().numpy()
+    max_abs_diff = float(np.abs(reference - ours).max())
+
+    def timed(fn):
+        fn()  # warmup
+        t0 = time.perf_counter()
+        for _ in range(iters):
+            fn()
+        return (time.perf_counter() - t0) / iters * 1000.0
+
+    per_clip_ms = timed(hf_per_clip)
+    hf_batch_ms = timed(hf_batched)
+    torch_ms = timed(torch_batched)
+
+    print(f"Model: {model_id}  batch={batch_size}  n_mels={extractor.n_mels}  iters={iters}  threads=1")
+    print(f"  Max |HF - torch|         : {max_abs_diff:.2e}")
+    print(f"  HF, one clip at a time   : {per_clip_ms:8.1f} ms/batch")
+    print(f"  HF, batched call         : {hf_batch_ms:8.1f} ms/batch")
+    print(f"  LogMelExtractor (torch)  : {torch_ms:8.1f} ms/batch")
+    print(f"  Speedup vs per-clip HF   : {per_clip_ms / torch_ms:8.2f}x")
+    print(f"  Speedup vs batched HF    : {hf_batch_ms / torch_ms:8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark LogMelExtractor against the HF WhisperFeatureExtractor on CPU")
+    parser.add_argument("--model-id", type=str, default="openai/whisper-tiny", help="Model whose feature extractor config to use")
+    parser.add_argument("--batch-size", type=int, default=16, help="Clips per batch")
+    parser.add_argument("--iters", type=int, default=5, help="Timed iterations")
+    parser.add_argument("--seed", type=int, default=0, help="RNG seed for synthetic clips")
+    args = parser.parse_args()
+    _benchmark(args.model_id, args.batch_size, args.iters, args.seed)
@@ -0,0 +1,49 @@
+"""
+Heavy imports and model files preloaded before worker processes start.
+
+With --start-method forkserver, inference_server.py asks the forkserver
+process to import this module once. Every worker, preprocess and encoder
+process forked from it then starts with torch, transformers, librosa and the
+repo's model modules already imported, and with the processor (tokenizer +
+feature extractor) and model config of MODEL_ID already parsed. Nothing here
+touches CUDA, so forking after it is safe.
+
+With the default spawn start method a worker imports this module itself and
+nothing is parsed at import time; preloaded() then loads the files on first
+call, inside the worker's weight-load phase.
+"""
+
+import logging
+import os
+from typing import Any, Dict, Tuple
+
+import numpy  # noqa: F401
+import librosa  # noqa: F401
+import torch  # noqa: F401
+import transformers  # noqa: F401
+from transformers import WhisperConfig, WhisperForConditionalGeneration, WhisperProcessor  # noqa: F401
+
+import whisper_features  # noqa: F401
+import continuous_batching  # noqa: F401
+import speculative_decoding  # noqa: F401
+import audio_context  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+_PRELOADED: Dict[str, Tuple[Any, Any]] = {}
+
+
+def preloaded(model_id: str) -> Tuple[Any, Any]:
+    """(WhisperProcessor, WhisperConfig) for model_id, parsed at most once per process tree."""
+    if model_id not in _PRELOADED:
+        _PRELOADED[model_id] = (WhisperProcessor.from_pretrained(model_id), WhisperConfig.from_pretrained(model_id))
+    return _PRELOADED[model_id]
+
+
+# Set by inference_server.py only with --start-method forkserver, so only the
+# forkserver parses the files at import time
+if os.environ.get("WORKER_PRELOAD_MODEL_ID"):
+    try:
+        preloaded(os.environ["WORKER_PRELOAD_MODEL_ID"])
+    except Exception as e:  # workers load the files themselves
+        logger.warning(f"Could not preload processor/config for {os.environ['WORKER_PRELOAD_MODEL_ID']}: {e}")